@@ -75,44 +75,62 @@ __name__ = 'SnakeSQL'
 from .external import lockdbm
 from .driver.cursor_base import Cursor
 from .driver.connection_base import BaseConnection
+from .driver.pool import Pool
 from .error import DatabaseError
 import datetime
 import time
 
 
 # Might be useful
-def tableDump(file: str):
-    dump = ''
+def tableDump(file: str, fp=None):
+    """Return the keys and rows of a dbm table file as text, one row per
+    line. If ``fp`` is given each line is written to it as it is read
+    instead and None is returned."""
     dbm = lockdbm.open(file)
-    for key in dbm.keys():
-        dump += "%10s  %s\n" % (key, dbm[key])
-    dbm.close()
-    return dump
+    try:
+        if fp is None:
+            return ''.join(["%10s  %s\n" % (key, dbm[key])
+                            for key in dbm.keys()])
+        for key in dbm.keys():
+            fp.write("%10s  %s\n" % (key, dbm[key]))
+    finally:
+        dbm.close()
 
 
-def connect(database, driver: str = 'dbm', autoCreate: bool = False
-            ) -> BaseConnection:
-    """Constructor for creating a connection to the database.
-    Returns a Connection Object. It takes a number of
-    parameters which are database dependent."""
-    colTypesName = 'ColTypes'  # XXX Should make this choosable eventually.
+def _getDriver(driver: str):
     if driver == 'dbm':
         # import driver.dbm
         from .driver import dbm
-        return dbm.driver['Connection'](
-            database=database, driver=dbm.driver,
-            autoCreate=autoCreate, colTypesName=colTypesName)
+        return dbm.driver
     elif driver == 'csv':
         # import driver.csv
         from .driver import csv
-        return csv.driver['Connection'](
-            database=database, driver=csv.driver,
-            autoCreate=autoCreate, colTypesName=colTypesName)
+        return csv.driver
     else:
         raise DatabaseError("Only 'dbm' and 'csv' databases are currently "
                             "supported. Not %s." % repr(driver))
 
 
+def connect(database, driver: str = 'dbm', autoCreate: bool = False
+            ) -> BaseConnection:
+    """Constructor for creating a connection to the database.
+    Returns a Connection Object. It takes a number of
+    parameters which are database dependent."""
+    colTypesName = 'ColTypes'  # XXX Should make this choosable eventually.
+    driver_ = _getDriver(driver)
+    return driver_['Connection'](
+        database=database, driver=driver_,
+        autoCreate=autoCreate, colTypesName=colTypesName)
+
+
+def pool(database, driver: str = 'dbm', size: int = 5,
+         autoCreate: bool = False) -> Pool:
+    """Return a Pool which hands out up to ``size`` connections to the
+    database with connect() and reuses them once they are closed."""
+    return Pool(database, _getDriver(driver), size=size,
+                autoCreate=autoCreate, colTypesName='ColTypes')
+
+
 # DB-API 2.0 Compliance
 apilevel = '2.0'
 # Unsure of this so "Threads may not share the module." seems safest.
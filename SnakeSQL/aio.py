@@ -0,0 +1,155 @@
+"""asyncio interface
+
+connect() returns a Connection whose methods are coroutines. Each
+connection has its own executor with a single thread and every call on the
+connection or its cursors runs there in turn, so the event loop is never
+blocked by a query and the engine, which is not thread safe, is only ever
+used from one thread:
+
+    connection = await SnakeSQL.aio.connect('database', autoCreate=True)
+    cursor = await connection.execute('SELECT * FROM person')
+    async for row in cursor:
+        ...
+    await connection.commit()
+    await connection.close()
+
+Iterating over a cursor fetches ``arraysize`` rows at a time and stream()
+yields the rows in batches. The next batch is only fetched once the last
+one has been taken so a slow consumer never has rows piling up in memory.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from . import connect as _connect
+from .error import Error
+
+
+class Cursor:
+    "Asynchronous wrapper of a cursor. Create it with Connection.cursor()."
+
+    def __init__(self, connection, cursor):
+        self.connection = connection
+        self._cursor = cursor
+        self.arraysize = 100
+        # Read from the cursor on the connection's thread after each
+        # statement so they can be used without touching the engine
+        self.description = None
+        self.rowcount = -1
+
+    def _execute(self, method, *args):
+        method(*args)
+        self.description = self._cursor.description
+        self.rowcount = self._cursor.rowcount
+
+    async def execute(self, operation, parameters=[]):
+        await self.connection._run(self._execute, self._cursor.execute,
+                                   operation, parameters)
+        return self
+
+    async def executemany(self, operation, seq_of_parameters):
+        await self.connection._run(self._execute, self._cursor.executemany,
+                                   operation, seq_of_parameters)
+        return self
+
+    async def fetchone(self, autoConvert=True, format=None):
+        return await self.connection._run(self._cursor.fetchone,
+                                          autoConvert, format)
+
+    async def fetchmany(self, size=None, autoConvert=True, format=None):
+        if size is None:
+            size = self.arraysize
+        return await self.connection._run(self._cursor.fetchmany, size,
+                                          autoConvert, format)
+
+    async def fetchall(self, autoConvert=True, format=None):
+        return await self.connection._run(self._cursor.fetchall,
+                                          autoConvert, format)
+
+    async def fetch_numpy(self, size='all'):
+        return await self.connection._run(self._cursor.fetch_numpy, size)
+
+    async def stream(self, size=None, format=None):
+        """Yield the remaining rows in batches of ``size`` rows, or
+        ``arraysize`` if it is not given, until an empty batch is fetched.
+        Once the rows are used up every format returns an empty batch."""
+        while 1:
+            rows = await self.fetchmany(size, True, format)
+            if not rows:
+                return
+            yield rows
+
+    async def __aiter__(self):
+        # Rows can't be taken one at a time from a dict of columns
+        format = None
+        if self._cursor.format == 'columns':
+            format = 'tuple'
+        async for rows in self.stream(format=format):
+            for row in rows:
+                yield row
+
+    async def close(self):
+        await self.connection._run(self._cursor.close)
+
+
+class Connection:
+    "Asynchronous wrapper of a connection. Create it with connect()."
+
+    def __init__(self, connection, executor):
+        self._connection = connection
+        self._executor = executor
+        self._closed = False
+
+    async def _run(self, func, *args):
+        if self._closed:
+            raise Error('The connection to the database has already been '
+                        'closed.')
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(func, *args))
+
+    async def cursor(self, format='tuple'):
+        return Cursor(self, await self._run(self._connection.cursor, format))
+
+    async def execute(self, operation, parameters=[]):
+        "Execute ``operation`` with a new cursor and return the cursor."
+        cursor = await self.cursor()
+        return await cursor.execute(operation, parameters)
+
+    async def executemany(self, operation, seq_of_parameters):
+        cursor = await self.cursor()
+        return await cursor.executemany(operation, seq_of_parameters)
+
+    async def commit(self):
+        await self._run(self._connection.commit)
+
+    async def rollback(self):
+        await self._run(self._connection.rollback)
+
+    async def close(self):
+        """Close the connection, rolling back anything uncommitted, and
+        stop its thread."""
+        await self._run(self._connection.close)
+        self._closed = True
+        self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        if not self._closed:
+            await self.close()
+
+
+async def connect(database, driver='dbm', autoCreate=False):
+    """Return a Connection to the database, which is opened on the
+    connection's own thread."""
+    executor = ThreadPoolExecutor(max_workers=1,
+                                  thread_name_prefix='SnakeSQL')
+    try:
+        connection = await asyncio.get_running_loop().run_in_executor(
+            executor, functools.partial(_connect, database, driver,
+                                        autoCreate))
+    except BaseException:
+        executor.shutdown(wait=False)
+        raise
+    return Connection(connection, executor)
@@ -14,14 +14,18 @@ Really need to make proper use of these functions rather than eval() as
 implementors of other drivers may have problems
 """
 
-from ..error import (Bug, ConversionError, DatabaseError, Error, SQLError,
-                     ConverterError, CorruptionError, InternalError,
+from ..error import (Bug, ConversionError, DatabaseError, DataError, Error,
+                     SQLError, ConverterError, CorruptionError, InternalError,
                      SQLSyntaxError, SQLForeignKeyError, SQLKeyError)
 import sys
 import os
+import itertools
+import marshal
+import operator
+import tempfile
 from typing import Union, List
 import logging
-from ..external import SQLParserTools
+from ..external import SQLParserTools, bulkFormats
 from .cursor_base import Cursor, _raise_closed
 # import dtuple
 log = logging.getLogger()
@@ -43,6 +47,49 @@ def like(value, sql):
             return 0
 
 
+def _orderKey(value):
+    "Sort NULLs before any other value"
+    return (value is not None, value)
+
+
+def _columnInfo(columns):
+    "Return what is stored in the ColTypes table about each column."
+    return [(column.name, column.type, column.required, column.unique,
+             column.primaryKey, column.foreignKey, column.default,
+             column.position) for column in columns]
+
+
+class Binder:
+    """Substitutes the parameters for the '?' in a statement.
+
+    ``template`` holds the internal values of the statement with None for
+    each '?' and ``params`` the position and converter of each '?' in
+    turn. Both are worked out once for each statement so binding a set of
+    parameters only has to convert them."""
+
+    def __init__(self, template, params):
+        self.template = template
+        self.params = params
+        self.count = len(params)
+
+    def bind(self, values, start=0):
+        "Return the internal values using the parameters from values[start:]"
+        if len(values) - start < self.count:
+            raise SQLError('Too many ? specified in SQL')
+        result = self.template[:]
+        for i, convert in self.params:
+            result[i] = convert(values[start])
+            start += 1
+        return result
+
+
+def _blockConverter(column, operator, convert):
+    "Return a converter which makes a WHERE block from a parameter"
+    def blockConverter(value):
+        return (column, operator, convert(value))
+    return blockConverter
+
+
 # def _raise_closed(func):
 #     def _wrap(self_, *argv, **kwarg):
 #         if self_._closed:
@@ -53,16 +100,26 @@ def like(value, sql):
 
 
 class BaseConnection:
+    binderCacheSize = 256
+
     # Other Methods
     def __init__(self, database: str, driver: str, autoCreate: bool,
-                 colTypesName: str):
+                 colTypesName: str, pool=None):
         # todo: change colTypesName to master_table_name
         self.database = database
         self.driver = driver
         self.colTypesName = colTypesName
         self.tables = {}
-        self.parser = SQLParserTools.Transform()
+        self.pool = pool
+        if pool is not None:
+            self.parser = pool.parser
+        else:
+            self.parser = SQLParserTools.Transform()
         self.createdTables = []
+        self.schemaChanged = False
+        self.binders = {}
+        # The ColTypes keys of each table when the structure was loaded
+        self.tableKeys = {}
         if not self.databaseExists():
             if autoCreate:
                 self.createDatabase()
@@ -70,6 +127,7 @@ class BaseConnection:
                 raise DatabaseError(f"The database '{self.database}' "
                                     "does not exist.")
         self._loadTableStructure()
+        self._endStatement()
 
     def __del__(self):
         if self._closed is False:
@@ -108,10 +166,15 @@ class BaseConnection:
         Database modules that do not support transactions should
         implement this method with void functionality.
         """
+        # Tables which were only read have nothing to commit
         for table in self.tables.keys():
-            if self.tables[table].open:
+            if self.tables[table].isDirty():
                 self.tables[table].commit()
         self.createdTables = []
+        if self.schemaChanged:
+            # The version our own changes gave the ColTypes table
+            self.schemaVersion = self.tables[self.colTypesName].file.version()
+            self.schemaChanged = False
 
     @_raise_closed
     def rollback(self):
@@ -123,25 +186,35 @@ class BaseConnection:
         rollback to be performed.
         """
         for table in self.tables.keys():
-            if self.tables[table].open:
+            if self.tables[table].isDirty():
                 self.tables[table].rollback()
         for table in self.createdTables:
             if table in self.tables:
                 if self.tables[table].open:
                     self.tables[table]._close()
                 del self.tables[table]
-            for end in self.tableExtensions:
-                if os.path.exists(self.database + os.sep + table + end):
-                    os.remove(self.database + os.sep + table + end)
+            self._deleteTableFromDisk(table)
+        if self.createdTables:
+            self.binders = {}
         self.createdTables = []
+        self.schemaChanged = False
+
+    def _endStatement(self):
+        """Release the shared locks taken while running a statement. Tables
+        which have been changed stay locked until commit() or rollback()."""
+        for table in self.tables.values():
+            if table.open:
+                table.release()
 
     @_raise_closed
-    def cursor(self) -> Cursor:
+    def cursor(self, format='tuple') -> Cursor:
         """Return a new Cursor Object using the connection.  If the
         database does not provide a direct cursor concept, the
         module will have to emulate cursors using other means to
-        the extent needed by this specification.  [4]"""
-        return Cursor(self)
+        the extent needed by this specification.  [4]
+
+        ``format`` is the default format the cursor fetches rows in."""
+        return Cursor(self, format=format)
 
     # Type conversions
     @_raise_closed
@@ -158,7 +231,7 @@ class BaseConnection:
             #     raise SQLError(
             #         f"Table '{table}' has no column named '{column}'.")
             try:
-                column_type = table_.get(column).type.capitalize()
+                column_type = table_.byName[column].type.capitalize()
                 column_converter = self.driver['converters'][column_type]
                 typeConverters.append(column_converter.valueToStorage)
                 sqlConverters.append(column_converter.SQLToStorage)
@@ -230,15 +303,27 @@ class BaseConnection:
             self.tables[self.colTypesName]._load()
         if not self.tables[self.colTypesName].open:
             raise Error("No Coltypes File loaded.")
-        vals = []
-        keys = self.tables[self.colTypesName].file.keys()
-        for k in keys:
-            row = self._getRow(self.colTypesName, k)
-            vals.append([k, row])
-        vals.sort()
+        # A snapshot is only saved for the version it was read at so it can
+        # be loaded without locking the ColTypes table
+        version = self.tables[self.colTypesName].file.version()
+        vals = self._loadSchemaSnapshot(version)
+        snapshot = vals is not None
+        if not snapshot:
+            # The version is read again under the lock so it matches the
+            # rows read
+            self.tables[self.colTypesName].file.lock()
+            version = self.tables[self.colTypesName].file.version()
+            vals = []
+            keys = self.tables[self.colTypesName].file.keys()
+            for k in keys:
+                row = self._getRow(self.colTypesName, k)
+                vals.append([k, row])
+            vals.sort()
         tables = {}
+        tableKeys = {}
         for val in vals:        # Get info in the correct format
             v = val[1]
+            tableKeys.setdefault(v[0], []).append(val[0])
             if v[2] not in self.driver['converters'].keys():
                 raise ConverterError(
                     "No converter registered for '%s' used in table '%s' "
@@ -260,21 +345,91 @@ class BaseConnection:
                     position=v[8],
                 )
             )
-        self._checkTableFilesExist(tables.keys())
+        if not snapshot:
+            self._checkTableFilesExist(tables.keys())
+            self._saveSchemaSnapshot(version, vals)
+        # Tables loaded before which are unchanged are kept as they are. A
+        # table dropped and created again with the same columns since has
+        # new files and usually new ColTypes rows, though the keys of the
+        # rows can be used again.
+        self.binders = {}
+        for name in list(self.tables.keys()):
+            if name != self.colTypesName and name not in tables:
+                if self.tables[name].open:
+                    self.tables[name]._close()
+                del self.tables[name]
         for name, columns in tables.items():
-            if name != self.colTypesName:
+            if name == self.colTypesName:
+                self.tables[name].columns = columns
+            elif (name not in self.tables or _columnInfo(columns) !=
+                    _columnInfo(self.tables[name].columns) or
+                    self.tableKeys.get(name, tableKeys[name]) !=
+                    tableKeys[name] or self.tables[name].isReplaced()):
+                if name in self.tables and self.tables[name].open:
+                    self.tables[name]._close()
                 self.tables[name] = self.driver['Table'](
                     name, filename=self.database+os.sep + name,
                     columns=columns)
-            else:
-                self.tables[name].columns = columns
+        for name, columns in self.tables.items():
+            self.tables[name].parentTables = []
+            self.tables[name].childTables = []
         for name, columns in self.tables.items():
             for column in columns:
-                if column.primaryKey:
-                    self.tables[name].primaryKey = column.name
                 if column.foreignKey:
                     self.tables[column.foreignKey].childTables.append(name)
                     self.tables[name].parentTables.append(column.foreignKey)
+        self.schemaVersion = version
+        self.tableKeys = tableKeys
+        if self.pool is not None:
+            self.pool.schema = (version, vals)
+
+    def _schemaFilename(self):
+        return self.database + os.sep + self.colTypesName + '.schema'
+
+    def _loadSchemaSnapshot(self, version):
+        """Return the ColTypes rows saved by _saveSchemaSnapshot() or None if
+        there are none for this version of the ColTypes table."""
+        if self.pool is not None and self.pool.schema is not None:
+            # Rows another connection in the pool has read
+            saved, vals = self.pool.schema
+            if saved == version:
+                return vals
+        try:
+            with open(self._schemaFilename(), 'rb') as fp:
+                saved, vals = marshal.loads(fp.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if saved != version:
+            return None
+        return vals
+
+    def _saveSchemaSnapshot(self, version, vals):
+        """Save the ColTypes rows so the next connection can load them in one
+        read instead of reading and checking every row."""
+        filename = self._schemaFilename()
+        try:
+            # Connections saving the same snapshot at once each use their
+            # own temporary file
+            fd, tmp = tempfile.mkstemp(dir=self.database)
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                fp.write(marshal.dumps((version, vals)))
+            os.replace(tmp, filename)
+        except (OSError, ValueError):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _refreshTableStructure(self):
+        """Reload the table structure if another connection has changed it,
+        ie if the version of the ColTypes table has moved on. The version is
+        read without locking so a statement only waits for the ColTypes
+        table after a change."""
+        if self.schemaChanged:
+            return
+        if self.tables[self.colTypesName].file.version() != self.schemaVersion:
+            self._loadTableStructure()
 
     @_raise_closed
     def _insertRowInColTypes(self, table):
@@ -312,135 +467,111 @@ class BaseConnection:
         # if not self.tables.has_key(table):
         if table not in self.tables:
             raise InternalError("No such table '%s'." % (table))
+        byName = self.tables[table].byName
         for column in columns:
-            if not self.tables[table].columnExists(column):
+            if column not in byName:
                 raise SQLError("'%s' is not a column in table '%s'." %
                                (column, table))
-            cols.append(self.tables[table].get(column).position)
+            cols.append(byName[column].position)
         return cols
 
+    def _cacheBinder(self, key, binder):
+        # Statements built with literal values rather than '?' would fill
+        # the cache so it is simply emptied once it is full
+        if len(self.binders) >= self.binderCacheSize:
+            self.binders = {}
+        self.binders[key] = binder
+        return binder
+
     @_raise_closed
-    def _convertValuesToInternal(self, table, columns, sqlValues=[],
-                                 values=[]):
-        # ~ if values and sqlValues:
-        # ~ if len(sqlValues) <> len(values):
-        # ~ raise SQLError("The number of ? doesn't match the number
-        # of values.")
+    def _valuesBinder(self, table, columns, sqlValues=()):
+        """Return a Binder for the values of ``columns`` given in SQL as
+        ``sqlValues``, or all as parameters if it is empty."""
+        key = ('values', table, tuple(columns), tuple(sqlValues))
+        binder = self.binders.get(key)
+        if binder is not None:
+            return binder
         sqlConverters, typeConverters = self._getConverters(table, columns)
-        internalValues = []
-
-        i = 0
-        length = len(values)
+        template = [None] * len(columns)
+        params = []
         if len(sqlValues) == 0:
-            for value in values:
-                internalValues.append(typeConverters[i](value))
-                i += 1
-            return internalValues, len(values)
+            params = list(enumerate(typeConverters))
         else:
-            counter = 0
-            for value in sqlValues:
-                if value == '?':
-                    if len(sqlValues) > counter:
-                        if counter == length:
-                            raise SQLError('Too many ? specified in SQL')
-                        internalValues.append(
-                            typeConverters[i](values[counter]))
-                        counter += 1
-                    else:
-                        raise SQLError(
-                            "Not enough values supplied in execute() to "
-                            "substitue each '?'.")
+            if len(sqlValues) != len(columns):
+                raise SQLError("The number of columns doesn't match the "
+                               "number of values.")
+            for i in range(len(sqlValues)):
+                if sqlValues[i] == '?':
+                    params.append((i, typeConverters[i]))
                 else:
                     try:
-                        internalValues.append(sqlConverters[i](value))
+                        template[i] = sqlConverters[i](sqlValues[i])
                     except ConversionError:
                         raise SQLSyntaxError('Incorrect quoting - ' +
                                              str(sys.exc_info()[1]))
-                i += 1
-            return internalValues, counter
+        return self._cacheBinder(key, Binder(template, params))
+
+    @_raise_closed
+    def _convertValuesToInternal(self, table, columns, sqlValues=[],
+                                 values=[]):
+        binder = self._valuesBinder(table, columns, sqlValues)
+        return binder.bind(values), binder.count
+
+    @_raise_closed
+    def _whereBinder(self, table, where):
+        """Return a Binder for the blocks of a parsed WHERE clause which
+        gives the blocks with their values converted to internal values."""
+        if not isinstance(where, tuple):
+            where = tuple([block if isinstance(block, str) else tuple(block)
+                           for block in where])
+        key = ('where', table, where)
+        binder = self.binders.get(key)
+        if binder is not None:
+            return binder
+        template = []
+        params = []
+        for block in where:
+            # log.debug(block)
+            if isinstance(block, str):
+                template.append(block)
+                continue
+            if '.' not in block[0]:
+                if not table:
+                    raise SQLError('No table specified for column %s in WHERE '
+                                   'clause' % repr(block[0]))
+                column = block[0]
+            else:
+                table, column = block[0].split('.')
+            if table not in self.tables:
+                raise SQLError("Table %s specified in WHERE clause doesn't "
+                               "exist" % (repr(table)))
+            if not self.tables[table].has_key(column):
+                raise SQLError("Table %s specified in WHERE clause doesn't "
+                               "have a column %s" %
+                               (repr(table), repr(column)))
+            converter = self.driver['converters'][
+                self.tables[table].get(column).type.capitalize()]
+            value = block[2]
+            if value == '?':
+                params.append((len(template), _blockConverter(
+                    block[0], block[1], converter.valueToStorage)))
+                template.append(None)
+                continue
+            try:
+                value = converter.SQLToStorage(value)
+            except ConversionError as e:
+                # An unquoted table.column is a column to compare with
+                if value[:1] == "'" or '.' not in value:
+                    raise SQLError(str(e))
+                value = [value]
+            template.append((block[0], block[1], value))
+        return self._cacheBinder(key, Binder(template, params))
 
     @_raise_closed
     def _convertWhereToInternal(self, table, where='', values=[]):
         if where:
-            columns = []
-            tables = []
-            sqlValues = []
-            typeConverters = []
-            sqlConverters = []
-            for block in where:
-                # log.debug(block)
-                if not isinstance(block, str):  # TODO: should test is list
-                    if '.' not in block[0]:
-                        if not table:
-                            raise SQLError(
-                                'No table specified for column %s in WHERE '
-                                'clause' % repr(block[0]))
-                        else:  # Use the default table
-                            tables.append(table)
-                            columns.append(block[0])
-                    else:
-                        table, column = block[0].split('.')
-                        columns.append(column)
-                        if table not in self.tables:
-                            raise SQLError(
-                                "Table %s specified in WHERE clause doesn't "
-                                "exist" % table)
-                        else:
-                            tables.append(table)
-                    sqlValues.append(block[2])
-                    # if not self.tables.has_key(tables[-1]):
-                    if tables[-1] not in self.tables:
-                        raise SQLError(
-                            "Table %s specified in WHERE clause doesn't exist"
-                            % (repr(tables[-1])))
-                    if not self.tables[tables[-1]].has_key(columns[-1]):
-                        log.debug(where)
-                        log.debug(columns)
-                        raise SQLError(
-                            "Table %s specified in WHERE clause doesn't have "
-                            "a column %s" %
-                            (repr(tables[-1]), repr(columns[-1])))
-                    typeConverters.append(
-                        self.driver['converters'][
-                            self.tables[tables[-1]].get(columns[-1]).type
-                            .capitalize()].valueToStorage)
-                    sqlConverters.append(self.driver[
-                        'converters'][self.tables[tables[-1]].get(columns[-1])
-                                      .type.capitalize()].SQLToStorage)
-            internalValues = []
-            counter = 0
-            i = 0
-            length = len(values)
-            for value in sqlValues:
-
-                if value == '?':
-                    if len(sqlValues) > counter:
-                        if counter == length:
-                            raise SQLError('Too many ? specified in SQL')
-                        internalValues.append(
-                            typeConverters[i](values[counter]))
-                        counter += 1
-                    else:
-                        raise SQLError("Not enough values supplied in "
-                                       "execute() to substitue each '?'.")
-                else:
-                    try:
-                        internalValues.append(sqlConverters[i](value))
-                    except ConversionError as e:
-                        if isinstance(value, str) and value[0] != "'":
-                            res1 = value.split('.')
-                        if len(res1) == 1:
-                            raise SQLError(str(e))
-                        else:
-                            t1, col1 = res1
-                            internalValues.append([value])
-                i += 1
-            c = 0
-            for i in range(len(where)):
-                if not isinstance(where[i], str):  # TODO: should test is list
-                    where[i][2] = internalValues[c]
-                    c += 1
-            return where, counter
+            binder = self._whereBinder(table, where)
+            return binder.bind(values), binder.count
         else:
             return [], 0
 
@@ -455,12 +586,7 @@ class BaseConnection:
 
         if table not in self._tables():
             raise SQLError('The table %s does not exist' % (repr(table)))
-        cols = []
-        for i in range(len(self.tables[table].columns)):
-            cols.append(None)
-        for col in self.tables[table].columns:
-            cols[col.position] = col.name
-        return tuple(cols)
+        return self.tables[table].columnNames
 
     # Actual SQL Methods
     @_raise_closed
@@ -477,9 +603,9 @@ class BaseConnection:
         if len(where):
             columns = {}
             for table in tables:
-                columns[table] = {}
-                for column in self.tables[table].columns:
-                    columns[table][column.name] = column.position
+                columns[table] = dict(
+                    [(name, column.position) for name, column in
+                     self.tables[table].byName.items()])
             #    #~ for block in where:
                     # ~ columns[table] = {}
             # ~ for block in where:
@@ -501,7 +627,7 @@ tabs={}
 for table in tables:
     tabs[table] = []
     for primaryKey in self.tables[table].file.keys():
-        tabs[table].append([primaryKey, self._getRow(table, primaryKey)])
+        tabs[table].append((primaryKey, self._getRow(table, primaryKey)))
 
 found = []
 """ % str(tables)
@@ -582,6 +708,9 @@ found = []
             except Exception:
                 raise Bug("Exception: " + str(sys.exc_info()[1]) + "If: "
                           + ifStatement + '\n\nWhere: ' + str(where))
+        elif len(tables) > 1:
+            return list(itertools.product(
+                *[self.tables[table].file.keys() for table in tables]))
         else:
             return self.tables[table].file.keys()
         return locals()['found']
@@ -591,11 +720,10 @@ found = []
         if table not in self.tables:
             raise InternalError("There is no such table '%s'." % table)
         else:
-            for col in self.tables[table].columns:
-                if col.primaryKey:
-                    raise SQLError("The table '%s' has a primary key. You "
-                                   "cannot obtain a new integer key for it."
-                                   % table)
+            if self.tables[table].primaryKey is not None:
+                raise SQLError("The table '%s' has a primary key. You "
+                               "cannot obtain a new integer key for it."
+                               % table)
             keys = self.tables[table].file.keys()
             if not keys:
                 return 1
@@ -633,6 +761,9 @@ found = []
         # tableStructure
         if not self.tables[self.colTypesName].open:
             self.tables[self.colTypesName]._load()
+        self.tables[self.colTypesName].file.lock(True)
+        self.schemaChanged = True
+        self.binders = {}
         # Add to tableStructure
         cols = []
         counter = 0
@@ -662,16 +793,13 @@ found = []
                     raise SQLSyntaxError('Invalid value %s for FOREIGN KEY - '
                                          'should be of the form table.column'
                                          % (repr(column['foreignKey'])))
-                if not self.tables.has_key(t):
+                if t not in self.tables:
                     raise SQLError('Table %s specified in FOREIGN KEY option '
                                    'does not exist' % (repr(t)))
-                f = False
-                for c in self.tables[t].columns:
-                    if c.primaryKey:
-                        f = c
-                if f is False:
+                if self.tables[t].primaryKey is None:
                     raise SQLError('Table %s specified in FOREIGN KEY option '
                                    'does not have a PRIMARY KEY' % (repr(t)))
+                f = self.tables[t].get(self.tables[t].primaryKey)
                 if column['type'].capitalize() != f.type:
                     raise SQLError('Column %s specified in FOREIGN KEY option '
                                    'is not of the same type %s as PRIMARY KEY '
@@ -695,6 +823,10 @@ found = []
         self.tables[table] = self.driver[
             'Table'](table, filename=self.database+os.sep + table,
                      columns=cols)
+        for column in cols:
+            if column.foreignKey:
+                self.tables[column.foreignKey].childTables.append(table)
+                self.tables[table].parentTables.append(column.foreignKey)
         self.tables[table]._load()
         # Add to ColTypes table
         self._insertRowInColTypes(table)
@@ -716,6 +848,11 @@ found = []
                 raise SQLError("Cannot drop '%s'. Table not found." % (table))
             if not self.tables[table].open:
                 self.tables[table]._load()
+            self.tables[table].file.lock(True)
+        self.tables[self.colTypesName].file.lock(True)
+        self.schemaChanged = True
+        self.binders = {}
+        for table in tables:
             # Check foreign key constraints:
             # cannot drop a parent table until all children are removed, can
             # drop child table
@@ -754,12 +891,13 @@ found = []
                                                              sqlValues, values)
         if not self.tables[table].open:
             self.tables[table]._load()
+        self.tables[table].file.lock(True)
+        # Position of each column in the values, the first if it is repeated
+        given = {}
+        for i in range(len(columns)):
+            given.setdefault(columns[i], i)
         # Get a new primaryKey
-        primaryKey = None
-        for col in self.tables[table].columns:
-            if col.primaryKey:
-                primaryKey = col.name
-                break
+        primaryKey = self.tables[table].primaryKey
         if primaryKey and primaryKey not in columns:
             raise SQLKeyError("PRIMARY KEY '%s' must be specified when "
                               "inserting into the '%s' table."
@@ -767,7 +905,7 @@ found = []
         elif not primaryKey:
             keyval = self._getNewKey(table)
         else:
-            keyval = internalValues[columns.index(primaryKey)]
+            keyval = internalValues[given[primaryKey]]
             if self.tables[table].file.has_key(keyval):
                 raise SQLKeyError(
                     "Row with the PRIMARY KEY '%s' already exists." % (keyval))
@@ -775,49 +913,39 @@ found = []
         for col in self.tables[table].columns:
             name = col.name
             # Check other internalValues needing to be unique are
-            if col.unique and name in columns:
+            if col.unique and name in given:
                 for primaryKey in self.tables[table].file.keys():
                     row = self._getRow(table, primaryKey)
                     oldval = row[col.position]
-                    val = internalValues[columns.index(name)]
+                    val = internalValues[given[name]]
                     if val is not None and val == oldval:
                         raise SQLError("The UNIQUE column '%s' already has a "
                                        "value '%s'." % (name, val))
-            if col.required and name not in columns:
+            if col.required and name not in given:
                 raise SQLError(
                     "The REQUIRED value '%s' has not been specified." % (name))
-            if col.required and internalValues[columns.index(name)] is None:
+            if col.required and internalValues[given[name]] is None:
                 raise SQLError(
                     "The REQUIRED value '%s' cannot be NULL." % (name))
             if col.primaryKey:
-                if name not in columns:
+                if name not in given:
                     # XXX Already specified.
                     raise SQLError(
                         "The PRIMARY KEY '%s' has not been specified." %
                         (name))
-                elif internalValues[columns.index(name)] is None:
+                elif internalValues[given[name]] is None:
                     raise SQLError(
                         "The PRIMARY KEY value '%s' cannot be NULL." % (name))
 
         # Arrange the internalValues in the correct order, filling defaults as
         # necessary
-        cols = []
-        for col in self.tables[table].columns:
-            cols.append([col.position, col.name])
-        cols.sort()
-        columnNames = []
-        defaults = []
-        for col in cols:
-            columnNames.append(col[1])
-            defaults.append(self.tables[table].get(col[1]).default)
-        vals = []
+        byName = self.tables[table].byName
+        defaults = [col.default for col in self.tables[table].byPosition]
         for col in columns:
-            if col not in columnNames:
+            if col not in byName:
                 raise SQLError("Column '%s' does not exist in table '%s'."
                                % (col, table))
-            defaults[columnNames.index(col)] = \
-                internalValues[columns.index(col)]
-            vals.append(internalValues[columns.index(col)])
+            defaults[byName[col].position] = internalValues[given[col]]
 
         # Check foreign keys are specified if needed
         if self.tables[table].parentTables:
@@ -849,6 +977,280 @@ found = []
             'results':  None,
         }
 
+    @_raise_closed
+    def _insertMany(self, table, columns, sqlValues=[], seqOfValues=[]):
+        """Insert one row for each sequence in ``seqOfValues`` using the
+        values bound to the '?' in ``sqlValues``. The SQL values and the
+        converters are worked out once and the rows are checked and written
+        in batches by _bulkInsert()."""
+        if table not in self.tables:
+            raise SQLError("Table '%s' not found." % (table))
+        binder = self._valuesBinder(table, columns, sqlValues)
+
+        def bind():
+            for values in seqOfValues:
+                if len(values) != binder.count:
+                    raise SQLError("%s values supplied to substitute %s '?'."
+                                   % (len(values), binder.count))
+                yield binder.bind(values)
+        return self._bulkInsert(table, columns, bind())
+
+    @_raise_closed
+    def _insertValues(self, table, columns, sqlRows, values=[]):
+        """Insert one row for each list of SQL values in ``sqlRows``, as
+        parsed from INSERT ... VALUES (...), (...). Any '?' are substituted
+        from ``values`` in order across all the rows."""
+        if table not in self.tables:
+            raise SQLError("Table '%s' not found." % (table))
+        sqlConverters, typeConverters = self._getConverters(table, columns)
+
+        def convert():
+            counter = 0
+            for sqlValues in sqlRows:
+                row = []
+                for i in range(len(sqlValues)):
+                    if sqlValues[i] == '?':
+                        if counter == len(values):
+                            raise SQLError(
+                                "Not enough values supplied in execute() to "
+                                "substitue each '?'.")
+                        row.append(typeConverters[i](values[counter]))
+                        counter += 1
+                    else:
+                        try:
+                            row.append(sqlConverters[i](sqlValues[i]))
+                        except ConversionError:
+                            raise SQLSyntaxError('Incorrect quoting - ' +
+                                                 str(sys.exc_info()[1]))
+                yield row
+        return self._bulkInsert(table, columns, convert())
+
+    def _insertRows(self, table, rows):
+        """Write a batch of ``(primaryKey, values)`` pairs. Drivers can
+        over-ride this to write the batch in one go."""
+        for primaryKey, values in rows:
+            self._insertRow(table, primaryKey, values)
+
+    @_raise_closed
+    def _bulkInsert(self, table, columns, rows, batchSize=10000):
+        """Insert ``rows``, an iterable of lists of internal values in the
+        order of ``columns``.
+
+        The PRIMARY KEY, UNIQUE, REQUIRED and FOREIGN KEY constraints are
+        checked against the values already in the table, which are read
+        once, and against the earlier rows. Each batch of ``batchSize`` rows
+        is checked completely before any of it is written so a failure
+        leaves whole batches written, to be removed with rollback()."""
+        if table not in self.tables:
+            raise SQLError("Table '%s' not found." % (table))
+        table_ = self.tables[table]
+        if not table_.open:
+            table_._load()
+        table_.file.lock(True)
+        for column in columns:
+            if not table_.columnExists(column):
+                raise SQLError("Column '%s' does not exist in table '%s'."
+                               % (column, table))
+            if columns.count(column) > 1:
+                raise SQLError("The column named '%s' has been specified more "
+                               "than once." % (column))
+        ordered = table_.byPosition
+        defaults = [col.default for col in ordered]
+        positions = [table_.byName[column].position for column in columns]
+        keyPosition = None
+        required = []
+        seen = {}
+        parents = {}
+        for col in ordered:
+            if col.primaryKey:
+                if col.name not in columns:
+                    raise SQLKeyError("PRIMARY KEY '%s' must be specified when "
+                                      "inserting into the '%s' table."
+                                      % (col.name, table))
+                keyPosition = col.position
+            if col.required and col.name not in columns:
+                raise SQLError(
+                    "The REQUIRED value '%s' has not been specified."
+                    % (col.name))
+            if col.required or col.primaryKey:
+                required.append(col)
+            if col.unique or col.primaryKey:
+                seen[col.position] = set()
+            if col.foreignKey:
+                if col.name not in columns:
+                    raise SQLForeignKeyError(
+                        "Foreign key %s not specified when inserting into "
+                        "table %s" % (repr(col.name), repr(table)))
+                results = self._select(
+                    [self.tables[col.foreignKey].primaryKey],
+                    col.foreignKey, [], [])['results']
+                parents[col.position] = set(
+                    [result[0] for result in results])
+        # One pass over the existing rows for the UNIQUE and PRIMARY KEY values
+        if seen:
+            for primaryKey in table_.file.keys():
+                row = self._getRow(table, primaryKey)
+                for position, values in seen.items():
+                    if row[position] is not None:
+                        values.add(row[position])
+        nextKey = None
+        if keyPosition is None:
+            nextKey = int(self._getNewKey(table))
+        width = len(columns)
+        affectedRows = 0
+        batch = []
+        rows = iter(rows)
+        while True:
+            for values in rows:
+                if len(values) != width:
+                    raise SQLError("The number of columns doesn't match the "
+                                   "number of values.")
+                row = list(defaults)
+                for position, value in zip(positions, values):
+                    row[position] = value
+                for col in required:
+                    if row[col.position] is None:
+                        if col.primaryKey:
+                            raise SQLError("The PRIMARY KEY value '%s' cannot "
+                                           "be NULL." % (col.name))
+                        raise SQLError("The REQUIRED value '%s' cannot be "
+                                       "NULL." % (col.name))
+                for position, values in seen.items():
+                    value = row[position]
+                    if value is not None:
+                        if value in values:
+                            if position == keyPosition:
+                                raise SQLKeyError(
+                                    "Row with the PRIMARY KEY '%s' already "
+                                    "exists." % (value))
+                            raise SQLError(
+                                "The UNIQUE column '%s' already has a value "
+                                "'%s'." % (ordered[position].name, value))
+                        values.add(value)
+                for position, values in parents.items():
+                    if row[position] not in values:
+                        col = ordered[position]
+                        raise SQLForeignKeyError(
+                            "Invalid value for foreign key %s since table %s "
+                            "does not have a primary key value %s"
+                            % (repr(col.name), repr(col.foreignKey),
+                               repr(row[position])))
+                if keyPosition is None:
+                    batch.append((str(nextKey), row))
+                    nextKey += 1
+                else:
+                    batch.append((row[keyPosition], row))
+                if len(batch) == batchSize:
+                    break
+            if not batch:
+                break
+            self._insertRows(table, batch)
+            affectedRows += len(batch)
+            batch = []
+        return {
+            'affectedRows': affectedRows,
+            'columns': columns,
+            'table': table,
+            'results':  None,
+        }
+
+    @_raise_closed
+    def _copyFrom(self, table, fp, format='csv', columns=None):
+        """Load the rows in the text file object ``fp`` into ``table``. The
+        values are converted with the column converters and written through
+        _bulkInsert() without any SQL being parsed."""
+        if table not in self.tables:
+            raise SQLError("Table '%s' not found." % (table))
+        if columns is None and format.lower() == 'jsonl':
+            # Objects need not all have the same names so use every column
+            columns = self._columns(table)
+        missing = object()  # Names an object leaves out get the DEFAULT
+        try:
+            columns, rows = bulkFormats.readRows(fp, format, columns,
+                                                 missing)
+        except bulkFormats.FormatError as e:
+            raise DataError(str(e))
+        converters = []
+        for column in columns:
+            if not self.tables[table].columnExists(column):
+                raise SQLError("Column '%s' does not exist in table '%s'."
+                               % (column, table))
+            column = self.tables[table].get(column)
+            converters.append((column.name, column.converter.storageToValue,
+                               column.converter.valueToStorage,
+                               column.default))
+
+        def convert():
+            line = 0
+            try:
+                for values in rows:
+                    line += 1
+                    row = []
+                    for (column, toValue, toStorage, default), value in zip(
+                            converters, values):
+                        if value is None:
+                            row.append(None)
+                            continue
+                        elif value is missing:
+                            row.append(default)
+                            continue
+                        try:
+                            row.append(toStorage(toValue(value)))
+                        except (ConversionError, TypeError, ValueError,
+                                AttributeError) as e:
+                            raise ConversionError(
+                                "Invalid value %s for column '%s' in row %s "
+                                "of the COPY data: %s"
+                                % (repr(value), column, line, e))
+                    yield row
+            except bulkFormats.FormatError as e:
+                raise DataError(str(e))
+        return self._bulkInsert(table, columns, convert())
+
+    @_raise_closed
+    def _iterRows(self, table):
+        "Yield the stored values of each row in ``table`` one at a time."
+        for primaryKey in self.tables[table].file.keys():
+            yield self._getRow(table, primaryKey)
+
+    @_raise_closed
+    def _copyTo(self, table, fp, format='csv', columns=None):
+        """Write the rows of ``table`` to the text file object ``fp`` as they
+        are read so the memory used does not grow with the table."""
+        if table not in self.tables:
+            raise SQLError("Table '%s' not found." % (table))
+        if not self.tables[table].open:
+            self.tables[table]._load()
+        if columns is None:
+            columns = self._columns(table)
+        positions = []
+        converters = []
+        for column in columns:
+            if not self.tables[table].columnExists(column):
+                raise SQLError("Column '%s' does not exist in table '%s'."
+                               % (column, table))
+            positions.append(self.tables[table].get(column).position)
+            converters.append(
+                self.tables[table].get(column).converter.storageToValue)
+        if format.lower() == 'csv':
+            # The stored values are already the text COPY FROM reads back
+            rows = ([row[position] for position in positions]
+                    for row in self._iterRows(table))
+        else:
+            rows = ([convert(row[position]) for position, convert
+                     in zip(positions, converters)]
+                    for row in self._iterRows(table))
+        try:
+            affectedRows = bulkFormats.writeRows(fp, columns, rows, format)
+        except bulkFormats.FormatError as e:
+            raise DataError(str(e))
+        return {
+            'affectedRows': affectedRows,
+            'columns': columns,
+            'table': table,
+            'results':  None,
+        }
+
     @_raise_closed
     def _update(self, table, columns, where=[], sqlValues=[], values=[]):
         # if not self.tables.has_key(table):
@@ -864,6 +1266,7 @@ found = []
                            (used+used2, len(values)))
         if not self.tables[table].open:
             self.tables[table]._load()
+        self.tables[table].file.lock(True)
         positions = self._getColumnPositions(table, columns)
         keys = self._where(table, where)
         # print keys
@@ -981,124 +1384,132 @@ found = []
     def _select(self, columns, tables, where, order, values=[]):
         if isinstance(tables, str):
             tables = [tables]
+        tables = list(tables)
+        columns = list(columns)
         for table in tables:
             # if not self.tables.has_key(table):
             if table not in self.tables:
                 raise SQLError("Table '%s' not found." % (table))
             if not self.tables[table].open:
                 self.tables[table]._load()
-        cols = []
         if columns == ['*']:
             fullList = []
             if len(tables) == 1:
-                for column in self._columns(tables[0]):
-                    fullList.append(column)
-                    cols.append(self.tables[tables[0]].get(column).position)
+                fullList.extend(self.tables[tables[0]].columnNames)
             else:
                 for table in tables:
-                    offset = len(fullList)
-                    for column in self._columns(table):
+                    for column in self.tables[table].columnNames:
                         fullList.append(table+'.'+column)
-                        cols.append(offset +
-                                    self.tables[table].get(column).position)
             columns = fullList
-        elif len(tables) == 1:
-            for i in range(len(columns)):
-                if columns[i][:len(tables[0])+1] == tables[0]+'.':
-                    columns[i] = columns[i].split('.')[1]
-                elif '.' in columns[i]:
-                    raise SQLSyntaxError(
-                        "Table in column name %s is not listed after the FROM "
-                        "part of the SELECT statement %s" %
-                        (repr(columns[i].split()[0]), repr(columns[i])))
-                cols.append(self._getColumnPositions(tables[0],
-                                                     [columns[i]])[0])
+            cols = list(range(len(fullList)))
         else:
-            lengths = [0]
-            for table in tables:
-                if len(lengths) == 0:
-                    lengths.append(len(self._columns(table)))
-                else:
-                    lengths.append(lengths[-1]+len(self._columns(table)))
-            for column in columns:
-                if '.' not in column:
-                    raise SQLSyntaxError(
-                        "Expected table name followed by a '.' character "
-                        "before column name %s " % column)
-                else:
-                    res = column.split('.')
-                    if len(res) != 2:
-                        raise SQLError("Invalid column name %s too many '.' "
-                                       "characters." % column)
-                    cols.append(lengths[tables.index(res[0])] +
-                                self._getColumnPositions(res[0], [res[1]])[0])
+            cols, columns = self._rowPositions(tables, columns)
         where, used = self._convertWhereToInternal(table, where, values)
         if not used == len(values):
             raise SQLError('There are %s ? in the SQL but %s values have been '
                            'specified to replace them.' % (used, len(values)))
         keys = self._where(tables, where)
-        if keys:
-            rows = []
-            for results in keys:
-                if not isinstance(results, tuple):
-                    r = self._getRow(tables[0], results)
-                else:
-                    r = []
-                    for i in range(len(results)):
-                        for term in self._getRow(tables[i], results[i]):
-                            r.append(term)
-                rows.append(r)
-            results = []
-            for row in rows:
-                result = []
-                for col in cols:
-                    result.append(row[col])
-                results.append(result)
-            if order:
-                orderDesc = []
-                orderCols = []
-                for order in order:
-                    orderCols.append(order[0])
-                    orderDesc.append(order[1])
-                orderPos = self._getColumnPositions(table, orderCols)
-
-                class OrderCompare:
-                    def __init__(self, orderPos, orderDesc):
-                        self.orderPos = orderPos
-                        self.orderDesc = orderDesc
-
-                    def __call__(self, x, y):
-                        for i in range(len(self.orderPos)):
-                            if x[self.orderPos[i]] < y[self.orderPos[i]]:
-                                if self.orderDesc[i] == 'asc':
-                                    return -1
-                                else:
-                                    return 1
-                            elif x[self.orderPos[i]] > y[self.orderPos[i]]:
-                                if self.orderDesc[i] == 'asc':
-                                    return 1
-                                else:
-                                    return -1
-                        return 0
-
-                results.sort(OrderCompare(orderPos, orderDesc))
-            if len(tables) == 1:
-                tables = tables[0]
-            return {
-                'affectedRows': len(results),
-                'columns': columns,
-                'table': tables,
-                'results':  tuple(results),
-            }
-        else:
-            if len(tables) == 1:
-                tables = tables[0]
+        if len(tables) == 1:
+            tables = tables[0]
+        if not keys:
             return {
                 'affectedRows': 0,
                 'columns': columns,
                 'table': tables,
                 'results': [],
             }
+        # Each result is a tuple of the selected values taken straight from
+        # the stored row, which is not kept
+        if len(cols) == 1:
+            position = cols[0]
+
+            def project(row):
+                return (row[position],)
+        else:
+            project = operator.itemgetter(*cols)
+        if order:
+            orderPos, orderCols = self._rowPositions(
+                [tables] if isinstance(tables, str) else tables,
+                [column for column, direction in order])
+            # Values are sorted as Python objects, not as they are stored
+            converters = []
+            for column in orderCols:
+                if '.' in column:
+                    table, column = column.split('.')
+                else:
+                    table = tables
+                converters.append(self.tables[table].get(column)
+                                  .converter.storageToValue)
+            results = [(tuple([converters[i](row[orderPos[i]])
+                               for i in range(len(orderPos))]), project(row))
+                       for row in self._joinedRows(tables, keys)]
+            # Sort on the last column first since the sort is stable
+            for i in range(len(order)-1, -1, -1):
+                results.sort(key=lambda item: _orderKey(item[0][i]),
+                             reverse=order[i][1] == 'desc')
+            results = [result for value, result in results]
+        else:
+            results = [project(row)
+                       for row in self._joinedRows(tables, keys)]
+        return {
+            'affectedRows': len(results),
+            'columns': columns,
+            'table': tables,
+            'results': tuple(results),
+        }
+
+    def _joinedRows(self, tables, keys):
+        "Yield the row for each key returned by _where()"
+        if isinstance(tables, str):
+            for key in keys:
+                yield self._getRow(tables, key)
+        else:
+            for key in keys:
+                row = []
+                for i in range(len(key)):
+                    row.extend(self._getRow(tables[i], key[i]))
+                yield row
+
+    def _rowPositions(self, tables, columns):
+        """Return the position of each of ``columns`` in the rows of
+        ``tables`` joined together, and the names to give the columns."""
+        positions = []
+        names = []
+        if len(tables) == 1:
+            for column in columns:
+                if column[:len(tables[0])+1] == tables[0]+'.':
+                    column = column.split('.')[1]
+                elif '.' in column:
+                    raise SQLSyntaxError(
+                        "Table in column name %s is not listed after the FROM "
+                        "part of the SELECT statement %s" %
+                        (repr(column.split('.')[0]), repr(column)))
+                positions.append(
+                    self._getColumnPositions(tables[0], [column])[0])
+                names.append(column)
+            return positions, names
+        offsets = {}
+        offset = 0
+        for table in tables:
+            offsets[table] = offset
+            offset += len(self.tables[table].columns)
+        for column in columns:
+            if '.' not in column:
+                raise SQLSyntaxError(
+                    "Expected table name followed by a '.' character "
+                    "before column name %s " % column)
+            res = column.split('.')
+            if len(res) != 2:
+                raise SQLError("Invalid column name %s too many '.' "
+                               "characters." % column)
+            if res[0] not in offsets:
+                raise SQLSyntaxError(
+                    "Table in column name %s is not listed after the FROM "
+                    "part of the SELECT statement" % repr(column))
+            positions.append(offsets[res[0]] +
+                             self._getColumnPositions(res[0], [res[1]])[0])
+            names.append(column)
+        return positions, names
 
     @_raise_closed
     def _delete(self, table, where=[], values=[]):
@@ -1106,6 +1517,7 @@ found = []
             raise SQLError("Table '%s' not found." % (table))
         if not self.tables[table].open:
             self.tables[table]._load()
+        self.tables[table].file.lock(True)
         where, used = self._convertWhereToInternal(table, where, values)
         if not used == len(values):
             raise SQLError('There are %s ? in the SQL but %s values have been '
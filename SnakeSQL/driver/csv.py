@@ -13,22 +13,25 @@ from .table_base import (BaseTable, BaseColumn,
                          BaseTimeConverter)
 from .connection_base import BaseConnection
 from . import dbm
-from ..external import lockcsv
+from ..external import lockcsv, writeSet
 from ..error import *
 
 
 class CSVTable(dbm.DBMTable):
+    __slots__ = ()
+
     def _load(self):
-        self.file = lockcsv.open(self.filename)
+        self.file = writeSet.WriteSet(lockcsv.open(self.filename))
         self.open = True
 
 
 class CSVConnection(BaseConnection):
-    def __init__(self, database, driver, autoCreate, colTypesName):
+    def __init__(self, database, driver, autoCreate, colTypesName, pool=None):
         self._closed = None
         self.tableExtensions = ['.csv']
         super().__init__(database=database, driver=driver,
-                         autoCreate=autoCreate, colTypesName=colTypesName)
+                         autoCreate=autoCreate, colTypesName=colTypesName,
+                         pool=pool)
         self._closed = False
 
                     
@@ -57,9 +60,12 @@ class CSVConnection(BaseConnection):
     def _deleteTableFromDisk(self, table):
         if self._closed:
             raise Error('The connection to the database has been closed.')
-        for end in self.tableExtensions:
-            #if os.path.exists(self.database+os.sep+table+end):
-            os.remove(self.database+os.sep+table+end)
+        # The byte-offset index is only written once a table is committed
+        # and a table created in a transaction which is rolled back may not
+        # have all its files
+        for end in self.tableExtensions + ['.csv_idx', '.csv_lck', '.csv_jnl']:
+            if os.path.exists(self.database+os.sep+table+end):
+                os.remove(self.database+os.sep+table+end)
 
     def _insertRow(self, table, primaryKey, values, types=None):
         if self._closed:
@@ -75,7 +81,13 @@ class CSVConnection(BaseConnection):
                 #~ if not primaryKey:
                     #~ raise ConversionError("No column definition found for value %s. Too many values specified."%repr(value))
                 #~ v.append(repr(self.typeToInternal(self.tableStructure[table].get(primaryKey).type, values[value])))
-        self.tables[table].file[str(len(self.tables[table].file.keys())+1)] = v
+        self.tables[table].file[self.tables[table].file.nextKey()] = v
+
+    def _insertRows(self, table, rows):
+        if self._closed:
+            raise Error('The connection to the database has been closed.')
+        self.tables[table].file.extend(
+            [[repr(value) for value in values] for primaryKey, values in rows])
 
     def _deleteRow(self, table, primaryKey):
         if self._closed:
@@ -91,6 +103,13 @@ class CSVConnection(BaseConnection):
             r.append(eval(item))
         return r
     
+    def _iterRows(self, table):
+        if self._closed:
+            raise Error('The connection to the database has been closed.')
+        # Read straight through the file instead of seeking to each key
+        for row in self.tables[table].file.values():
+            yield [eval(item) for item in row]
+
     def _updateRow(self, table, oldkey, newkey, values):
         if self._closed:
             raise Error('The connection to the database has been closed.')
@@ -15,21 +15,34 @@ implementors of other drivers may have problems
 """
 
 from ..error import (Bug, InterfaceError, DataError, Error, SQLError,
+                     NotSupportedError,
                      # ConversionError, DatabaseError, ConverterError,
                      # CorruptionError, InternalError,
                      # SQLSyntaxError, SQLForeignKeyError, SQLKeyError,
                      )
 from ..external.tablePrint import table_print
+from ..external import bulkFormats
+from ..external.namedRows import rowType
 # import datetime
 # import types
 # import sys
 # import os
+import array
 import logging
+try:
+    import numpy
+except ImportError:
+    numpy = None
 # from .connection_base import _raise_closed
 # from ..external import SQLParserTools
-# import dtuple
 log = logging.getLogger()
 
+# Column types returned as an array.array by format='columns'
+_arrayTypes = {'Bool': 'b', 'Integer': 'l', 'Long': 'q', 'Float': 'd'}
+# NumPy dtype of each column type for fetch_numpy(), others are objects
+_numpyTypes = {'Bool': '?', 'Integer': 'i4', 'Long': 'i8', 'Float': 'f8',
+               'Date': 'datetime64[D]', 'DateTime': 'datetime64[s]'}
+
 
 def _raise_closed(func):
     def _wrap(self_, *argv, **kwarg):
@@ -40,6 +53,20 @@ def _raise_closed(func):
     return _wrap
 
 
+def _statement(func):
+    """Pick up changes other connections have made to the table structure
+    before the statement runs and release the shared table locks after."""
+    def _wrap(self_, *argv, **kwarg):
+        if not self_.connection._closed:
+            self_.connection._refreshTableStructure()
+        try:
+            return func(self_, *argv, **kwarg)
+        finally:
+            if not self_.connection._closed:
+                self_.connection._endStatement()
+    return _wrap
+
+
 class Cursor:
     """
     These objects represent a database cursor, which is used to
@@ -139,6 +166,7 @@ class Cursor:
             except (KeyError, IndexError):
                 Bug("No table specified or no columns present.")
 
+    @_statement
     @_raise_closed
     def executemany(self, operation, seq_of_parameters):
         """Prepare a database operation (query or command) and then
@@ -162,9 +190,21 @@ class Cursor:
         Return values are not defined."""
         if self.connection._closed:
             raise Error('The connection to the database has been closed.')
-        for parameters in seq_of_parameters:
-            self.execute(operation, parameters)
+        parsedSQL = self.connection.parser.parse(operation)
+        if parsedSQL['function'] == 'insert' and 'sqlValues' in parsedSQL:
+            # Parse and check the statement once then insert every row in
+            # batches rather than running execute() for each one
+            self.info = self.connection._insertMany(
+                parsedSQL['table'], parsedSQL['columns'],
+                parsedSQL['sqlValues'],
+                (parameters if type(parameters) in [type(()), type([])]
+                 else [parameters] for parameters in seq_of_parameters))
+            self.position = 0
+        else:
+            for parameters in seq_of_parameters:
+                self.execute(operation, parameters)
 
+    @_statement
     @_raise_closed
     def execute(self, operation, parameters=[]):
         """Prepare and execute a database operation (query or
@@ -202,6 +242,10 @@ class Cursor:
                 parsedSQL['table'], parsedSQL['columns'], parameters)
         elif parsedSQL['function'] == 'drop':
             self.info = self.connection._drop(parsedSQL['tables'])
+        elif parsedSQL['function'] == 'insert' and 'sqlRows' in parsedSQL:
+            self.info = self.connection._insertValues(
+                parsedSQL['table'], parsedSQL['columns'],
+                parsedSQL['sqlRows'], parameters)
         elif parsedSQL['function'] == 'insert':
             self.info = self.connection._insert(
                 parsedSQL['table'], parsedSQL['columns'],
@@ -222,8 +266,9 @@ class Cursor:
                     sqlValues = parsedSQL['sqlValues'], values = parameters)
             """
         elif parsedSQL['function'] == 'select':
-            del parsedSQL['function']
-            return self.select(**parsedSQL)
+            params = dict(parsedSQL)
+            del params['function']
+            return self.select(**params)
         elif parsedSQL['function'] == 'delete':
             self.info = self.connection._delete(
                 parsedSQL['table'], where=parsedSQL.get('where', []),
@@ -236,6 +281,13 @@ class Cursor:
                 self.info = self.connection._delete(
                     parsedSQL['table'], values=parameters)
             """
+        elif parsedSQL['function'] == 'copy':
+            if parsedSQL['direction'] == 'to':
+                self.copy_to(parsedSQL['table'], parsedSQL['file'],
+                             format=parsedSQL['format'])
+            else:
+                self.copy_from(parsedSQL['table'], parsedSQL['file'],
+                               format=parsedSQL['format'])
         elif parsedSQL['function'] == 'show':
             self.info = self.connection._showTables()
         else:
@@ -263,6 +315,9 @@ class Cursor:
         single sequence, or None when no more data is
         available. [6]
 
+        A single row has no columns to return so a row asked for in the
+        'columns' format is returned as a tuple.
+
         An Error (or subclass) exception is raised if the previous
         call to executeXXX() did not produce any result set or no
         call was issued yet."""
@@ -272,7 +327,9 @@ class Cursor:
             raise Error('Previous call to execute() did not produce a result '
                         'set. No results to fetch.')
         else:
-            res = self.fetchmany(1, format)
+            if (format or self.format) == 'columns':
+                format = 'tuple'
+            res = self.fetchmany(1, autoConvert, format)
             if res == ():
                 return None
             else:
@@ -307,34 +364,15 @@ class Cursor:
             raise Error('Previous call to execute() did not produce a result '
                         'set. No results to fetch.')
         else:
-            results = None
-            if autoConvert and self.info['table']:
-                converters = []
-                for column in self.info['columns']:
-                    if isinstance(self.info['table'], list):
-                        converters.append(
-                            self.connection.tables[
-                                column.split('.')[0]].get(column.split('.')[1])
-                            .converter.storageToValue)
-                    else:
-                        converters.append(
-                            self.connection.tables[
-                                self.info['table']].get(column)
-                            .converter.storageToValue)
-
-                # print len(self.info['columns']), self.info['results'][0]
-                rows = []
-                for result in self.info['results']:
-                    row = []
-
-                    for i in range(len(result)):
-                        c = converters[i]
-                        r = result[i]
-                        row.append(c(r))
-                    rows.append(tuple(row))
-                results = tuple(rows)
-            else:
-                results = tuple(self.info['results'])
+            if format is None:
+                format = self.format
+            if format == 'columns':
+                rows = self.fetchmany(size, autoConvert, 'tuple')
+                if not rows:
+                    # Empty so that fetching stops once the rows are used up
+                    return {}
+                return self._columnsFormat(rows, autoConvert)
+            results = self.info['results']
             if size is None:
                 # XXX returnVal = results[self.position:self.arraysize]
                 #   self.arraysize ignored considered infinity.
@@ -342,23 +380,32 @@ class Cursor:
             elif size == 'all':
                 pass  # results = results
             else:
-                # results[self.position:self.position+size]
-                # if max value returned
-                # print len(results)
-                if self.position + size <= len(results):
-                    res = results[self.position:self.position+size]
-                    self.position += size
-                    results = res
-                else:
+                # Fewer than size rows are returned at the end
+                results = results[self.position:self.position+size]
+                if not results:
                     return ()
+                self.position += len(results)
+            # Only the rows being returned are converted
+            if autoConvert and self.info['table']:
+                converters = [converter.storageToValue
+                              for converter in self._converters()]
+                results = tuple([
+                    tuple([convert(value) for convert, value in
+                           zip(converters, result)])
+                    for result in results])
+            else:
+                results = tuple(results)
 
             # start web.database
-            if format is None:
-                format = self.format
             if format == 'text':
                 if results is not None:
                     return table_print(self.info['columns'], results,
                                        mode='sql')
+            elif format == 'object':
+                # One Row class is made for each result set
+                if self.info.get('rowType') is None:
+                    self.info['rowType'] = rowType(self.info['columns'])
+                return tuple(map(self.info['rowType'], results))
             else:
                 rows = []
                 for row in results:
@@ -367,12 +414,6 @@ class Cursor:
                         for i in range(len(row)):
                             dict[self.info['columns'][i]] = row[i]
                         rows.append(dict)
-                    elif format == 'object':
-                        raise NotImplementedError('No dtuple/object')
-                        # descr = dtuple.TupleDescriptor(
-                        #     [[n] for n in self.info['columns']])
-                        # rows.append(
-                        #     dtuple.DatabaseTuple(descr, row))
                     elif format == 'tuple':
                         rows.append(tuple(row))
                     else:
@@ -381,6 +422,62 @@ class Cursor:
                 return tuple(rows)
             # end web.database
 
+    def _converters(self):
+        "Return the converter of each column in the result set"
+        converters = []
+        for column in self.info['columns']:
+            if isinstance(self.info['table'], list):
+                table, column = column.split('.')
+            else:
+                table = self.info['table']
+            converters.append(
+                self.connection.tables[table].get(column).converter)
+        return converters
+
+    def _columnTypes(self):
+        "Return the type of each column in the result set"
+        if not self.info['table']:
+            return ['Unknown'] * len(self.info['columns'])
+        return [converter.type for converter in self._converters()]
+
+    def _columnsFormat(self, rows, autoConvert):
+        """Return a dict of each column name and its values. Numeric columns
+        without NULLs are an array.array, other columns a list."""
+        types = self._columnTypes()
+        columns = {}
+        for i in range(len(self.info['columns'])):
+            values = [row[i] for row in rows]
+            typecode = _arrayTypes.get(types[i])
+            if autoConvert and typecode and None not in values:
+                try:
+                    values = array.array(typecode, values)
+                except OverflowError:
+                    pass
+            columns[self.info['columns'][i]] = values
+        return columns
+
+    @_raise_closed
+    def fetch_numpy(self, size='all'):
+        """Fetch rows as fetchmany() does and return them as a NumPy
+        structured array with a field for each column. The dtype of each
+        field comes from the column type. Integer and Bool columns holding
+        NULLs are objects, NULL Floats are NaN and NULL Dates NaT."""
+        if numpy is None:
+            raise NotSupportedError('fetch_numpy() needs NumPy, which is not '
+                                    'installed.')
+        rows = self.fetchmany(size, True, 'tuple')
+        dtype = []
+        types = self._columnTypes()
+        for i in range(len(self.info['columns'])):
+            kind = _numpyTypes.get(types[i], 'O')
+            if kind in ('?', 'i4', 'i8'):
+                for row in rows:
+                    if row[i] is None:
+                        kind = 'O'
+                        break
+            dtype.append((self.info['columns'][i], kind))
+        return numpy.array(list(rows), dtype=dtype)
+
     # Unused DB-API 2.0 Methods
     @_raise_closed
     def setinputsizes(self, sizes):
@@ -495,6 +592,7 @@ class Cursor:
 #
 # SQL statement generators
 #
+    @_statement
     def select(self, columns, tables, where=None, order=None, execute=None,
                format=None, distinct=False):
         # if as <> None:
@@ -528,8 +626,10 @@ class Cursor:
                 where=where,
                 order=order,
             )
+            self.position = 0
             return self.fetchall(format=format)
 
+    @_statement
     def insert(self, table, columns, values=None, sqlValues=None,
                execute=None):
         if sqlValues is None and values is None:
@@ -572,6 +672,7 @@ class Cursor:
             )
             # return sql
 
+    @_statement
     def update(self, table, columns, values=None, sqlValues=None, where=None,
                execute=None):
         if sqlValues is None and values is None:
@@ -616,6 +717,7 @@ class Cursor:
             )
             # return sql
 
+    @_statement
     def delete(self, table, where=None, execute=None):
         if execute is False:
             return self.connection.parser.buildDelete(table, where)
@@ -628,6 +730,40 @@ class Cursor:
             )
             # return sql
 
+    @_statement
+    def copy_from(self, table, file, format=None, columns=None):
+        """Load rows into ``table`` from ``file``, a text file object or a
+        file name, without parsing any SQL for each row. ``format`` is
+        'csv' or 'jsonl' and is guessed from the file name if not given. See
+        external.bulkFormats for the layout of each. ``columns`` restricts
+        the values loaded to those columns."""
+        if isinstance(file, str):
+            if format is None:
+                format = bulkFormats.guessFormat(file)
+            with open(file, 'r', encoding='utf-8', newline='') as fp:
+                return self.copy_from(table, fp, format, columns)
+        if format is None:
+            format = bulkFormats.guessFormat(getattr(file, 'name', ''))
+        self.info = self.connection._copyFrom(table, file, format, columns)
+        self.position = 0
+
+    @_statement
+    def copy_to(self, table, file, format=None, columns=None):
+        """Write every row of ``table`` to ``file``, a text file object or a
+        file name, streaming them from the table rather than building a
+        result set first. ``format`` and ``columns`` are as for copy_from()
+        and ``rowcount`` is the number of rows written."""
+        if isinstance(file, str):
+            if format is None:
+                format = bulkFormats.guessFormat(file)
+            with open(file, 'w', encoding='utf-8', newline='') as fp:
+                return self.copy_to(table, fp, format, columns)
+        if format is None:
+            format = bulkFormats.guessFormat(getattr(file, 'name', ''))
+        self.info = self.connection._copyTo(table, file, format, columns)
+        self.position = 0
+
+    @_statement
     def create(self, table, columns, execute=None):
         f = []
         for column in columns:
@@ -644,6 +780,7 @@ class Cursor:
             )
             # return sql
 
+    @_statement
     def drop(self, tables, execute=None):
         "Remove a table from the database."
         if execute is False:
@@ -12,13 +12,15 @@ from .table_base import (BaseTable, BaseColumn,
                          BaseDateConverter, BaseDatetimeConverter,
                          BaseTimeConverter)
 from .connection_base import BaseConnection
-from ..external import lockdbm
+from ..external import lockdbm, writeSet
 from ..error import Error, Bug
 
 
 class DBMTable(BaseTable):
+    __slots__ = ()
+
     def _load(self):
-        self.file = lockdbm.open(self.filename)
+        self.file = writeSet.WriteSet(lockdbm.open(self.filename))
         self.open = True
 
     def _close(self):
@@ -31,13 +33,26 @@ class DBMTable(BaseTable):
     def rollback(self):
         self.file.rollback()
 
+    def release(self):
+        self.file.release()
+
+    def isDirty(self):
+        "Return True if the table has been written to since the last commit."
+        return self.open and self.file.inTransaction()
+
+    def isReplaced(self):
+        """Return True if the table's files have been deleted or made again
+        by another connection since they were opened."""
+        return self.open and self.file.locks.replaced()
+
 
 class DBMConnection(BaseConnection):
-    def __init__(self, database, driver, autoCreate, colTypesName):
+    def __init__(self, database, driver, autoCreate, colTypesName, pool=None):
         self._closed = None
         self.tableExtensions = ['.dir', '.dat', '.bak']
         super().__init__(database=database, driver=driver,
-                         autoCreate=autoCreate, colTypesName=colTypesName)
+                         autoCreate=autoCreate, colTypesName=colTypesName,
+                         pool=pool)
         self._closed = False
 
     # Useful methods
@@ -57,9 +72,11 @@ class DBMConnection(BaseConnection):
     def _deleteTableFromDisk(self, table):
         if self._closed:
             raise Error('The connection to the database has been closed.')
-        for end in self.tableExtensions:
-            # if os.path.exists(self.database+os.sep+table+end):
-            os.remove(self.database+os.sep+table+end)
+        # A table created in a transaction which is rolled back may not
+        # have all its files
+        for end in self.tableExtensions + ['.lck', '.jnl']:
+            if os.path.exists(self.database+os.sep+table+end):
+                os.remove(self.database+os.sep+table+end)
 
     def _insertRow(self, table, primaryKey, values, types=None):
         if self._closed:
@@ -0,0 +1,134 @@
+"""Connection pool
+
+A Pool keeps up to ``size`` connections to one database open and hands
+them out with connect(). Closing a connection obtained from the pool rolls
+back anything uncommitted and returns it to the pool with its tables still
+open, so the next connect() does not have to read the table structure or
+open the table files again.
+
+The connections share the pool's parser and the ColTypes rows the table
+structure is built from. Each one still has its own table files, locks and
+write-sets so transactions are isolated from each other just as they are
+between connections made with SnakeSQL.connect(). A connection should only
+be used by one thread at a time.
+"""
+
+import threading
+from .cursor_base import Cursor
+from ..external import SQLParserTools
+from ..error import Error, OperationalError
+
+
+class PooledConnection:
+    """A connection handed out by a Pool. It behaves like the connection it
+    wraps until it is closed, after which it and its cursors can no longer
+    be used even though the connection itself goes back to the pool."""
+
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+        self._closed = False
+
+    def __getattr__(self, name):
+        if self._closed:
+            raise Error('The connection to the database has already been '
+                        'closed.')
+        return getattr(self._connection, name)
+
+    def cursor(self, format='tuple'):
+        if self._closed:
+            raise Error('The connection to the database has already been '
+                        'closed.')
+        return Cursor(self, format=format)
+
+    def close(self):
+        if self._closed:
+            raise Error('The connection to the database has already been '
+                        'closed.')
+        self._closed = True
+        self._pool._release(self._connection)
+
+    def __del__(self):
+        if self._closed is False:
+            self.close()
+
+
+class Pool:
+    def __init__(self, database, driver, size=5, autoCreate=False,
+                 colTypesName='ColTypes'):
+        if size < 1:
+            raise ValueError("A pool needs a 'size' of at least 1.")
+        self.database = database
+        self.driver = driver
+        self.size = size
+        self.autoCreate = autoCreate
+        self.colTypesName = colTypesName
+        self.parser = SQLParserTools.Transform()
+        self.schema = None  # ColTypes version and rows last read
+        self._idle = []
+        self._count = 0     # Connections made and not closed
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def connect(self, timeout=None):
+        """Return a connection from the pool, making a new one if fewer than
+        ``size`` exist. Otherwise wait up to ``timeout`` seconds, or for
+        ever if it is None, for one to be returned."""
+        with self._condition:
+            while 1:
+                if self._closed:
+                    raise Error('The pool has been closed.')
+                if self._idle:
+                    connection = self._idle.pop()
+                    break
+                if self._count < self.size:
+                    self._count += 1
+                    connection = None
+                    break
+                if not self._condition.wait(timeout):
+                    raise OperationalError(
+                        'No connection was returned to the pool within %s '
+                        'seconds.' % timeout)
+        if connection is None:
+            try:
+                connection = self.driver['Connection'](
+                    database=self.database, driver=self.driver,
+                    autoCreate=self.autoCreate,
+                    colTypesName=self.colTypesName, pool=self)
+            except Exception:
+                with self._condition:
+                    self._count -= 1
+                    self._condition.notify()
+                raise
+        return PooledConnection(self, connection)
+
+    def _release(self, connection):
+        try:
+            connection.rollback()
+        except Exception:
+            self._discard(connection)
+            raise
+        with self._condition:
+            if not self._closed:
+                self._idle.append(connection)
+                self._condition.notify()
+                return
+        self._discard(connection)
+
+    def _discard(self, connection):
+        with self._condition:
+            self._count -= 1
+            self._condition.notify()
+        if not connection._closed:
+            connection.close()
+
+    def close(self):
+        """Close the connections in the pool. Connections which are in use
+        are closed when they are returned."""
+        with self._condition:
+            self._closed = True
+            idle = self._idle
+            self._idle = []
+            self._condition.notify_all()
+        for connection in idle:
+            self._discard(connection)
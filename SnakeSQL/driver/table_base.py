@@ -45,6 +45,8 @@ log = logging.getLogger()
 
 
 class BaseConverter:
+    __slots__ = ('type', 'SQLQuotes', 'typeCode')
+
     def __init__(self, col_type: str, SQLQuotes: bool, col_type_code: int):
         self.type = col_type
         self.SQLQuotes = SQLQuotes
@@ -78,11 +80,15 @@ class BaseConverter:
 
 
 class BaseUnknownConverter(BaseConverter):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(col_type='Unknown', SQLQuotes=False, col_type_code=11)
 
 
 class BaseStringConverter(BaseConverter):
+    __slots__ = ('max',)
+
     def __init__(self, col_type: str = 'String', SQLQuotes: bool = True,
                  col_type_code: int = 5):
         super().__init__(col_type=col_type, SQLQuotes=SQLQuotes,
@@ -114,6 +120,8 @@ class BaseStringConverter(BaseConverter):
 
 
 class BaseTextConverter(BaseStringConverter):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(col_type='Text', SQLQuotes=True, col_type_code=6)
         self.max = 16777215
@@ -121,12 +129,16 @@ class BaseTextConverter(BaseStringConverter):
 
 class BaseBinaryConverter(BaseStringConverter):
     # TODO: should convert to bytes
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(col_type='Binary', SQLQuotes=True, col_type_code=7)
         self.max = 16777215
 
 
 class BaseBoolConverter(BaseConverter):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(col_type='Bool', SQLQuotes=False, col_type_code=1)
 
@@ -175,6 +187,8 @@ class BaseBoolConverter(BaseConverter):
 
 class BaseIntegerConverter(BaseConverter):
     # int32
+    __slots__ = ('max', 'min', '_conv')
+
     def __init__(self, col_type: str = 'Integer', SQLQuotes: bool = False,
                  col_type_code: int = 2):
         super().__init__(col_type=col_type, SQLQuotes=SQLQuotes,
@@ -213,6 +227,8 @@ class BaseIntegerConverter(BaseConverter):
 
 
 class BaseLongConverter(BaseIntegerConverter):  # BaseConverter):
+    __slots__ = ()
+
     def __init__(self, col_type: str = 'Long', SQLQuotes: bool = False,
                  col_type_code: int = 3):
         super().__init__(col_type=col_type, SQLQuotes=SQLQuotes,
@@ -257,6 +273,8 @@ class BaseLongConverter(BaseIntegerConverter):  # BaseConverter):
 
 
 class BaseFloatConverter(BaseLongConverter):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(col_type='Float', SQLQuotes=False, col_type_code=4)
         self.max = self.min = None
@@ -264,6 +282,8 @@ class BaseFloatConverter(BaseLongConverter):
 
 
 class BaseDateConverter(BaseConverter):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(col_type='Date', SQLQuotes=True, col_type_code=8)
 
@@ -295,6 +315,8 @@ class BaseDateConverter(BaseConverter):
 
 
 class BaseDatetimeConverter(BaseConverter):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(col_type='DateTime', SQLQuotes=True, col_type_code=9)
 
@@ -328,6 +350,8 @@ class BaseDatetimeConverter(BaseConverter):
 
 
 class BaseTimeConverter(BaseConverter):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(col_type='Time', SQLQuotes=True, col_type_code=10)
 
@@ -360,6 +384,9 @@ class BaseTimeConverter(BaseConverter):
 
 
 class BaseColumn:
+    __slots__ = ('name', 'type', 'table', 'required', 'unique', 'primaryKey',
+                 'foreignKey', 'default', 'converter', 'position')
+
     def __init__(self, table: 'BaseTable', name: str, col_type: str,
                  required: bool, unique: bool, primaryKey: bool,
                  foreignKey: str, default: str, converter: BaseConverter,
@@ -383,35 +410,57 @@ class BaseColumn:
 
 
 class BaseTable:
+    __slots__ = ('name', 'file', 'filename', 'open', 'parentTables',
+                 'childTables', '_columns', 'byName', 'byPosition',
+                 'columnNames', 'primaryKey', 'primaryKeyPosition')
+
     def __init__(self, name: str, filename: Union[str, None] = None,
                  file=None, columns: List[BaseColumn] = []):
         self.name = name
         self.file = file  # XXX
+        self.primaryKey = None
         self.columns = columns
         self.filename = filename
         self.open = False
-        self.primaryKey = None
         self.parentTables = []
         self.childTables = []
 
     def __repr__(self):
         return "<Table %s>" % self.name
 
+    @property
+    def columns(self):
+        return self._columns
+
+    @columns.setter
+    def columns(self, columns):
+        """Setting the columns rebuilds the lookups made from them so they
+        are always in step with the table structure"""
+        self._columns = columns
+        self.byName = {}
+        self.byPosition = [None] * len(columns)
+        self.primaryKey = None
+        self.primaryKeyPosition = None
+        for column in columns:
+            self.byName[column.name] = column
+            self.byPosition[column.position] = column
+            if column.primaryKey:
+                self.primaryKey = column.name
+                self.primaryKeyPosition = column.position
+        self.columnNames = tuple([column.name for column in self.byPosition])
+
     def has_key(self, key):
         return self.columnExists(key)
 
     def columnExists(self, columnName):
-        for column in self.columns:
-            if column.name == columnName:
-                return True
-        return False
+        return columnName in self.byName
 
     def get(self, columnName):
-        for column in self.columns:
-            if column.name == columnName:
-                return column
-        raise Bug("Column %s not found in table %s" %
-                  (repr(columnName), repr(self.name)))
+        try:
+            return self.byName[columnName]
+        except KeyError:
+            raise Bug("Column %s not found in table %s" %
+                      (repr(columnName), repr(self.name)))
 
     def __getitem__(self, name):
         if isinstance(name, int):
@@ -432,3 +481,12 @@ class BaseTable:
 
     def rollback(self):
         raise Exception("Should be implemented in derived class.")
+
+    def release(self):
+        raise Exception("Should be implemented in derived class.")
+
+    def isDirty(self):
+        raise Exception("Should be implemented in derived class.")
+
+    def isReplaced(self):
+        raise Exception("Should be implemented in derived class.")
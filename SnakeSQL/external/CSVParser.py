@@ -1,19 +1,21 @@
 "CSV file reader and writer functions. Fully support Excel and other CSV files."
 
 # Imports
-from StringParsers import parseCSV, buildCSV
+from .StringParsers import iterCSV, writeCSV as _writeRows
 
 # CSV
+def iterReadCSV(filename, separater=',', quote='"', linebreak='\n'):
+    "Lazily yield the rows of a CSV file."
+    with open(filename, 'r', encoding='utf-8', newline='') as fp:
+        for row in iterCSV(fp, separater, quote, linebreak):
+            yield row
+
 def readCSV(filename, separater=',', quote='"', linebreak='\n'):
-    fp = open(filename,'rb')
-    lines = fp.read()
-    fp.close()
-    return parseCSV(lines, separater, quote, linebreak)
+    return list(iterReadCSV(filename, separater, quote, linebreak))
     
 def writeCSV(filename, lines, separater=',', quote='"', linebreak='\n'):
-    fp = open(filename,'wb')
-    fp.write(buildCSV(lines, separater, quote, linebreak))
-    fp.close()
+    with open(filename, 'w', encoding='utf-8', newline='') as fp:
+        _writeRows(fp, lines, separater, quote, linebreak)
 
 if __name__ == '__main__':
     csvData = [
@@ -23,7 +25,7 @@ if __name__ == '__main__':
     writeCSV('test.csv', csvData)
     result = readCSV('test.csv')
     if csvData == result:
-        print "PASSED: The written and re-read CSV file produces identical objects to the original"
+        print("PASSED: The written and re-read CSV file produces identical objects to the original")
     else:
-        print "FAILED: The written and re-read CSV file isn't the same as the original."
-        print result
\ No newline at end of file
+        print("FAILED: The written and re-read CSV file isn't the same as the original.")
+        print(result)
@@ -9,9 +9,11 @@
 
 # Imports
 from ..error import SQLSyntaxError, SQLError
-from .StringParsers import stripBoth, stripStart
-import functools
+from collections import OrderedDict
+from types import MappingProxyType
+import re
 import string
+import threading
 
 
 # Definitions
@@ -79,6 +81,102 @@ def setTypes(list):
     # types = list
 
 
+def freeze(tree):
+    "Return a read-only copy of a parse tree with its lists made tuples"
+    if isinstance(tree, dict):
+        return MappingProxyType(dict([(k, freeze(v)) for k, v in tree.items()]))
+    elif isinstance(tree, list):
+        return tuple([freeze(item) for item in tree])
+    return tree
+
+
+# Tokens
+_token = re.compile(r"""\s*(?:
+    (?P<string>'[^']*(?:''[^']*)*')
+   |(?P<symbol><>|!=|>=|<=|==|[=<>(),?*])
+   |(?P<word>[^\s'=<>!(),?*]+)
+   |(?P<error>\S)
+)""", re.VERBOSE)
+
+
+def tokenize(sql):
+    """Split an SQL statement into a list of (kind, text) tokens in one pass.
+
+    The kind is 'string' for a quoted value (the text keeps its quotes),
+    'word' for a keyword, name or unquoted value and the symbol itself for
+    operators and punctuation. The list ends with an ('end', '') token."""
+    tokens = []
+    for match in _token.finditer(sql):
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == 'symbol':
+            kind = text
+        elif kind == 'error':
+            if text == "'":
+                raise SQLSyntaxError("The quoted value %s does not end in a "
+                                     "' character."
+                                     % repr(sql[match.start(kind):][:20]))
+            raise SQLSyntaxError("Invalid character '%s' found in the SQL."
+                                 % text)
+        tokens.append((kind, text))
+    tokens.append(('end', ''))
+    return tokens
+
+
+def describe(token):
+    "Describe a token for an error message"
+    if token[0] == 'end':
+        return 'the end of the statement'
+    return repr(token[1])
+
+
+class Tokens:
+    "The tokens of an SQL statement and the position the parser has reached"
+
+    def __init__(self, sql):
+        self.tokens = tokenize(sql)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos]
+
+    def next(self):
+        token = self.tokens[self.pos]
+        if token[0] != 'end':
+            self.pos += 1
+        return token
+
+    def isKeyword(self, *words):
+        kind, text = self.tokens[self.pos]
+        return kind == 'word' and text.lower() in words
+
+    def accept(self, kind):
+        "Move past the next token if it is of the given kind"
+        if self.tokens[self.pos][0] == kind:
+            self.pos += 1
+            return True
+        return False
+
+    def acceptKeyword(self, word):
+        if self.isKeyword(word):
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, kind, message):
+        "As accept() but raise an SQLSyntaxError with ``message`` % token"
+        if not self.accept(kind):
+            raise SQLSyntaxError(message % describe(self.peek()))
+
+    def expectKeyword(self, word, message):
+        if not self.acceptKeyword(word):
+            raise SQLSyntaxError(message % describe(self.peek()))
+
+    def end(self, message):
+        if self.tokens[self.pos][0] != 'end':
+            raise SQLSyntaxError(message % describe(self.peek()))
+
+
 # SQLParser
 class Parser:
     """Class for parsing SQL Code into more useful forms.
@@ -88,1057 +186,514 @@ class Parser:
        duplicate column names are specified in an INSERT or CREATE.
      - Values returned from this parser are fully quoted SQL eg NULL, 'NULL',
        ?, '?', 56, '56', 'James', 'James''s'
+     - The SQL is split into tokens in one pass (see tokenize()) and each
+       statement is parsed from the tokens by recursive descent.
 
-    Restrictions
-     - No newline characters should be used in the SQL except in quoted values.
+    Cache
+     - parse() keeps the last ``cacheSize`` statements it has parsed, keyed
+       by the SQL text, and returns the same read-only tree (see freeze())
+       each time one is parsed again. ``hits`` and ``misses`` count how often
+       the cache was used. A ``cacheSize`` of 0 turns the cache off.
     """
 
+    cacheSize = 128
+
+    def __init__(self, cacheSize=None):
+        if cacheSize is not None:
+            self.cacheSize = cacheSize
+        self._cacheLock = threading.Lock()
+        self.clearCache()
+
+    def clearCache(self):
+        "Forget the cached statements and reset the hit and miss counters"
+        with self._cacheLock:
+            self._cache = OrderedDict()
+            self.hits = 0
+            self.misses = 0
+
     def parse(self, sql):
+        "Parse an SQL statement, returning a read-only tree"
+        with self._cacheLock:
+            if sql in self._cache:
+                self._cache.move_to_end(sql)
+                self.hits += 1
+                return self._cache[sql]
+            self.misses += 1
+        result = freeze(self._parse(sql))
+        if self.cacheSize > 0:
+            with self._cacheLock:
+                self._cache[sql] = result
+                while len(self._cache) > self.cacheSize:
+                    self._cache.popitem(last=False)
+        return result
+
+    def _parse(self, sql):
         "Parse an SQL statement"
-        stripped = stripBoth(sql.split(' '))
-        function = stripped[0].lower()
-        if function == 'select':
-            result = self.parseSelect(sql)
-        elif function == 'delete':
-            result = self.parseDelete(sql)
-        elif function == 'insert':
-            result = self.parseInsert(sql)
-        elif function == 'update':
-            result = self.parseUpdate(sql)
-        elif function == 'create':
-            result = self.parseCreate(sql)
-        elif function == 'drop':
-            result = self.parseDrop(sql)
-        elif function == 'show':
-            if stripped[1].lower() == 'tables':
-                result = {'item': 'tables', }
-            else:
-                raise SQLSyntaxError("Expected 'TABLES' after SHOW.")
-        else:
-            raise SQLError(f"{function.upper()} is not a supported keyword.")
+        statements = {
+            'select': self._select,
+            'delete': self._delete,
+            'insert': self._insert,
+            'update': self._update,
+            'create': self._create,
+            'drop': self._drop,
+            'copy': self._copy,
+            'show': self._show,
+        }
+        tokens = Tokens(sql)
+        kind, function = tokens.peek()
+        function = function.lower()
+        if kind != 'word' or function not in statements:
+            raise SQLError("%s is not a supported keyword." % function.upper())
+        result = statements[function](tokens)
         result['function'] = function
         return result
 
     def parseDrop(self, sql):
         "Parse a DROP statement"
-        keyword = 'DROP'
-        tableIdentifier = 'TABLE'
-        table = ''
-        sql = stripBoth(sql)
-        if sql[:len(keyword)+1].lower() != keyword.lower()+' ':
-            raise SQLSyntaxError(
-                '{} term not found at start of the {} statement.'.fromat(
-                    keyword.upper(), keyword.upper()))
-        else:
-            sql = stripStart(sql[len(keyword)+1:])
-        if sql[:len(tableIdentifier)+1].lower() != tableIdentifier.lower()+' ':
-            raise SQLSyntaxError(
-                '{} term not found after {} keyword.'.format(
-                    tableIdentifier.upper(), keyword.upper()))
-        else:
-            sql = stripStart(sql[len(tableIdentifier)+1:])
-            pos = 0
-            for char in sql:
-                if char in allowedCharacters + ', ':
-                    table += char
-                else:
-                    raise SQLSyntaxError(
-                        "Table name contains the invalid character "
-                        "'{}' after '{}'.".format(char, table))
-                pos += 1
-        t = []
-        tables = table.split(',')
-        for table in tables:
-            t.append(table.strip(' '))
-        return {
-            'tables': t,
-        }
+        return self._drop(Tokens(sql))
+
+    def parseCopy(self, sql, formats=['csv', 'jsonl']):
+        """Parse a COPY statement of the form
+        COPY table FROM|TO 'file' [FORMAT csv|jsonl]
+
+        'format' is None if no FORMAT is given."""
+        return self._copy(Tokens(sql), formats)
 
     def parseCreate(self, sql, types=types):
         "Parse a CREATE statement"
-        sql, table = self._parseTable(sql, 'CREATE', 'TABLE')
-        if sql[0] != "(":
-            raise SQLSyntaxError("Expected a '(' after the table name.")
-        if sql[-1:] !=  ")":
-            raise SQLSyntaxError("Expected a ')' at the end of the CREATE statement.")
-        sql = sql[1:]
-        if (len(sql.split("'"))-1)%2:
-            raise SQLSyntaxError('Uneven number of "\'" characters perhaps due to incorrect quoting in one of the default values of the columns')
-        pos = 0
-        columns = []
-        column = {'name':None,'type':None,'unique':False,'required':False,'primaryKey':False,'foreignKey':None,'default': None,}
-        term = ''
-        part = 'name'
-        position = 'one'
-        while 1:
-            if part in ['name', 'type']:
-                if position=='one' and sql[pos] == ' ':
-                    pos+=1
-                elif position=='one' and sql[pos] in allowedCharacters: # start the name
-                    position = 'middle'
-                    term += sql[pos]
-                    pos+=1
-                elif position=='middle' and sql[pos] in allowedCharacters: # middle of name
-                    position = 'middle'
-                    term += sql[pos]
-                    pos+=1
-                elif position=='middle' and sql[pos] == ' ': # end of the name
-                    column[part] = term
-                    if part == 'name':
-                        for c in columns:
-                            if c['name'] == term:
-                                raise SQLError('Duplicate name %s for columns in CREATE statement'%(repr(term)))
-                        if term.upper() in sqlReservedWords:
-                            raise SQLError('%s is an SQL reserved word and cannot be used as a column name'%(repr(term)))
-                        if term.upper() in types:
-                            raise SQLError('%s is an SQL data type and cannot be used as a column name'%(repr(term)))
-                        part='type'
-                    elif part == 'type':
-                        #if term.upper() in sqlReservedWords:
-                        #    raise SQLError('%s is an SQL reserved word and cannot be used as a column name'%(repr(term)))
-                        if term.upper() not in types:
-                            raise SQLError('%s is not a recognised SQL data type'%(repr(term)))
-                        part='options'
-                    else:
-                        raise Bug('Unknown part of column definition in CREATE statement')
-                    position='one'
-                    term = ''
-                    pos+=1
-                elif position=='middle' and sql[pos] in [',',')']:
-                    if part == 'name':
-                        raise SQLSyntaxError("No column type specified for column %s."%(len(columns)+1))
-                    else:
-                        column[part] = term
-                        columns.append(column)
-                        column = {
-                            'name':None,'type':None,'unique':False,'required':False,'primaryKey':False,
-                            'foreignKey':None, 'default': None,
-                        }
-                        pos+=1
-                        part='name'
-                        position='one'
-                        term = ''
-                elif part == 'name':
-                    raise SQLSyntaxError("Extra ',' or ')' found in create statement.")
-                else:
-                    raise SQLSyntaxError("Column type not specified for %s."%(column['name']))
-            elif part == 'options':
-                if sql[pos:pos+6].lower() == 'unique':
-                    pos += 6
-                    column['unique'] = True
-                elif sql[pos:pos+8].lower() == 'required':
-                    pos += 8
-                    column['required'] = True
-                elif sql[pos:pos+11].lower() == 'primary key':
-                    pos += 11
-                    column['primaryKey'] = True
-                elif sql[pos] == ' ': #Whitespace
-                    pos += 1
-                elif sql[pos] in [',',')']:
-                    columns.append(column)
-                    column = {
-                        'name':None,'type':None,'unique':False,'required':False,'primaryKey':False,
-                        'foreignKey':None, 'default': None,
-                    }
-                    pos+=1
-                    part='name'
-                    position='one'
-                    term = ''
-                else: # We must be looking at the default value or foreign Key
-                    
-                    if sql[pos:pos+7].lower() == 'default':
-                        pos+=7
-                        while sql[pos] == ' ':
-                            pos+=1
-                        if sql[pos] == '=':
-                            part='default'
-                            pos += 1
-                            position = 'one'                            
-                        else:
-                            raise SQLSyntaxError("Expected '=' after DEFAULT in column %s in CREATE statement."%(len(columns)+1))
-                    elif sql[pos:pos+11].lower() == 'foreign key':
-                        pos+=11
-                        while sql[pos] == ' ':
-                            pos+=1
-                        if sql[pos] == '=':
-                            part='foreignKey'
-                            pos += 1
-                            position = 'one'                            
-                        else:
-                            raise SQLSyntaxError("Expected '=' after FOREIGN KEY in column %s in CREATE statement."%(len(columns)+1))
-                    else:
-                        raise SQLSyntaxError("Expected DEFAULT or FOREIGN KEY or the end of the statement not %s for column %s in CREATE statement."%(repr(sql[pos:pos+11]), len(columns)+1))
-            elif part=='default':  # one
-                if column['primaryKey']:  #     default 'henry' , ) 
-                    raise SQLError("PRIMARY KEY column '%s' cannot also have a DEFAULT value."%column['name'])
-                if column['foreignKey']:
-                    raise SQLError("FOREIGN KEY column '%s' cannot also have a DEFAULT value."%column['name'])
-                if position == 'one':
-                    if sql[pos] == ' ': #Whitespace
-                        pos+=1
-                    elif sql[pos] == "'":
-                        position='defaultString'
-                        column['default'] = "'"
-                        pos+=1
-                    else:
-                        position='defaultNonString'
-                        if column['default'] == None:
-                            column['default'] = sql[pos]
-                        else:
-                            column['default'] += sql[pos]
-                        pos+=1
-                elif position=='defaultNonString':
-                    if sql[pos] == ' ':
-                        position='defaultNonStringEnded'
-                        pos+=1
-                    elif sql[pos] in [',',"'"]:
-                        if sql[pos] == ",":
-                            position='defaultNonStringEnded'
-                        else:
-                            raise SQLSyntaxError("'%s' character found in the unquoted default value of column %s"%(sql[pos], len(columns)+1))
-                    elif sql[pos] == ')':
-                        position='defaultNonStringEnded'
-                    else:
-                        column['default']+=sql[pos]
-                        pos+=1
-                elif position=='defaultNonStringEnded':
-                    if sql[pos] == ' ':
-                        pos+=1
-                    elif sql[pos] in [',',')']:
-                        if column['default'] == 'NULL':
-                            if column['required']:
-                                raise SQLError("REQUIRED column '%s' cannot also have a DEFAULT value of NULL"%column['name'])
-                            column['default'] = 'NULL'
-                        columns.append(column)
-                        column = {
-                            'name':None,'type':None,'unique':False,'required':False,'primaryKey':False,
-                            'foreignKey':None, 'default': None,
-                        }
-                        pos+=1
-                        part='name'
-                        position='one'
-                        term = ''
-                    else:
-                        raise SQLSyntaxError("Non-whitespace character '%s' found after default value of column %s"%(sql[pos], len(columns)+1))
-                elif position=='defaultString':
-                    #~ if len(sql)+1 > pos and sql[pos:pos+3] == "''":
-                        #~ column['default']+="''"
-                        #~ pos+=2
-                    if sql[pos:pos+2] == "''":
-                        if column['default'] == None:
-                            column['default']="''"
-                            pos += 2
-                            columns.append(column)
-                            column = {
-                                'name':None,'type':None,'unique':False,'required':False,'primaryKey':False,
-                                'foreignKey':None, 'default': None,
-                            }
-                            part='name'
-                            position='one'
-                            term = ''
-                        else:
-                            column['default']+="''"
-                            pos += 2
-                    elif sql[pos] == "'":
-                        position='defaultEnded'
-                        column['default'] += "'"
-                        pos+=1
-                    else:
-                        if column['default'] == None:
-                            column['default']=sql[pos]
-                        else:
-                            column['default']+=sql[pos]
-                        pos+=1
-                elif position=='defaultEnded':
-                    if sql[pos] == ' ':
-                        pos+=1
-                    elif sql[pos] in [',',')']:
-                        columns.append(column)
-                        column = {
-                            'name':None,'type':None,'unique':False,'required':False,'primaryKey':False,
-                            'foreignKey':None,'default': None,
-                        }
-                        pos+=1
-                        part='name'
-                        position='one'
-                        term = ''
-                    else:
-                        raise SQLSyntaxError("Non-whitespace character '%s' found after default value of column %s"%(sql[pos], len(columns)+1))
-                else:
-                    raise Bug('Programming Error')
-
-            elif part=='foreignKey':  # one
-                if column['primaryKey']:  #     default 'henry' , ) 
-                    raise SQLError("PRIMARY KEY column '%s' cannot also have a FOREIGN KEY value."%column['name'])
-                if column['default']:
-                    raise SQLError("FOREIGN KEY column '%s' cannot also have a DEFAULT value."%column['name'])
-                if position == 'one':
-                    if sql[pos] == ' ': #Whitespace
-                        pos+=1
-                    else:
-                        position='foreignKeyNonString'
-                        if column['foreignKey'] == None:
-                            column['foreignKey'] = sql[pos]
-                        else:
-                            column['foreignKey'] += sql[pos]
-                        pos+=1
-                elif position=='foreignKeyNonString':
-                    if sql[pos] == ' ':
-                        position='foreignKeyNonStringEnded'
-                        pos+=1
-                    elif sql[pos] in [',',"'"]:
-                        if sql[pos] == ",":
-                            position='foreignKeyNonStringEnded'
-                        else:
-                            raise SQLSyntaxError("'%s' character found in the FOREIGN KEY value of column %s"%(sql[pos], len(columns)+1))
-                    elif sql[pos] == ')':
-                        position='foreignKeyNonStringEnded'
-                    else:
-                        column['foreignKey']+=sql[pos]
-                        pos+=1
-                elif position=='foreignKeyNonStringEnded':
-                    if sql[pos] == ' ':
-                        pos+=1
-                    elif sql[pos] in [',',')']:
-                        for char in column['foreignKey']:
-                            if char not in allowedCharacters:
-                                raise SQLSyntaxError('Invalid character %s in FOREIGN KEY value %s for column %s'%(repr(char), repr(column['foreignKey']), repr(column['name'])))
-                        columns.append(column)
-                        column = {
-                            'name':None,'type':None,'unique':False,'required':False,'primaryKey':False,
-                            'foreignKey':None,'default': None,
-                        }
-                        pos+=1
-                        part='name'
-                        position='one'
-                        term = ''
-                    else:
-                        raise SQLSyntaxError("Non-whitespace character '%s' found after FOREIGN KEY definition of column %s"%(sql[pos], len(columns)+1))
-                else:
-                    raise Bug('Programming Error')
-                    
-                    
-            if len(sql) <= pos:
-                break
-        primaryKey = False
-        for column in columns:
-            if column['primaryKey']:
-                if primaryKey:
-                    raise SQLError("More than one column specified as PRIMARY KEY.")
-                primaryKey = True
-        return {
-            'table':table,
-            'columns':columns,
-        }
-
-    def _parseTable(self, sql, keyword, tableIdentifier):
-        """Check the syntax of the starts of the INSERT and CREATE statements
-        
-        Returns a tuple (remaining sql, table name)."""
-        sql = stripBoth(sql)
-        if sql[:len(keyword)+1].lower() != keyword.lower()+' ':
-            raise SQLSyntaxError('%s term not found at start of the %s statement.'%(keyword.upper(), keyword.upper()))
-        else:
-            sql = stripStart(sql[len(keyword)+1:])
-        if sql[:len(tableIdentifier)+1].lower() != tableIdentifier.lower()+' ':
-            raise SQLSyntaxError('%s term not found after %s keyword.'%(tableIdentifier.upper(), keyword.upper()))
-        else:
-            sql = stripStart(sql[len(tableIdentifier)+1:])
-            table = ''
-            pos = 0
-            for char in sql:
-                if char in [',','(',' ']:
-                    break
-                elif char in allowedCharacters: 
-                    table += char
-                else:
-                    raise SQLSyntaxError("Table name contains the invalid character '%s' after '%s'."%(char, table))
-                pos += 1
-            sql = stripBoth(sql[pos:])
-        return sql, table
+        return self._create(Tokens(sql), types)
 
     def parseInsert(self, sql):
         "Parse an INSERT clause"
-        sql, table = self._parseTable(sql, 'INSERT', 'INTO')
-        if sql[0] != "(":
-            raise SQLSyntaxError("Expected a '(' after the table name.")
-        else:
-            sql=stripStart(sql[1:])
-            columns = ''
-            for char in sql:
-                if not char == ')':
-                    if char in allowedCharacters+', ':
-                        columns+= char
-                    else: 
-                        raise SQLSyntaxError("Invalid character '%s' found after '%s' in INSERT statement."%(char, columns))
-                else:
-                    break
-            if len(columns) == len(sql):
-                raise SQLSyntaxError("')' not found after column names in INSERT statement.")
-            sql = stripStart(sql[len(columns):])
-            if not sql[0] == ')':
-                raise SQLSyntaxError("Expected ')' after column names in INSERT statement.")
-            sql=stripStart(sql[1:])
-            columns = stripBoth(columns.split(','))
-            for column in columns:
-                if columns.count(column) > 1:
-                    raise SQLError("The column named '%s' has been specified more than once in the INSERT statement."%(column))
-            if sql[:6].lower() != 'values':
-                raise SQLSyntaxError("Expected 'VALUES' after column names in INSERT statement.")
-            sql = stripStart(sql[6:])
-            if sql[0] != '(':
-                raise SQLSyntaxError("Expected '(' after VALUES in INSERT statement.")
-            if sql[-1:] != ')':
-                raise SQLSyntaxError("Expected ')' after column values in INSERT statement.")
-            sql = sql[1:-1]
-            i=0
-            values = []
-            curValue = ''
-            quoted = False        #01     2  3 
-            position = 0          # value1 ,  
-            while 1:
-                if position==0:
-                    if sql[i] == ' ':
-                        pass
-                    elif sql[i:i+2] == "''" and not sql[i:i+3] == "'''":
-                        raise SQLSyntaxError("The value %s characters after VALUES is not properly quoted (it should not start '')"%i)
-                    elif sql[i] == "'": # Start of new quoted term
-                        curValue += sql[i]
-                        quoted = True
-                        position = 1
-                    else:
-                        curValue += sql[i]
-                        position = 1
-                elif position == 1:
-                    if quoted:
-                        if sql[i:i+2] == "''":
-                            curValue += "''"
-                            i+=1
-                        elif sql[i] == "'": # End of term
-                            curValue += sql[i]
-                            values.append(curValue)
-                            quoted = False
-                            curValue = ''
-                            position=2
-                        else:
-                            curValue += sql[i]
-                    else:
-                        if sql[i] == "'":
-                            raise SQLSyntaxError("Missing %s at start of value %s"%(sql[i],repr(curValue)))
-                        elif sql[i] == ' ': # End of term
-                            values.append(curValue)
-                            quoted = False
-                            curValue = ''
-                            position=2
-                        elif sql[i] == ',':# End of term
-                            values.append(curValue)
-                            quoted = False
-                            curValue = ''
-                            position=0
-                        else:
-                            curValue += sql[i]
-                elif position == 2:
-                    if sql[i] == " ":
-                        pass
-                    elif sql[i] == ",":
-                        position = 0
-                    else:
-                        raise SQLSyntaxError("Expected ',' after %s in VALUES part of INSERT statement."%(repr(values[0])))
-                if i >= len(sql)-1:
-                    if quoted and curValue:
-                        raise SQLSyntaxError("Last term in VALUES part of INSERT statement does not end in \"'\" character")
-                    else:
-                        if curValue:
-                            values.append(curValue)
-                        break
-                else:
-                    i+=1
-            if len(columns) != len(values):
-                raise SQLError("The number of columns doesn't match the number of values.")
-            return {
-                'table':table,
-                'columns':columns,
-                'sqlValues':values,
-            }
-            
+        return self._insert(Tokens(sql))
+
     def parseSelect(self, sql):
         """Parse a SELECT statement.
-        
+
         The dictionary returned from this function only contains the 'where' and 'order' keys if WHERE and ORDER BY clauses respectively exist.
         """
-        sql = stripBoth(sql)
-        order = []
-        where = []
-        keyword = 'SELECT'
-        if sql[:len(keyword)+1].lower() != keyword.lower()+' ':
-            raise SQLSyntaxError('%s term not found at start of the %s statement.'%(keyword.upper(), keyword.upper()))
-        else:
-            sql = stripStart(sql[len(keyword)+1:])
-        pos = sql.lower().find('from')
-        if pos == -1:
-            raise SQLSyntaxError('FROM term not found after column list in SELECT statement')
-        else:
-            columns = stripBoth(sql[:pos].split(','))
-            if columns[-1] == '':
-                raise SQLSyntaxError("Unexpected ',' found after column names and before FROM keyword.")
-            if columns != ['*']:
-                for column in columns:
-                    for char in column:
-                        if char not in allowedCharacters+'.':
-                            if column == '*':
-                                raise SQLSyntaxError("The special identifier '*' should be used on its own to select all columns.") 
-                            raise SQLSyntaxError("Column name '%s' contains the invalid character '%s'."%(column, char))
-                    if columns.count(column)>1:
-                        raise SQLError("Column '%s' is selected more than once in the SELECT statement."%(column))
-            tableIdentifier = 'FROM'
-            sql = stripStart(sql[pos+len(tableIdentifier)+1:])
-            table = ''
-            pos = 0
-            for char in sql:
-                if sql[pos:pos+6].lower() == ' where':
-                    break
-                elif char in ['(']:
-                    break
-                elif char in allowedCharacters+'., ':
-                    table += char
-                else:
-                    raise SQLSyntaxError("Table name contains the invalid character '%s' after '%s'."%(char, table))
-                pos += 1
-            t = table.split(',')
-            table = []
-            for tab in t:
-                if not tab.strip():
-                    raise SQLSyntaxError("Extra ',' found after %s"%repr(table[-1]))
-                elif tab.strip().lower() in ['where', 'order']:
-                    raise SQLSyntaxError("Extra ',' found after %s"%repr(table[-1]))
-                table.append(tab.strip())
-            sql = stripBoth(sql[pos:])
-            
-            if sql[:6].lower() == 'where ':
-                orderbyParts = sql.lower().split('order by')
-                if len(orderbyParts) == 1:
-                    where = stripBoth(sql[6:])
-                    order = None
-                elif len(orderbyParts) == 2:
-                    if sql[6:len(orderbyParts[0])].count("'")%2: # ie uneven number of ' in where, ie we've got the wrong order by
-                        # No order
-                        where = sql[6:]
-                        order = None
-                    else:
-                        where = stripBoth(sql[6:len(orderbyParts[0])])
-                        order = sql[len(orderbyParts[0])+8:]
-                    
-                        if order[0] != ' ':
-                            raise SQLSyntaxError('Expected whitespace after ORDER BY keyword')
-                else:
-                    order = orderbyParts[-1]
-                    if order[0] != ' ':
-                        raise SQLSyntaxError('Expected whitespace after ORDER BY keyword')
-                    where = stripBoth(sql[6:len('order by'.join(orderbyParts[:-1]))])
-            elif sql[:8].lower() == 'order by':
-                if sql[8:].lower().find('where') != -1:
-                    raise SQLSyntaxError('WHERE should come before ORDER BY in SELECT statement.')
-                order = sql[8:]
-                if order[0] != ' ':
-                    raise SQLSyntaxError('Expected whitespace after ORDER BY keyword')
-                        
-            else:
-                pass # No ORDER BY or WHERE clauses
-            if order and stripBoth(order):
-                order = self._parseOrder(stripBoth(order))
-            if where:
-                where = self._parseWhere(where, tables=table)
-        result = {
-            'tables':table,
-            'columns': columns,
-        }
-        if order:
-            result['order']=order
-        if where:
-            result['where']=where
-        return result
-        
-    def _parseOrder(self, order):
-        "Parse an ORDER BY clause begining with 'ORDER BY '"
-        order = stripBoth(order)
-        #if order[:8].lower() != 'order by':
-         #   raise Bug('The ORDER BY keyword is not present')
-        #if order[8] != ' ':
-        #    raise SQLSyntaxError("No whitespace found after ORDER BY keyword")
-        #order = order[8:]
-        parts = order.split(',')
-        orderPairs = []
-        cols = []
-        for part in parts:
-            while part[0] == ' ':
-                part = part[1:]
-            while part[-1:] == ' ':
-                part = part[1:]
-            if not part:
-                raise SQLSyntaxError('Too many commas in order clause.')
-            pair = part.split(' ')
-            if len(pair) == 1:
-                if pair[0] in cols:
-                    raise SQLError("You have specified %s more than once in the ORDER BY clause."%(repr(pair[0])))
-                else:
-                    cols.append(pair[0])
-                    orderPairs.append([pair[0],'asc'])
-            elif len(pair) == 2:
-                if pair[0] in cols:
-                    raise SQLError("You have specified %s more than once in the ORDER BY clause."%(repr(pair[0])))
-                elif pair[1].lower() not in ['asc','desc']:
-                    raise SQLSyntaxError("Expected 'ASC' or 'DESC' after %s not %s."%(repr(pair[0]),repr(pair[1])))
-                else:
-                    cols.append(pair[0])
-                    orderPairs.append([pair[0],pair[1].lower()])
-            else:
-                raise SQLSyntaxError("Order clause not properly formed near '%s'."%(repr(part)))
-        return orderPairs
+        return self._select(Tokens(sql))
+
+    def parseUpdate(self, sql):
+        "Parse an UPDATE statement"
+        return self._update(Tokens(sql))
 
-    def _parseWhere(self, where, 
+    def parseDelete(self, sql):
+        "Parse a DELETE statement"
+        return self._delete(Tokens(sql))
+
+    def _parseWhere(self, where,
                     compOperators=['>','<','=','>=','<=','<>','!=','like'],
                     logicalOperators=['and', 'or'], tables=[]):
         """Parse WHERE clause string into a list of parts
-        
+
         Returns a list of 'not', '(', ')', logicalOperator or [columnName, comparisonOperator, value] objects.
-        e.g. This:    ((one = '''''' and not (  two='22' ))) 
+        e.g. This:    ((one = '''''' and not (  two='22' )))
              Returns: ['(', '(', ['one', '=', "''''''"], 'and', 'not', '(', ['two', '=', "'22'"], ')', ')', ')']
         """
-        #if where[:5].upper() != 'WHERE':
-        #    raise SQLSyntaxError("Expected 'WHERE' at begining of WHERE clause")
-        #if where[5] != ' ':
-        #    raise SQLSyntaxError("Expected whitespace after WHERE keyword")
-        #where = where[5:]
-        def longest(a, b):
-            if len(a) > len(b):
-                return -1
-            else:
-                return 0
-        compOperators.sort(key=functools.cmp_to_key(longest))
-        
-        where = self._parseWhereString(where, compOperators, logicalOperators, tables)
-        n=[]
-        i = 0
-        closed = []
+        tokens = Tokens(where)
+        if tokens.peek()[0] == 'end':
+            return []
+        blocks = self._where(tokens, tables, compOperators, logicalOperators)
+        tokens.end("Unexpected %s at the end of the WHERE clause.")
+        return blocks
+
+    def _parseOrder(self, order):
+        "Parse an ORDER BY clause without the 'ORDER BY ' keywords"
+        tokens = Tokens(order)
+        orderPairs = self._order(tokens)
+        tokens.end("Expected ',' or the end of the ORDER BY clause not %s.")
+        return orderPairs
+
+    #
+    # Recursive descent over the tokens
+    #
+
+    def _name(self, tokens, what, qualified=False):
+        "Return the next token, which should be a table or column name"
+        token = tokens.next()
+        if token[0] != 'word':
+            raise SQLSyntaxError("Expected a %s not %s." %
+                                 (what, describe(token)))
+        name = token[1]
+        for char in name:
+            if char not in allowedCharacters and not (qualified and
+                                                      char == '.'):
+                raise SQLSyntaxError("The %s %s contains the invalid "
+                                     "character '%s'." %
+                                     (what, repr(name), char))
+        return name
+
+    def _names(self, tokens, what, qualified=False):
+        "Return the comma separated list of names that comes next"
+        names = [self._name(tokens, what, qualified)]
+        while tokens.accept(','):
+            names.append(self._name(tokens, what, qualified))
+        return names
+
+    def _value(self, tokens, where):
+        "Return the next token as a quoted SQL value, an unquoted value or ?"
+        kind, text = token = tokens.next()
+        if kind == 'string' or kind == '?':
+            return text
+        elif kind == 'word':
+            if text.upper() == 'NULL':
+                return 'NULL'
+            return text
+        raise SQLSyntaxError("Expected a value %s not %s." %
+                             (where, describe(token)))
+
+    def _select(self, tokens):
+        tokens.expectKeyword('select', "Expected SELECT at the start of the "
+                             "SELECT statement not %s.")
+        columns = []
         while 1:
-            if where[i] in ['not','(']:
-                n.append(where[i])
-                i+=1
-            elif where[i] in [')']:
-                closed.append(')')
-                i+=1
-            else:
-                n.append(where[i])
-                for item in closed:
-                    n.append(item)
-                closed = []
-                i+=1
-            if i > len(where)-1:
+            if tokens.accept('*'):
+                if columns or not tokens.isKeyword('from'):
+                    raise SQLSyntaxError("The special identifier '*' should "
+                                         "be used on its own to select all "
+                                         "columns.")
+                columns.append('*')
+                break
+            column = self._name(tokens, 'column name', True)
+            if column in columns:
+                raise SQLError("Column '%s' is selected more than once in the "
+                               "SELECT statement." % (column))
+            columns.append(column)
+            if not tokens.accept(','):
                 break
-        return n
+        tokens.expectKeyword('from', "Expected FROM after the column names in "
+                             "the SELECT statement not %s.")
+        tables = self._names(tokens, 'table name')
+        result = {
+            'tables': tables,
+            'columns': columns,
+        }
+        where = None
+        if tokens.acceptKeyword('where'):
+            where = self._where(tokens, tables)
+        if tokens.acceptKeyword('order'):
+            tokens.expectKeyword('by', "Expected BY after ORDER not %s.")
+            result['order'] = self._order(tokens)
+        if where:
+            result['where'] = where
+        tokens.end("Expected WHERE, ORDER BY or the end of the SELECT "
+                   "statement not %s.")
+        return result
 
-    def _parseWhereString(self, where, compOperators, logicalOperators, tables):
-        """Do initial parsing of a WHERE clause string
-        
-        Returns a list of 'not', '(', ')', logicalOperator or [columnName, comparisonOperator, value] objects where the ')' occur before their repective [columnName, comparisonOperator, value] object.
-        """
-        if not where:               # -2  -1    0  1    2 3 4 5 6 7    8 9   10
-            return []               #  | (| not (| |test| |=| |'|3|' ) | |and| |  
-        elif where.count('(') > where.count(')'):
-            raise SQLSyntaxError("Expected ')' in WHERE clause")
-        elif where.count('(') < where.count(')'):
-            raise SQLSyntaxError("Extra ')' character found in WHERE clause")
-        pos = 0
-        position = -2
+    def _where(self, tokens, tables=[],
+               compOperators=['>','<','=','>=','<=','<>','!=','like'],
+               logicalOperators=['and', 'or']):
+        "Parse the conditions of a WHERE clause joined by logical operators"
         blocks = []
-        terms = []
-        term = ''
-        quote = False
+        self._condition(tokens, blocks, tables, compOperators,
+                        logicalOperators)
         while 1:
-            if position == -2:
-                if where[pos] == '(':
-                    blocks.append('(')
-                    pos+=1
-                elif where[pos] == ' ':
-                    pos+=1
-                elif where[pos:pos+3] == 'not' and where[pos+3] == ' ':
-                    blocks.append('not')
-                    pos+=3
-                elif where[pos] in allowedCharacters:
-                    position = 1
-                    term+=where[pos]
-                    pos+=1
-                else:
-                    if len(blocks) == 0:
-                        raise SQLSyntaxError("Invalid character '%s' found after WHERE keyword."%(where[pos]))
-                    else:
-                        raise SQLSyntaxError("Invalid character '%s' found after '%s' in WHERE clause."%(where[pos], blocks[0][0]))
-            elif position == 1:
-                if where[pos] in allowedCharacters:
-                    term+=where[pos]
-                    pos+=1
-                elif where[pos] == '.':
-                    if term not in tables:
-                        raise SQLError('Table %s used in WHERE clause is not one of the tables being operated on'%repr(term))
-                    term+=where[pos]
-                    pos+=1
-                elif where[pos] == ' ': # End of first column
-                    position = 2
-                    terms.append(term)
-                    term = ''
-                    pos+=1
-                else:
-                    terms.append(term)
-                    term = ''
-                    position=2
-            elif position == 2:
-                if where[pos] == ' ': 
-                    pos+=1
-                else:
-                    found = False
-                    if where[pos:pos+2].lower() == '==':
-                        raise SQLError("Found invalid operator '==' in WHERE clause")
-                    for operator in compOperators:
-                        if where[pos:pos+len(operator)].lower() in compOperators: # The next section is a two character operator
-                            terms.append(where[pos:pos+len(operator)].lower())
-                            term = ''
-                            pos+=len(operator)
-                            position = 4 
-                            found = True
-                        
-                    if not found:
-                        raise SQLSyntaxError("Invalid character '%s' found after '%s' in WHERE clause."%(where[pos], terms[0]))
-            elif position == 4:               
-                if where[pos] == ' ': 
-                    pos+=1
-                elif where[pos] == "'":
-                    term += "'"
-                    quote=True
-                    pos+=1
-                    position = 6
-                elif where[pos] in allowedCharacters+'?':
-                    position = 6
-                    term += where[pos]
-                    pos+=1
-                else:
-                    raise SQLSyntaxError("Invalid character '%s' found after '%s' in WHERE clause."%(where[pos], terms[1]))
-            elif position == 6:
-                if not quote:
-                    if where[pos] in ["'",',','\n']:
-                        raise SQLSyntaxError("Invalid character '%s' found after operator in WHERE clause. Try removing the space after the operator or quoting the value."%(where[pos]))
-                    elif where[pos] == ' ':
-                        if term.upper() == 'NULL':
-                            terms.append('NULL')
-                        else:
-                            terms.append(term)
-                        term = ''
-                        position = 8
-                        pos+=1
-                    elif where[pos] == ')':
-                        if term.upper() == 'NULL':
-                            terms.append('NULL')
-                        else:
-                            terms.append(term)
-                        term = ''
-                        blocks.append(')')
-                        position = 8
-                        pos+=1
-                    else:
-                        term+=where[pos]
-                        pos+=1
-                        if len(where) <= pos:
-                            if term.upper() == 'NULL':
-                                terms.append('NULL')
-                            else:
-                                terms.append(term)
-                            blocks.append(terms)
-                            return blocks
-                else:
-                    if where[pos] == "'" and where[pos:pos+2] == "''":
-                        term += "''"
-                        pos += 2
-                    elif where[pos] == "'" and where[pos:pos+2] == "' ":
-                        term += "'"
-                        pos += 2
-                        terms.append(term)
-                        term = ''
-                        position = 8
-                    elif where[pos] == "'" and where[pos:pos+2] == "')":
-                        term += "'"
-                        pos += 2
-                        terms.append(term)
-                        blocks.append(')')
-                        term = ''
-                        position = 8
-                    elif where[pos] == "'" and len(where) == pos+1:
-                        term += "'"
-                        terms.append(term)
-                        blocks.append(terms)
-                        return blocks
-                    elif where[pos] == "'":
-                        raise SQLSyntaxError("Invalid character '%s' found after '%s' in WHERE clause."%(where[pos], term))
-                    else:
-                        term+=where[pos]
-                        pos+=1
-            elif position == 8:
-                if where[pos] == ' ':
-                    pos+=1
-                elif where[pos] == ')':
-                    blocks.append(')')
-                    pos+=1
-                else:
-                    max = 0
-                    found = False
-                    for operator in logicalOperators:
-                        if len(operator)>max:
-                            max = len(operator)
-                    r = [i for i in range(1,max)]
-                    r.reverse()
-                    for length in r:
-                        if length < len(where[pos:]):
-                            if where[pos:pos+length+1].lower() in logicalOperators and where[pos+length+1] == ' ':
-                                blocks.append(terms)
-                                blocks.append(where[pos:pos+length+1].lower())
-                                terms=[]
-                                term = ''
-                                pos+=length+1
-                                position = -2
-                                quote=False
-                                found = True
-                    if not found:
-                        raise SQLSyntaxError("Extra character %s found after %s in WHERE clause."%(repr(where[pos+1]), repr(where[pos])))
-            else:
-                raise Bug('Unknown position in parsing WHERE clause.')
-            
-            if len(where) < pos+1:
-                
-                if len(terms) != 3:
-                    terms.append(term)
-                    if len(terms) != 3:
-                        raise Bug('Unexpected term length of %s whilst parsing last term of WHERE clause'%repr(terms))
-                
-                blocks.append(terms[:3])
+            kind, text = tokens.peek()
+            if kind != 'word' or text.lower() not in logicalOperators:
                 return blocks
-                #elif 
-                #    return blocks
-                #else:
-                    #raise SQLSyntaxError("WHERE clause ended too early.")
+            tokens.next()
+            blocks.append(text.lower())
+            self._condition(tokens, blocks, tables, compOperators,
+                            logicalOperators)
 
-    def parseUpdate(self, sql):
-        "Parse an UPDATE statement"
-        sql = stripBoth(sql)
-        table = ''
-        where = []
-        columns = []
-        keyword = 'UPDATE'
-        if sql[:len(keyword)+1].lower() != keyword.lower()+' ':
-            raise SQLSyntaxError('%s term not found at start of the %s statement.'%(keyword.upper(), keyword.upper()))
+    def _condition(self, tokens, blocks, tables, compOperators,
+                   logicalOperators):
+        "Parse NOT condition, ( conditions ) or column operator value"
+        if tokens.acceptKeyword('not'):
+            blocks.append('not')
+            self._condition(tokens, blocks, tables, compOperators,
+                            logicalOperators)
+        elif tokens.accept('('):
+            blocks.append('(')
+            blocks.extend(self._where(tokens, tables, compOperators,
+                                      logicalOperators))
+            tokens.expect(')', "Expected ')' in WHERE clause not %s.")
+            blocks.append(')')
         else:
-            sql = stripStart(sql[len(keyword)+1:])
-        pos = sql.lower().find('set')
-        if pos == -1:
-            raise SQLSyntaxError('SET term not found after table name in UPDATE statement')
-        else:
-            table = ''
-            for char in stripBoth(sql[:pos]):
-                if char in allowedCharacters:
-                    table+=char
-                else:
-                    raise SQLSyntaxError("Invalid character '%s' near '%s' before SET keyword."%(char, table))
-            sql = stripStart(sql[pos+len('set')+1:])
-            whereParts = sql.lower().split(' where')
-            if len(whereParts) == 1:
-                columns = stripBoth(sql[:len(whereParts[0])])
-            elif len(whereParts) == 2:
-                columns = stripBoth(sql[:len(whereParts[0])])
-                where = self._parseWhere(stripBoth(sql[len(whereParts[0])+6:]))
-            else:
-                raise SQLSyntaxError("More than one WHERE clause specified.")
-            cols = []
-            vals = []
-            for col, op, val in self._parseColumns(columns):
-                cols.append(col)
-                vals.append(val)
+            column = self._name(tokens, 'column name', True)
+            if '.' in column and tables:
+                table = column.split('.')[0]
+                if table not in tables:
+                    raise SQLError('Table %s used in WHERE clause is not one '
+                                   'of the tables being operated on'
+                                   % repr(table))
+            kind, operator = token = tokens.next()
+            if operator == '==':
+                raise SQLError("Found invalid operator '==' in WHERE clause")
+            operator = operator.lower()
+            if kind == 'string' or operator not in compOperators:
+                raise SQLSyntaxError("Expected an operator after %s in WHERE "
+                                     "clause not %s." %
+                                     (repr(column), describe(token)))
+            value = self._value(tokens, 'after %s %s in WHERE clause' %
+                                (column, operator))
+            blocks.append([column, operator, value])
+
+    def _order(self, tokens):
+        orderPairs = []
+        cols = set()
+        while 1:
+            column = self._name(tokens, 'column name', True)
+            if column in cols:
+                raise SQLError("You have specified %s more than once in the "
+                               "ORDER BY clause." % (repr(column)))
+            cols.add(column)
+            direction = 'asc'
+            if tokens.isKeyword('asc', 'desc'):
+                direction = tokens.next()[1].lower()
+            elif tokens.isKeyword('where'):
+                raise SQLSyntaxError('WHERE should come before ORDER BY in '
+                                     'SELECT statement.')
+            elif tokens.peek()[0] == 'word':
+                raise SQLSyntaxError("Expected 'ASC' or 'DESC' after %s not "
+                                     "%s." % (repr(column),
+                                              describe(tokens.peek())))
+            orderPairs.append([column, direction])
+            if not tokens.accept(','):
+                return orderPairs
+
+    def _insert(self, tokens):
+        tokens.expectKeyword('insert', "Expected INSERT at the start of the "
+                             "INSERT statement not %s.")
+        tokens.expectKeyword('into', "INTO term not found after INSERT "
+                             "keyword, found %s.")
+        table = self._name(tokens, 'table name')
+        tokens.expect('(', "Expected a '(' after the table name not %s.")
+        columns = self._names(tokens, 'column name')
+        tokens.expect(')', "Expected ')' after column names in INSERT "
+                      "statement not %s.")
+        if len(set(columns)) != len(columns):
+            for column in columns:
+                if columns.count(column) > 1:
+                    raise SQLError("The column named '%s' has been specified "
+                                   "more than once in the INSERT statement."
+                                   % (column))
+        tokens.expectKeyword('values', "Expected 'VALUES' after column names "
+                             "in INSERT statement not %s.")
+        rows = []
+        while 1:
+            tokens.expect('(', "Expected '(' before the values in INSERT "
+                          "statement not %s.")
+            values = []
+            if not tokens.accept(')'):
+                while 1:
+                    values.append(self._value(
+                        tokens, 'in the VALUES part of INSERT statement'))
+                    if not tokens.accept(','):
+                        break
+                tokens.expect(')', "Expected ',' or ')' after the values in "
+                              "INSERT statement not %s.")
+            if len(columns) != len(values):
+                raise SQLError("The number of columns doesn't match the "
+                               "number of values.")
+            rows.append(values)
+            if not tokens.accept(','):
+                break
+        tokens.end("Expected ',' or the end of the INSERT statement after the "
+                   "values not %s.")
+        if len(rows) > 1:
+            return {
+                'table': table,
+                'columns': columns,
+                'sqlRows': rows,
+            }
+        return {
+            'table': table,
+            'columns': columns,
+            'sqlValues': rows[0],
+        }
+
+    def _update(self, tokens):
+        tokens.expectKeyword('update', "Expected UPDATE at the start of the "
+                             "UPDATE statement not %s.")
+        table = self._name(tokens, 'table name')
+        tokens.expectKeyword('set', "SET term not found after table name in "
+                             "UPDATE statement, found %s.")
+        cols = []
+        vals = []
+        while 1:
+            column = self._name(tokens, 'column name')
+            tokens.expect('=', "Expected '=' after %s in UPDATE statement not "
+                          "%%s." % repr(column))
+            cols.append(column)
+            vals.append(self._value(tokens, 'after %s= in UPDATE statement'
+                                    % column))
+            if not tokens.accept(','):
+                break
         result = {
-            'table':table,
+            'table': table,
             'columns': cols,
             'sqlValues': vals,
         }
-        if where:
-            result['where'] = where
+        if tokens.acceptKeyword('where'):
+            result['where'] = self._where(tokens, [table])
+        tokens.end("Expected ',', WHERE or the end of the UPDATE statement "
+                   "not %s.")
         return result
 
-    def _parseColumns(self, sql):
-        "Split up the columnName='value' pairs in an update clause"
-        if sql.count("'")%2:
-            raise SQLSyntaxError("Expected ' character in SET part of UPDATE clause")
-        compOperators=['=']   #0  1   2 3 4 5 6  7 8 9 10
-        update = sql          #|  |one| |=| |'67'| |,| |
-        pos = 0
-        position = 0
-        blocks = []
-        terms = []
-        term = ''
-        quote = False
-        while 1:
-            if position == 0:
-                if update[pos] == ' ':
-                    pos+=1
-                elif update[pos] in allowedCharacters:
-                    position = 1
-                    term+=update[pos]
-                    pos+=1
-                else:
-                    if len(blocks) == 0:
-                        raise SQLSyntaxError("Invalid character '%s' found after SET keyword."%(update[pos]))
-                    else:
-                        raise SQLSyntaxError("Invalid character '%s' found after '%s' in UPDATE statement"%(update[pos], blocks[0][0]))
-            elif position == 1:
-                if update[pos] in allowedCharacters:
-                    term+=update[pos]
-                    pos+=1
-                elif update[pos] == ' ': # End of first column
-                    position = 2
-                    terms.append(term)
-                    term = ''
-                    pos+=1
-                else:
-                    terms.append(term)
-                    term = ''
-                    position=2
-            elif position == 2:
-                if update[pos] == ' ': 
-                    pos+=1
-                elif update[pos:pos+2] in compOperators: # The next section is a two character operator
-                    terms.append(update[pos:pos+2])
-                    term = ''
-                    pos+=2
-                    position = 4
-                elif update[pos] in compOperators: # The next section is a one character operator
-                    terms.append(update[pos])
-                    term=''
-                    pos+=1
-                    position = 4
-                else:
-                    raise SQLSyntaxError("Invalid character '%s' found after '%s' in UPDATE statement"%(update[pos], terms[0]))
-            elif position == 4:        
-                if update[pos] == ' ':
-                    pos+=1
-                elif update[pos] == "'":
-                    quote=True
-                    term += "'"
-                    pos+=1
-                    position = 6
-                elif update[pos] in allowedCharacters:
-                    position = 6
-                    term += update[pos]
-                    pos+=1
-                elif update[pos] == '?':
-                    terms.append('?')
-                    term = ''
-                    position = 8
-                    pos+=1
-                    if len(update) == pos:
-                        blocks.append(terms)
-                        return blocks
-                else:
-                    raise SQLSyntaxError("Invalid character '%s' found after '%s' in UPDATE statement"%(update[pos], terms[1]))
-            elif position == 6: # END SAME AS WHERE CODE
-                if not quote:
-                    if update[pos] in ["'",'\n']:
-                        raise SQLSyntaxError("Invalid character '%s' found after = in UPDATE statement. Try removing the space after the operator or quoting the value."%(update[pos]))
-                    elif update[pos] == ' ':
-                        if term.upper() == 'NULL':
-                            terms.append("NULL")
-                        else:
-                            terms.append(term)
-                        term = ''
-                        position = 8
-                        pos+=1
-                    elif update[pos] == ',':
-                        if term.upper() == 'NULL':
-                            terms.append('NULL')
-                        else:
-                            terms.append(term)
-                        blocks.append(terms)
-                        terms=[]
-                        term = ''
-                        pos+=1
-                        position = 0
-                    else:
-                        term+=update[pos]
-                        pos+=1
-                        if len(update) <= pos:
-                            if term.upper() == 'NULL':
-                                terms.append('NULL')
-                            else:
-                                terms.append(term)
-                            blocks.append(terms)
-                            return blocks
-                else:
-                    if pos >= len(update)-1 and update[pos] == "'":
-                        term += "'"
-                        terms.append(term)
-                        pos+=1
-                        position = 8 
-                        quote=False
-                        blocks.append(terms)
-                        return blocks
-                    elif update[pos] == "'" and update[pos:pos+2] == "''":
-                        term += "''"
-                        pos += 2
-                    elif update[pos] == "'" and update[pos:pos+2] == "' ":
-                        pos += 2
-                        term += "'"
-                        quoted=False
-                        terms.append(term)
-                        term = ''
-                        position = 8
-                    elif update[pos] == "'" and update[pos:pos+2] == "',":
-                        term += "'"
-                        terms.append(term)
-                        pos+=1
-                        position = 8 
-                        quote=False
-                    elif update[pos] == "'":
-                        raise SQLSyntaxError("Invalid character '%s' found after '%s' in UPDATE statement"%(update[pos], term))
-                    else:
-                        term+=update[pos]
-                        pos+=1
-            elif position == 8:
-                if update[pos] == ' ':
-                    pos+=1
-                elif update[pos] == ',':
-                    blocks.append(terms)
-                    terms=[]
-                    term = ''
-                    pos+=1
-                    position = 0
-                    quote=False
-                else:
-                    raise Exception("Unexpected character %s in WHERE clause at position %s"%(repr(update[pos]), repr(pos)))
-            if len(update) <= pos:
-                if len(terms) == 2:
-                    terms.append(term)
-                    blocks.append(terms)
-                    return blocks
-                else:
-                    raise SQLSyntaxError("SET clause ended too early. Perhaps there was an extra comma?")
-        
-    def parseDelete(self, sql):
-        "Parse a DELETE statement"
-        sql, table = self._parseTable(sql, 'DELETE', 'FROM')
-        sql = stripBoth(sql)
-        where=[]
-        if sql[:6].lower() == 'where ':
-            where = self._parseWhere(stripStart(sql[6:]))
+    def _delete(self, tokens):
+        tokens.expectKeyword('delete', "Expected DELETE at the start of the "
+                             "DELETE statement not %s.")
+        tokens.expectKeyword('from', "FROM term not found after DELETE "
+                             "keyword, found %s.")
         result = {
-            'table':table,
+            'table': self._name(tokens, 'table name'),
         }
-        if where:
-            result['where'] = where
+        if tokens.acceptKeyword('where'):
+            result['where'] = self._where(tokens, [result['table']])
+        tokens.end("Expected WHERE or the end of the DELETE statement not %s.")
         return result
-        
+
+    def _drop(self, tokens):
+        tokens.expectKeyword('drop', "Expected DROP at the start of the DROP "
+                             "statement not %s.")
+        tokens.expectKeyword('table', "TABLE term not found after DROP "
+                             "keyword, found %s.")
+        tables = self._names(tokens, 'table name')
+        tokens.end("Expected ',' or the end of the DROP statement not %s.")
+        return {
+            'tables': tables,
+        }
+
+    def _copy(self, tokens, formats=['csv', 'jsonl']):
+        tokens.expectKeyword('copy', "Expected COPY at the start of the COPY "
+                             "statement not %s.")
+        table = self._name(tokens, 'table name')
+        if not tokens.isKeyword('from', 'to'):
+            raise SQLSyntaxError("Expected FROM or TO after the table name in "
+                                 "the COPY statement.")
+        direction = tokens.next()[1].lower()
+        kind, filename = tokens.next()
+        if kind != 'string':
+            raise SQLSyntaxError("Expected a quoted file name after %s in the "
+                                 "COPY statement." % direction.upper())
+        filename = filename[1:-1].replace("''", "'")
+        format = None
+        if tokens.acceptKeyword('format'):
+            kind, format = tokens.next()
+            if kind != 'word' or format.lower() not in formats:
+                raise SQLSyntaxError("Unknown COPY format %s, expected one of "
+                                     "%s." % (repr(format), ', '.join(formats)))
+            format = format.lower()
+        tokens.end("Expected FORMAT or the end of the COPY statement not %s.")
+        return {
+            'table': table,
+            'direction': direction,
+            'file': filename,
+            'format': format,
+        }
+
+    def _show(self, tokens):
+        tokens.expectKeyword('show', "Expected SHOW at the start of the SHOW "
+                             "statement not %s.")
+        tokens.expectKeyword('tables', "Expected 'TABLES' after SHOW not %s.")
+        tokens.end("Expected the end of the SHOW statement not %s.")
+        return {
+            'item': 'tables',
+        }
+
+    def _create(self, tokens, types=types):
+        tokens.expectKeyword('create', "Expected CREATE at the start of the "
+                             "CREATE statement not %s.")
+        tokens.expectKeyword('table', "TABLE term not found after CREATE "
+                             "keyword, found %s.")
+        table = self._name(tokens, 'table name')
+        tokens.expect('(', "Expected a '(' after the table name not %s.")
+        columns = []
+        while 1:
+            columns.append(self._columnDefinition(tokens, columns, types))
+            if not tokens.accept(','):
+                break
+        tokens.expect(')', "Expected ',' or ')' after the column definitions "
+                      "in CREATE statement not %s.")
+        tokens.end("Expected the end of the CREATE statement after ')' not "
+                   "%s.")
+        primaryKey = False
+        for column in columns:
+            if column['primaryKey']:
+                if primaryKey:
+                    raise SQLError("More than one column specified as PRIMARY "
+                                   "KEY.")
+                primaryKey = True
+        return {
+            'table': table,
+            'columns': columns,
+        }
+
+    def _columnDefinition(self, tokens, columns, types):
+        "Parse a column name, its type and any options in a CREATE statement"
+        number = len(columns) + 1
+        if tokens.peek()[0] in [',', ')']:
+            raise SQLSyntaxError("Extra ',' or ')' found in create statement.")
+        name = self._name(tokens, 'column name')
+        for c in columns:
+            if c['name'] == name:
+                raise SQLError('Duplicate name %s for columns in CREATE '
+                               'statement' % (repr(name)))
+        if name.upper() in sqlReservedWords:
+            raise SQLError('%s is an SQL reserved word and cannot be used as a '
+                           'column name' % (repr(name)))
+        if name.upper() in types:
+            raise SQLError('%s is an SQL data type and cannot be used as a '
+                           'column name' % (repr(name)))
+        kind, type = tokens.peek()
+        if kind != 'word':
+            raise SQLSyntaxError("No column type specified for column %s."
+                                 % number)
+        tokens.next()
+        if type.upper() not in types:
+            raise SQLError('%s is not a recognised SQL data type'
+                           % (repr(type)))
+        column = {
+            'name': name, 'type': type, 'unique': False, 'required': False,
+            'primaryKey': False, 'foreignKey': None, 'default': None,
+        }
+        while 1:
+            if tokens.acceptKeyword('unique'):
+                column['unique'] = True
+            elif tokens.acceptKeyword('required'):
+                column['required'] = True
+            elif tokens.acceptKeyword('primary'):
+                tokens.expectKeyword('key', "Expected KEY after PRIMARY in "
+                                     "column %s in CREATE statement not %%s."
+                                     % number)
+                column['primaryKey'] = True
+            elif tokens.acceptKeyword('default'):
+                tokens.expect('=', "Expected '=' after DEFAULT in column %s in "
+                              "CREATE statement not %%s." % number)
+                column['default'] = self._value(
+                    tokens, 'after DEFAULT= in column %s in CREATE statement'
+                    % number)
+            elif tokens.acceptKeyword('foreign'):
+                tokens.expectKeyword('key', "Expected KEY after FOREIGN in "
+                                     "column %s in CREATE statement not %%s."
+                                     % number)
+                tokens.expect('=', "Expected '=' after FOREIGN KEY in column "
+                              "%s in CREATE statement not %%s." % number)
+                column['foreignKey'] = self._name(tokens, 'FOREIGN KEY table')
+            elif tokens.peek()[0] in [',', ')']:
+                break
+            else:
+                raise SQLSyntaxError("Expected DEFAULT or FOREIGN KEY or the "
+                                     "end of the statement not %s for column "
+                                     "%s in CREATE statement." %
+                                     (describe(tokens.peek()), number))
+        if column['default'] is not None:
+            if column['primaryKey']:
+                raise SQLError("PRIMARY KEY column '%s' cannot also have a "
+                               "DEFAULT value." % name)
+            if column['foreignKey']:
+                raise SQLError("FOREIGN KEY column '%s' cannot also have a "
+                               "DEFAULT value." % name)
+            if column['default'] == 'NULL' and column['required']:
+                raise SQLError("REQUIRED column '%s' cannot also have a "
+                               "DEFAULT value of NULL" % name)
+        if column['primaryKey'] and column['foreignKey']:
+            raise SQLError("PRIMARY KEY column '%s' cannot also have a "
+                           "FOREIGN KEY value." % name)
+        return column
+
 
 # SQL Builder
 class Builder:
@@ -1163,6 +718,8 @@ class Builder:
             return self.buildCreate(**params)
         elif function == 'drop':
             return self.buildDrop(**params)
+        elif function == 'copy':
+            return self.buildCopy(**params)
         elif function == 'show':
             return "SHOW TABLES"
         else:
@@ -1177,6 +734,14 @@ class Builder:
         return "DROP TABLE "+', '.join(tables)
 
 
+    def buildCopy(self, table, direction, file, format=None):
+        "Build a COPY statement"
+        sql = ['COPY ', table, ' ', direction.upper(), " '", file.replace("'", "''"), "'"]
+        if format:
+            sql.append(' FORMAT ')
+            sql.append(format)
+        return ''.join(sql)
+
     def buildCreate(self, table, columns):
         "Build a CREATE TABLE statements"
         sql = ['CREATE TABLE ']
@@ -1220,15 +785,17 @@ class Builder:
             sqlColumns.append(' '.join(f))
         return ', '.join(sqlColumns)
 
-    def buildInsert(self, table, columns, sqlValues):
-        "Build and INSERT statement"
+    def buildInsert(self, table, columns, sqlValues=None, sqlRows=None):
+        """Build and INSERT statement. ``sqlRows`` is a list of ``sqlValues``
+        lists for inserting more than one row."""
+        if sqlRows is None:
+            sqlRows = [sqlValues]
         sql = ['INSERT INTO ']
         sql.append(table)
         sql.append(' (')
         sql.append(', '.join(columns))
-        sql.append(') VALUES (')
-        sql.append(', '.join(sqlValues))
-        sql.append(')')
+        sql.append(') VALUES ')
+        sql.append(', '.join(['('+', '.join(sqlValues)+')' for sqlValues in sqlRows]))
         return ''.join(sql)
  
     def buildSelect(self, tables, columns, where=None, order=None):
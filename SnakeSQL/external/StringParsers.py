@@ -1,6 +1,13 @@
 "Useful functions for manipulating strings. In particular those in CSV files."
 
-# No imports needed as no regular expressions are used
+# Imports
+import csv
+import io
+import sys
+
+# Large TEXT values are stored in a single CSV term. The csv module's limit
+# is global so it is only raised while SnakeSQL's own rows are read.
+_fieldSizeLimit = min(sys.maxsize, 2**31-1)
 
 # Errors
 class ParserError(Exception):
@@ -10,27 +17,13 @@ class ParserError(Exception):
 # Define functions
 def stripEnd(line, whitespace=' '):
     if type(line) == type(''):
-        while line and line[-1] == whitespace: 
-            line = line[:-1]
-        return line
-    terms = []
-    for term in line:
-        while term and term[-1] == whitespace: 
-            term = term[:-1]
-        terms.append(term)
-    return terms
+        return line.rstrip(whitespace)
+    return [term.rstrip(whitespace) for term in line]
     
 def stripStart(line, whitespace=' '):
     if type(line) == type(''):
-        while line and line[0] == whitespace: 
-            line = line[1:]
-        return line
-    terms = []
-    for term in line:
-        while term and term[0] == whitespace: 
-            term = term[1:]
-        terms.append(term)
-    return terms
+        return line.lstrip(whitespace)
+    return [term.lstrip(whitespace) for term in line]
 
 def stripBoth(line, whitespace=' '):
     if type(line) == type(''):
@@ -53,121 +46,73 @@ def splitKeepQuotedValues(string, seperater=' ', quote="'"):
                     params.append(param)
     return params
 
+def iterCSV(fp, separater=',', quote='"', linebreak='\n', whitespace=' '):
+    """Lazily parse CSV rows from the text file object ``fp``.
+
+    ``fp`` is read in buffered chunks so only the current row is held in
+    memory. Files should be opened with ``newline=''`` so that linebreaks
+    inside quoted terms are preserved. Whitespace after a separater is
+    ignored, quoted terms use doubled quote characters as escapes."""
+    if linebreak not in ('\n', '\r\n'):
+        raise ParserError('Only \\n and \\r\\n linebreaks are supported, '
+                          'not %s.' % repr(linebreak))
+    return _iterRows(csv.reader(fp, delimiter=separater, quotechar=quote,
+                                doublequote=True,
+                                skipinitialspace=(whitespace == ' '),
+                                strict=False))
+
+def _iterRows(reader):
+    while 1:
+        limit = csv.field_size_limit(_fieldSizeLimit)
+        try:
+            row = next(reader, None)
+        finally:
+            csv.field_size_limit(limit)
+        if row is None:
+            return
+        yield row
+
+
 def parseCSV(input_, separater=',', quote='"', linebreak='\n', whitespace=' ', swap={}):
-    "Simple CSV parser which expects no spaces between commas and quoted terms."
+    "Parse a whole CSV string or bytes object into a list of rows."
     if not input_:
         return [[],]
-    input_ = input_.decode()
+    if isinstance(input_, bytes):
+        input_ = input_.decode()
     lines = []
-    line = []
-    term = ''
-    quotedValue = False
-    started = False # only needed for quotedValue = False to see whether we are removing whitespace before or after the string of character.
-    pos = 0
-    while 1:
-        if not quotedValue and input_[pos] == quote:           # Start of a new quoted term
-            quotedValue=True
-            pos += 1
-        elif input_[pos:pos+2] == quote+quote:
-            term+= quote
-            pos += 2
-        elif quotedValue and input_[pos:pos+2] == quote+linebreak:   # End of a non-quoted line
-            quotedValue=False
-            line.append(term)
-            term = ''
-            lines.append(line)
-            line = []
-            pos+=2
-        elif quotedValue and input_[pos:pos+2] == quote+separater:  # End of a quoted term
-            quotedValue=False
-            line.append(term)
-            term = ''
-            pos+=2
-            started = False
-        elif quotedValue and input_[pos:pos+2] == quote+whitespace:# End of a quoted term
-            quotedValue=False
-            pos+=2
-            while input_[pos] == whitespace:
-                pos += 1
-        elif quotedValue and input_[pos] == separater:        # comma character
-            term+= separater
-            pos += 1
-        elif not quotedValue and input_[pos:pos+2] == separater+whitespace:    # End of a non-quoted term
-            if swap.has_key(term):
-                line.append(swap[term])
-            else:
-                line.append(term)
-            term = ''
-            started=False
-            pos+=2
-            while input_[pos] == whitespace:
-                pos += 1
-        elif not quotedValue and input_[pos] == whitespace:    # End of a non-quoted term
-            pos += 1
-            while input_[pos] == whitespace:
-                pos += 1
-            if started and input_[pos] not in [separater, linebreak]:
-                soFar = repr(line[-1])
-                if not line[-1]:
-                    soFar = repr(term)
-                elif not term:
-                    soFar = 'start of line'
-                raise ParserError('Invalid character after %s, term %s in line %s, expected %s or %s characters.'%(str(soFar),  len(line), len(lines)+1, repr(separater), repr(linebreak)))
-        elif not quotedValue and input_[pos] == separater:    # End of a non-quoted term
-            # if swap.has_key(term):
-            if term in swap:
-                line.append(swap[term])
-            else:
-                line.append(term)
-            term = ''
-            started = False
-            pos += 1
-        elif quotedValue and input_[pos] == linebreak:        # Linebreak character
-            term+= linebreak
-            pos += 1
-        elif not quotedValue and input_[pos] == linebreak:    # End of a non-quoted line
-            # if swap.has_key(term):
-            if term in swap:
-                line.append(swap[term])
-            else:
-                line.append(term)
-            term = ''
-            started = False
-            lines.append(line)
-            line = []
-            pos += 1
-        else:                                                # ordinary character
-            started = True
-            term += input_[pos]
-            pos += 1
-        if len(input_) <= pos:
-            return lines
-            
-def buildCSV(lines, separater=',', quote='"', linebreak='\n', whitespace=' '):
-    result = ''
+    for line in iterCSV(io.StringIO(input_, newline=''), separater, quote, linebreak, whitespace):
+        if swap:
+            line = [swap[term] if term in swap else term for term in line]
+        lines.append(line)
+    return lines
+
+
+def buildCSVLine(line, separater=',', quote='"', linebreak='\n', whitespace=' ', comment='#'):
+    """Build a single CSV row terminated by ``linebreak``. Terms starting
+    with ``comment`` are quoted so that a row never starts with it."""
+    l = []
+    for item in line:
+        item = str(item) # Convert to a string
+        if quote in item:
+            l.append(quote+item.replace(quote,quote+quote)+quote)
+        elif separater in item or linebreak in item or whitespace in item or item[:1] == comment:
+            l.append(quote+item+quote)
+        else:
+            l.append(item)
+    if l == ['']: # Otherwise indistinguishable from a blank line
+        l = [quote+quote]
+    return separater.join(l)+linebreak
+
+
+def writeCSV(fp, lines, separater=',', quote='"', linebreak='\n', whitespace=' '):
+    "Write an iterable of rows to the text file object ``fp`` one row at a time."
+    write = fp.write
     for line in lines:
-        l = []
-        for item in line:
-            item = str(item) # Convert to a string
-            pos = item.find(quote)
-            if pos != -1:
-                l.append(quote+item.replace(quote,quote+quote)+quote)
-            else:
-                pos = item.find(separater)
-                if pos != -1:
-                    l.append(quote+item+quote)
-                else:
-                    pos = item.find(linebreak)
-                    if pos != -1:
-                        l.append(quote+item+quote)
-                    else:
-                        pos = item.find(whitespace)
-                        if pos != -1:
-                            l.append(quote+item+quote)
-                        else:
-                            l.append(item)
-        result += separater.join(l)+linebreak
-    return result
+        write(buildCSVLine(line, separater, quote, linebreak, whitespace))
+
+
+def buildCSV(lines, separater=',', quote='"', linebreak='\n', whitespace=' '):
+    return ''.join([buildCSVLine(line, separater, quote, linebreak, whitespace) for line in lines])
 
 def smartSplit(term, separater=',', quote='"', linebreak='\n', whitespace=' ', swap={}):
     return parseCSV(term+linebreak, separater, quote, linebreak,  whitespace, swap)[0]
@@ -0,0 +1,214 @@
+"""Readers and writers for the file formats used by COPY.
+
+csv   - The first row holds the column names. An empty unquoted term is NULL
+        and "" is an empty string.
+jsonl - One JSON object per line mapping column names to values. Missing
+        names and null are NULL.
+
+Rows are read lazily and written one at a time so files of any size can be
+streamed."""
+
+# Imports
+import re
+import json
+from .StringParsers import buildCSVLine
+
+formats = ['csv', 'jsonl']
+
+
+class FormatError(Exception):
+    pass
+
+
+def guessFormat(filename, default='csv'):
+    "Choose a format from a filename extension."
+    if str(filename).lower().endswith(('.jsonl', '.json')):
+        return 'jsonl'
+    return default
+
+
+def readRows(fp, format='csv', columns=None, missing=None):
+    """Return ``(columns, rows)`` for the text file object ``fp`` where
+    ``rows`` is an iterator of lists of values in the order of ``columns``.
+
+    For csv data ``columns`` defaults to the header row, for jsonl data to
+    the names in the first object. A name missing from a jsonl object has
+    the value ``missing``."""
+    format = format.lower()
+    if format == 'csv':
+        return _readCSV(fp, columns)
+    elif format == 'jsonl':
+        return _readJSONL(fp, columns, missing)
+    raise FormatError('Unknown format %s, expected one of %s.'
+                      % (repr(format), ', '.join(formats)))
+
+
+def writeRows(fp, columns, rows, format='csv'):
+    """Write the header for ``columns`` and then each row of the iterable
+    ``rows`` to the text file object ``fp``. Returns the number of rows.
+
+    Values are written as they are given except that None is NULL. For csv
+    data every other value is converted with str(), for jsonl data values
+    with an ``isoformat()`` method (dates and times) are written with it."""
+    format = format.lower()
+    if format == 'csv':
+        return _writeCSV(fp, columns, rows)
+    elif format == 'jsonl':
+        return _writeJSONL(fp, columns, rows)
+    raise FormatError('Unknown format %s, expected one of %s.'
+                      % (repr(format), ', '.join(formats)))
+
+
+# One term of a CSV row and the separater after it. The csv module can't
+# tell "" from an empty unquoted term so COPY data is split with this.
+_csvTerm = re.compile(r' *(?:"((?:[^"]|"")*)"|([^,"]*))(,?)')
+
+
+def _iterCSV(fp):
+    """Yield the terms of each row in the text file object ``fp``, which
+    should be opened with ``newline=''``. Empty unquoted terms are None."""
+    record = ''
+    quotes = 0
+    for line in fp:
+        record += line
+        quotes += line.count('"')
+        if quotes % 2:
+            continue  # A quoted term goes on to the next line
+        if record.endswith('\r\n'):
+            record = record[:-2]
+        elif record.endswith('\n'):
+            record = record[:-1]
+        if record.strip(' '):
+            yield _splitCSV(record)
+        else:
+            yield []
+        record = ''
+        quotes = 0
+    if record:
+        raise FormatError('The CSV data ends inside a quoted term.')
+
+
+def _splitCSV(record):
+    if '"' not in record:
+        return [term.lstrip(' ') or None for term in record.split(',')]
+    terms = []
+    position = 0
+    while 1:
+        match = _csvTerm.match(record, position)
+        quoted, plain, separater = match.groups()
+        if quoted is not None:
+            terms.append(quoted.replace('""', '"'))
+        else:
+            terms.append(plain or None)
+        position = match.end()
+        if not separater:
+            if position != len(record):
+                raise FormatError('Invalid CSV term at %s.'
+                                  % repr(record[position:position+20]))
+            return terms
+
+
+def _readCSV(fp, columns):
+    rows = _iterCSV(fp)
+    header = next(rows, None)
+    if header is None:
+        return columns or [], iter(())
+    header = [(name or '').strip() for name in header]
+    if columns is None:
+        columns = header
+    try:
+        positions = [header.index(column) for column in columns]
+    except ValueError:
+        raise FormatError('Column %s is not in the CSV header %s.'
+                          % (repr(column), repr(header)))
+
+    def values():
+        width = len(header)
+        line = 1
+        for row in rows:
+            line += 1
+            if not row:
+                if width != 1:
+                    continue
+                row = [None]  # A lone NULL is a blank line
+            if len(row) != width:
+                raise FormatError('Row %s has %s values, expected %s.'
+                                  % (line, len(row), width))
+            yield [row[pos] for pos in positions]
+    return columns, values()
+
+
+def _readJSONL(fp, columns, missing=None):
+    lines = iter(fp)
+    first = None
+    line = 0
+    for text in lines:
+        line += 1
+        if text.strip():
+            first = _loads(text, line)
+            break
+    if first is None:
+        return columns or [], iter(())
+    if columns is None:
+        columns = list(first.keys())
+
+    def values():
+        yield [first.get(column, missing) for column in columns]
+        number = line
+        for text in lines:
+            number += 1
+            if text.strip():
+                obj = _loads(text, number)
+                yield [obj.get(column, missing) for column in columns]
+    return columns, values()
+
+
+def _loads(text, line):
+    try:
+        obj = json.loads(text)
+    except ValueError as e:
+        raise FormatError('Invalid JSON on line %s: %s' % (line, e))
+    if not isinstance(obj, dict):
+        raise FormatError('Line %s is not a JSON object.' % line)
+    return obj
+
+
+def _csvValue(value):
+    "Return value as a CSV term, NULL as nothing and '' as \"\""
+    if value is None:
+        return ''
+    value = str(value)
+    if '"' in value:
+        return '"%s"' % value.replace('"', '""')
+    if (not value or ',' in value or '\n' in value or '\r' in value or
+            value[:1] in (' ', '#')):
+        return '"%s"' % value
+    return value
+
+
+def _writeCSV(fp, columns, rows):
+    write = fp.write
+    write(buildCSVLine(columns))
+    count = 0
+    for row in rows:
+        write(','.join(map(_csvValue, row)) + '\n')
+        count += 1
+    return count
+
+
+def _isoformat(value):
+    try:
+        return value.isoformat()
+    except AttributeError:
+        raise TypeError('%s is not JSON serializable' % repr(value))
+
+
+def _writeJSONL(fp, columns, rows):
+    write = fp.write
+    encode = json.JSONEncoder(default=_isoformat).encode
+    count = 0
+    for row in rows:
+        write(encode(dict(zip(columns, row))))
+        write('\n')
+        count += 1
+    return count
@@ -1,9 +1,26 @@
-"""Cross-platform file locking using directories.
-Based on ideas in glock in the ASPN cookbook."""
+"""Cross-platform file locking.
+
+RWLock is a reader/writer lock held with flock() on a lock file. It is used
+by lockdbm and lockcsv. Lock is the older lock using directories, based on
+ideas in glock in the ASPN cookbook.
+
+An RWLock goes away by itself when its process dies. Its EXCLUSIVE holder
+records its process ID and host so a TimeOut can say who holds the lock.
+
+Transactions are supported in one of two ways. By default a copy of each
+locked file is kept in a '_bak' file which commit() and rollback() copy
+over. If a journal file name is given instead, changes are recorded in an
+undo Journal so commit() and rollback() only cost as much as the changes
+made."""
 
 # Imports
-import os, time
+import os, time, struct, socket
 import logging
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
 
 
 log = logging.getLogger()
@@ -15,6 +32,31 @@ class LockError(Exception):
     pass
 class TransactionError(Exception):
     pass
+
+_host = socket.gethostname()
+
+def isAlive(pid):
+    "Return False if no process with ID ``pid`` is running on this host."
+    if os.name != 'posix':
+        return True # Only processes which are known to be gone count as dead
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _owner():
+    return ('%s %s' % (os.getpid(), _host)).encode('utf-8')
+
+def _parseOwner(data):
+    "Return the process ID and host recorded by _owner() or (None, None)."
+    try:
+        pid, host = data.decode('utf-8').split(' ', 1)
+        return int(pid), host
+    except ValueError:
+        return None, None
     
 # Set up True and False
 # try:
@@ -25,7 +67,7 @@ class TransactionError(Exception):
 
 # Locking
 class Lock:
-    def __init__(self, expire=0, timeout=10, removeLock=False, warn=False, backup=True):
+    def __init__(self, expire=0, timeout=10, removeLock=False, warn=False, backup=True, journal=None):
         if timeout < 1 and removeOnFail:
             raise ValueError("Parameter 'timeout' should not be less than 1 if you plan to remove a failed lock or ownership of the lock could be confused.")
         self.expire = expire
@@ -37,6 +79,9 @@ class Lock:
         self.backup = backup
         self.removeLock = removeLock
         self.files = {}
+        self.journal = None
+        if journal is not None:
+            self.journal = Journal(journal)
         
     def __del__(self):
         if len(self.files):
@@ -126,7 +171,10 @@ class Lock:
         return 1
         
     def commit(self, filename):
-        if self.backup:
+        if self.journal is not None:
+            self.relock(filename)
+            self.journal.commit()
+        elif self.backup:
             self.relock(filename)
             self._backup(filename)
         else:
@@ -137,7 +185,10 @@ class Lock:
             raise TransactionError('No backup file found')
             
     def _rollback(self, filename):
-        if os.path.exists(filename+'_bak'):
+        if self.journal is not None:
+            self.journal.rollback()
+            return 1
+        elif os.path.exists(filename+'_bak'):
             os.remove(filename)
             self._copy(filename+'_bak', filename)
             return 1
@@ -153,11 +204,14 @@ class Lock:
             os.remove(filename+'_bak')
 
     def _lock(self, filename):
-        if self.backup:
+        if self.backup and self.journal is None:
             self._backup(filename)
         os.mkdir(filename+'_lock2')
         os.mkdir(filename+'_lock')
         self.files[filename] = os.stat(filename+'_lock2')[8]
+        if self.journal is not None:
+            # A journal left behind by a process which died is undone
+            self.journal.recover()
         
     def _relock(self, filename, restore=False):
         if restore:
@@ -169,7 +223,7 @@ class Lock:
         self.files[filename] = os.stat(filename+'_lock2')[8]
         
     def _unlock(self, filename):
-        if self.backup:
+        if self.backup and self.journal is None:
             self._removeBackup(filename)
         del self.files[filename]
         os.rmdir(filename+'_lock2')
@@ -181,3 +235,309 @@ class Lock:
         d.write(s.read())
         d.close()
         s.close()
+
+
+# Reader/writer locks
+SHARED = 'shared'
+EXCLUSIVE = 'exclusive'
+
+_version = struct.Struct('<q')
+if fcntl is not None:
+    _busy = BlockingIOError
+else:
+    _busy = OSError
+
+class RWLock:
+    """Reader/writer lock on a lock file.
+
+    Any number of SHARED locks for reading can be held at once but an
+    EXCLUSIVE lock for writing is only granted when no other lock is held.
+    The lock belongs to the open lock file so it goes away when the process
+    dies, and two RWLocks in one process exclude each other just as two
+    processes do. Where flock() is not available msvcrt.locking() is used
+    and every lock is exclusive.
+
+    With ``timeout=None`` acquire() blocks until the lock is granted.
+    Otherwise it retries with short sleeps, starting at a tenth of a
+    millisecond, and raises TimeOut after ``timeout`` seconds.
+
+    The holder of an EXCLUSIVE lock records its process ID and host in the
+    lock file so a TimeOut can say who holds the lock.
+
+    The lock file also holds a change counter which bump() increments.
+    After acquire() ``stale`` is True if the counter has changed since the
+    lock was last held, ie if anything cached from the locked files may be
+    out of date. It is always True after the lock file has been closed or
+    replaced by a new one. A journal left on disk when the lock is acquired was left by
+    a process which died and is rolled back."""
+
+    def __init__(self, filename, timeout=10, journal=None):
+        self.filename = filename
+        self.timeout = timeout
+        self.mode = None
+        self.fd = None
+        self.version = None
+        self.stale = True
+        self.journal = None
+        if journal is not None:
+            self.journal = Journal(journal)
+
+    def acquire(self, exclusive=False):
+        """Take a SHARED lock, or an EXCLUSIVE one if ``exclusive`` is True.
+        A SHARED lock already held is converted."""
+        if self.mode == EXCLUSIVE or (self.mode == SHARED and not exclusive):
+            return
+        while 1:
+            if self.fd is None:
+                self.fd = os.open(self.filename, os.O_RDWR | os.O_CREAT, 0o666)
+            try:
+                self._wait(exclusive)
+            except TimeOut:
+                # flock() drops a shared lock it fails to convert
+                self.release()
+                raise
+            if self.isLocked():
+                break
+            # The lock file was removed, eg by dropping the table, so the
+            # lock is on a file nobody else can see
+            self.close()
+        self.mode = exclusive and EXCLUSIVE or SHARED
+        if exclusive:
+            os.lseek(self.fd, _version.size, 0)
+            os.write(self.fd, _owner())
+        version = self._readVersion()
+        self.stale = version != self.version
+        self.version = version
+        if self.journal is not None and self.journal.fp is None and os.path.exists(self.journal.filename):
+            if not exclusive:
+                try:
+                    self._wait(True)
+                except TimeOut:
+                    # As above the shared lock may have been dropped
+                    self.release()
+                    raise
+            self.journal.recover()
+            if not exclusive:
+                self._wait(False)
+            self.stale = True
+
+    def _wait(self, exclusive):
+        if fcntl is None:
+            if self.mode is not None:
+                return # Every lock is exclusive already
+        elif self.timeout is None:
+            fcntl.flock(self.fd, exclusive and fcntl.LOCK_EX or fcntl.LOCK_SH)
+            return
+        if self.timeout is not None:
+            end = time.monotonic() + self.timeout
+        delay = 0.0001
+        while 1:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(self.fd, (exclusive and fcntl.LOCK_EX or fcntl.LOCK_SH) | fcntl.LOCK_NB)
+                else:
+                    os.lseek(self.fd, 0, 0)
+                    msvcrt.locking(self.fd, msvcrt.LK_NBLCK, 1)
+                return
+            except _busy:
+                if self.timeout is not None and time.monotonic() >= end:
+                    raise TimeOut("'%s' is locked by %s. Timeout occured." % (self.filename, self.holder()))
+            time.sleep(delay)
+            delay = min(delay*2, 0.01)
+
+    def isLocked(self):
+        "Return True if the lock is held on the file which is at ``filename``."
+        if self.fd is None:
+            return False
+        try:
+            return os.path.samestat(os.fstat(self.fd), os.stat(self.filename))
+        except OSError:
+            return False
+
+    def replaced(self):
+        """Return True if the lock file has been removed, or removed and made
+        again, since it was opened, eg because the table was dropped."""
+        return self.fd is not None and not self.isLocked()
+
+    def peek(self):
+        "Return the change counter without taking the lock."
+        if self.fd is None:
+            self.fd = os.open(self.filename, os.O_RDWR | os.O_CREAT, 0o666)
+        return self._readVersion()
+
+    def holder(self):
+        "Describe the process holding an EXCLUSIVE lock if one is recorded."
+        os.lseek(self.fd, _version.size, 0)
+        pid, host = _parseOwner(os.read(self.fd, 1024))
+        if pid is None or (host == _host and not isAlive(pid)):
+            # A process which died holding the lock leaves its record behind
+            return 'another connection'
+        return 'process %s on %s' % (pid, host)
+
+    def _readVersion(self):
+        os.lseek(self.fd, 0, 0)
+        data = os.read(self.fd, _version.size)
+        if len(data) < _version.size:
+            return 0
+        return _version.unpack(data)[0]
+
+    def bump(self):
+        "Record a change to the locked files. An EXCLUSIVE lock must be held."
+        if self.mode != EXCLUSIVE:
+            raise LockError('An exclusive lock is needed to change %s.' % repr(self.filename))
+        self.version = self._readVersion() + 1
+        os.lseek(self.fd, 0, 0)
+        os.write(self.fd, _version.pack(self.version))
+
+    def release(self):
+        if self.mode is None:
+            return
+        if self.mode == EXCLUSIVE:
+            os.ftruncate(self.fd, _version.size)
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        elif self.fd is not None:
+            os.lseek(self.fd, 0, 0)
+            msvcrt.locking(self.fd, msvcrt.LK_UNLCK, 1)
+        self.mode = None
+
+    def close(self):
+        self.release()
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        # A lock file made again, eg for a table dropped and created again,
+        # counts from zero so its counter can't be compared with ours
+        self.version = None
+
+    def __del__(self):
+        self.close()
+
+
+# Undo journal
+_record = struct.Struct('<cIqqq')
+
+class Journal:
+    """Undo journal for files which are changed in place.
+
+    Before a file is first changed in a transaction its size and
+    modification time are recorded and before bytes which already exist are
+    overwritten they are copied to the journal, so a change costs only the
+    bytes it touches. Appended bytes need no copy, rollback() truncates them.
+
+    commit() syncs the changed files and then removes the journal, which is
+    the point at which the changes become permanent. rollback() puts back the
+    saved bytes, sizes and modification times. A journal still on disk when
+    a file is locked was left by a process which died and is rolled back by
+    recover().
+
+    Each record is flushed before the change it protects is made. The
+    journal is not synced for every change so it protects against a process
+    dying but not against the operating system losing writes."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.files = {}   # Path of each changed file to its record number
+        self.saved = {}   # Ranges already saved for each changed file
+        self.fp = None
+
+    def active(self):
+        "Return True if any changes have been recorded since the last commit."
+        return bool(self.files)
+
+    def save(self, path, start=None, end=None):
+        """Record that ``path`` is about to change. If ``start`` and ``end``
+        are given the bytes between them are about to be overwritten."""
+        path = os.fsencode(path)
+        if path not in self.files:
+            stat = os.stat(path)
+            self.files[path] = len(self.files)
+            self.saved[path] = (stat.st_size, set())
+            self._write(b'F', self.files[path], stat.st_size, stat.st_mtime_ns, path)
+        if start is None:
+            return
+        size, saved = self.saved[path]
+        # Bytes beyond the original size are removed by truncating instead
+        end = min(end, size)
+        if start >= end or (start, end) in saved:
+            return
+        fp = open(path, 'rb')
+        try:
+            fp.seek(start)
+            data = fp.read(end-start)
+        finally:
+            fp.close()
+        self._write(b'R', self.files[path], start, 0, data)
+        saved.add((start, end))
+
+    def _write(self, kind, number, a, b, data):
+        if self.fp is None:
+            self.fp = open(self.filename, 'wb')
+        self.fp.write(_record.pack(kind, number, a, b, len(data)) + data)
+        self.fp.flush()
+
+    def commit(self):
+        for path in self.files:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        self._discard()
+
+    def rollback(self):
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+        if not os.path.exists(self.filename):
+            self._discard()
+            return
+        fp = open(self.filename, 'rb')
+        try:
+            data = fp.read()
+        finally:
+            fp.close()
+        files = {}
+        ranges = []
+        pos = 0
+        while pos + _record.size <= len(data):
+            kind, number, a, b, length = _record.unpack_from(data, pos)
+            pos += _record.size
+            if pos + length > len(data):
+                break # The process died while writing this record
+            if kind == b'F':
+                files[number] = (data[pos:pos+length], a, b)
+            else:
+                ranges.append((number, a, data[pos:pos+length]))
+            pos += length
+        # Later records may cover bytes saved earlier so undo them last first
+        ranges.reverse()
+        for number, start, saved in ranges:
+            fp = open(files[number][0], 'r+b')
+            try:
+                fp.seek(start)
+                fp.write(saved)
+            finally:
+                fp.close()
+        for path, size, mtime in files.values():
+            fp = open(path, 'r+b')
+            try:
+                fp.truncate(size)
+            finally:
+                fp.close()
+            os.utime(path, ns=(os.stat(path).st_atime_ns, mtime))
+        self._discard()
+
+    def recover(self):
+        "Roll back a journal left on disk by a process which died."
+        if self.fp is None and os.path.exists(self.filename):
+            self.rollback()
+
+    def _discard(self):
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+        self.files = {}
+        self.saved = {}
@@ -1,15 +1,38 @@
 """CSV database based with built-in file locks
-so that only one person can read or modify the data at once
+so that any number of connections can read the data at once but only one
+can modify it
+
+Rows are addressed by their position in the file. A sidecar index file
+(the table file name followed by '_idx') holds the byte offset of each row
+so a row can be read, appended or changed without parsing the rest of the
+file. The index is stamped with the size and modification time of the CSV
+file it describes and is rebuilt with a single scan if it is out of date.
+
+Deleting a row overwrites it in place with a tombstone, a line of the same
+length starting with '#', so the keys of the other rows do not change.
+compact() rewrites the file without the tombstones. It renumbers the keys
+and is run by commit() once more than compactRatio of the rows are
+tombstones.
+
+Changes are recorded in an undo journal (the table file name followed by
+'_jnl') rather than by copying the whole file, see lock.Journal.
+
+The file is locked with a lock.RWLock on the table file name followed by
+'_lck'. A shared lock is taken when the file is first read and an exclusive
+one when it is first changed. release() gives up a shared lock, eg at the
+end of a statement, and commit() and rollback() give up either.
 
 Note: CSV files with more than 2^31 rows will not work.
-Note: Deleting a row changes all the keys
 """
 
 # Imports
+import io
 import os
+import struct
+from array import array
 from . import lock
 
-from .StringParsers import parseCSV, buildCSV
+from .StringParsers import iterCSV, buildCSVLine
 
 class InvalidKey(Exception):
     pass
@@ -22,9 +45,19 @@ try:
 except AttributeError:
     extsep = '.'
 
+# Sidecar index: magic, number of offsets, number of tombstones, CSV size,
+# CSV mtime, offsets..., tombstone keys...
+_indexHeader = struct.Struct('<8sqqqq')
+_indexMagic = b'SNKCSVI2'
+_tombstone = b'#'
+_chunkSize = 1024 * 1024
+
 # Lock CSV
 class CSV:
-    def __init__(self, filename, warn, separater, quote,linebreak, whitespace):
+    compactRatio = 0.5
+    compactMinimum = 64
+
+    def __init__(self, filename, warn, separater, quote,linebreak, whitespace, timeout=10):
         self.filename = filename
         self.separater = separater
         self.quote = quote
@@ -33,116 +66,393 @@ class CSV:
         if '.' in self.filename:
             raise NameError("Database '%s' should not contain '.' character."%(self.filename))
         self.filename = filename + extsep + 'csv'
-        self.locks = lock.Lock(expire=2, timeout=10, warn=warn)
-        self.locks.lock(self.filename)
-        
+        self.indexFilename = self.filename + '_idx'
+        self._offsets = None   # Start of each row followed by the end of file
+        self._deleted = None   # Keys of the rows which are tombstones
+        self._indexClean = 0   # Leading offsets already saved in the sidecar
+        self.locks = lock.RWLock(self.filename + '_lck', timeout, journal=self.filename + '_jnl')
+        self.journal = self.locks.journal
+
+    def lock(self, exclusive=False):
+        """Take a shared lock for reading or an exclusive one for writing.
+
+        RWLock.acquire() checks the lock is on the right file when it is
+        taken and the open lock file keeps it ours until it is released, so
+        each row is read or written with no more than this test of the
+        mode."""
+        locks = self.locks
+        if locks.mode == lock.EXCLUSIVE or (locks.mode is not None and not exclusive):
+            return
+        locks.acquire(exclusive)
+        if locks.stale:
+            # Another connection has changed the file
+            self._offsets = None
+            self._deleted = None
+
+    def inTransaction(self):
+        "Return True if the file is locked for writing until commit() or rollback()."
+        return self.locks.mode == lock.EXCLUSIVE
+
+    def version(self):
+        "Return the change counter of the file without locking it, see lock.RWLock."
+        return self.locks.peek()
+
+    def release(self):
+        "Give up a shared lock. An exclusive lock is kept until commit() or rollback()."
+        if self.locks.mode == lock.SHARED:
+            self.locks.release()
+
+    def _key(self, name):
+        try:
+            i = int(name)  # long(name)
+        except ValueError:
+            raise InvalidKey("Keys should be integers or longs. %s is not a valid key."%repr(name))
+        if i<1:
+            raise InvalidKey("Keys should be greater than one. %s is not a valid key."%repr(name))
+        return i
+
+    def __len__(self):
+        return len(self._index()) - 1 - len(self._deleted)
+
+    def nextKey(self):
+        "Return the key the next appended row will have."
+        return str(len(self._index()))
+
     def __getitem__(self, name):
-        for file in self.locks.files.keys():
-            if not self.locks.isLocked(file):
-                raise lock.LockError('Lock no longer valid.')
-        else:
-            try:
-                i = int(name)  # long(name)
-            except ValueError:
-                raise InvalidKey("Keys should be integers or longs. %s is not a valid key."%repr(name))
-            if i<1:
-                raise InvalidKey("Keys should be greater than one. %s is not a valid key."%repr(name))
-            results = self._load()
-            if len(results) >= i:
-                return results[i-1]
-            else:
-                raise InvalidKey("Key out of range. The largest available key is '%s'."%(str(len(results))))
+        self.lock()
+        i = self._key(name)
+        offsets = self._index()
+        if i >= len(offsets):
+            raise InvalidKey("Key out of range. The largest available key is '%s'."%(str(len(offsets)-1)))
+        if i in self._deleted:
+            raise InvalidKey("The row with key %s has been deleted."%repr(name))
+        return self._parse(self._read(offsets[i-1], offsets[i]))
 
     def __setitem__(self, name, value):
-        for file in self.locks.files.keys():
-            if not self.locks.isLocked(file):
-                raise lock.LockError('Lock no longer valid.')
-        else:
+        self.lock(True)
+        i = self._key(name)
+        offsets = self._index()
+        count = len(offsets) - 1
+        if i > count+1:
+            raise InvalidKey("Key out of range. The next available key is '%s'."%str(count+1))
+        if i in self._deleted:
+            raise InvalidKey("The row with key %s has been deleted."%repr(name))
+        width = self._width()
+        if width is not None and width != len(value): # check row lengths
+            raise InvalidRow("Each row in %s should have %s values, not %s."%(repr(self.filename),width,len(value)))
+        data = self._build(value)
+        if i == count+1:
+            # Append only the new row
+            self.journal.save(self.filename)
+            fp = _open(self.filename, 'ab')
             try:
-                i = int(name)  # long(name)
-            except ValueError:
-                raise InvalidKey("Keys should be integers or longs. %s is not a valid key."%repr(name))
-            if i<1:
-                raise InvalidKey("Keys should be greater than one. %s is not a valid key."%repr(name))
-            results = self._load()
-            if not (len(results) == 1 and len(results[0]) == 0): # check row lengths
-                if len(results[0]) != len(value):
-                    raise InvalidRow("Each row in %s should have %s values, not %s."%(repr(self.locks.files.keys()[0]),len(results[0]),len(value)))
-            if len(results) >= i:
-                results[i-1] = value
-            elif len(results) == i-1:
-                results.append(value)
-            else:
-                raise InvalidKey("Key out of range. The next available key is '%s'."%str(len(results)+1))
-            self._save(results)
-        
-    def __delitem__(self, name):
-        for file in self.locks.files.keys():
-            if not self.locks.isLocked(file):
-                raise lock.LockError('Lock no longer valid.')
+                fp.write(data)
+            finally:
+                fp.close()
+            offsets.append(offsets[-1] + len(data))
+            return
+        start, end = offsets[i-1], offsets[i]
+        if len(data) < end-start and self.whitespace == ' ':
+            # Leading whitespace is skipped when the row is read back
+            data = b' '*(end-start-len(data)) + data
+        if len(data) != end-start:
+            # Every row after this one moves
+            self.journal.save(self.filename, start, offsets[-1])
+            self._shift(end, len(data)-(end-start), i)
         else:
-            try:
-                i = int(name)  # long(name)
-            except ValueError:
-                raise InvalidKey("Keys should be integers or longs. %s is not a valid key."%repr(name))
-            if i<1:
-                raise InvalidKey("Keys should be greater than one. %s is not a valid key."%repr(name))
-            results = self._load()
-            if i > len(results):
-                raise InvalidKey("Key out of range.")
+            self.journal.save(self.filename, start, end)
+        fp = _open(self.filename, 'r+b')
+        try:
+            fp.seek(start)
+            fp.write(data)
+        finally:
+            fp.close()
+
+    def extend(self, values):
+        "Append each row in ``values`` to the file with a single write."
+        self.lock(True)
+        offsets = self._index()
+        width = self._width()
+        lines = []
+        ends = array('q')
+        end = offsets[-1]
+        for value in values:
+            if width is None:
+                width = len(value)
+            elif width != len(value): # check row lengths
+                raise InvalidRow("Each row in %s should have %s values, not %s."%(repr(self.filename),width,len(value)))
+            line = self._build(value)
+            lines.append(line)
+            end += len(line)
+            ends.append(end)
+        self.journal.save(self.filename)
+        fp = _open(self.filename, 'ab')
+        try:
+            fp.write(b''.join(lines))
+        finally:
+            fp.close()
+        offsets.extend(ends)
+
+    def __delitem__(self, name):
+        self.lock(True)
+        i = self._key(name)
+        offsets = self._index()
+        if i >= len(offsets) or i in self._deleted:
+            raise InvalidKey("Key out of range.")
+        start, end = offsets[i-1], offsets[i]
+        linebreak = self.linebreak.encode()
+        self.journal.save(self.filename, start, end)
+        fp = _open(self.filename, 'r+b')
+        try:
+            fp.seek(start)
+            fp.write(_tombstone + b' '*(end-start-len(_tombstone)-len(linebreak)) + linebreak)
+        finally:
+            fp.close()
+        self._deleted.add(i)
+
+    def _width(self):
+        "Return the number of values in each row or None if there are none."
+        offsets = self._index()
+        for i in range(1, len(offsets)):
+            if i not in self._deleted:
+                return len(self._parse(self._read(offsets[i-1], offsets[i])))
+        return None
+
+    def _build(self, value):
+        return buildCSVLine(value, self.separater, self.quote, self.linebreak, self.whitespace).encode()
+
+    def _parse(self, data):
+        for row in iterCSV(io.StringIO(data.decode(), newline=''), self.separater, self.quote, self.linebreak, self.whitespace):
+            return row
+        return []
+
+    def _read(self, start, end):
+        fp = _open(self.filename, 'rb')
+        try:
+            fp.seek(start)
+            return fp.read(end-start)
+        finally:
+            fp.close()
+
+    def _shift(self, start, delta, row):
+        """Move everything from byte ``start`` to the end of the file by
+        ``delta`` bytes, a chunk at a time, and update the offsets of every
+        row after ``row``."""
+        offsets = self._index()
+        size = offsets[-1]
+        fp = _open(self.filename, 'r+b')
+        try:
+            if delta > 0:
+                pos = size
+                while pos > start:
+                    length = min(_chunkSize, pos-start)
+                    pos -= length
+                    fp.seek(pos)
+                    data = fp.read(length)
+                    fp.seek(pos+delta)
+                    fp.write(data)
+            elif delta < 0:
+                pos = start
+                while pos < size:
+                    fp.seek(pos)
+                    data = fp.read(min(_chunkSize, size-pos))
+                    fp.seek(pos+delta)
+                    fp.write(data)
+                    pos += len(data)
+                fp.truncate(size+delta)
+        finally:
+            fp.close()
+        for j in range(row, len(offsets)):
+            offsets[j] += delta
+        self._indexClean = min(self._indexClean, row)
+
+    def _index(self):
+        "Return the row offsets, loading or rebuilding the index if needed."
+        self.lock()
+        if self._offsets is None:
+            index = self._loadIndex()
+            if index is None:
+                self._offsets, self._deleted = self._scan()
+                self._indexClean = 0
             else:
-                results.pop(i-1)
-                self._save(results)
+                self._offsets, self._deleted = index
+                self._indexClean = len(self._offsets)
+        return self._offsets
 
-    def _load(self):
-        fp = _open(self.filename,'rb')
-        lines = fp.read()
-        fp.close()
-        return parseCSV(lines, self.separater, self.quote, self.linebreak, self.whitespace)
-            
-    def _save(self, lines):
-        fp = _open(self.filename,'wb')
-        fp.write(buildCSV(lines, self.separater, self.quote, self.linebreak, self.whitespace).encode())
-        fp.close()
-            
-    def keys(self):
-        results = self._load()
-        if results == [[],]:
-            return []
+    def _stamp(self):
+        stat = os.stat(self.filename)
+        return stat.st_size, stat.st_mtime_ns
+
+    def _loadIndex(self):
+        if not os.path.exists(self.indexFilename):
+            return None
+        fp = _open(self.indexFilename, 'rb')
+        try:
+            header = fp.read(_indexHeader.size)
+            if len(header) != _indexHeader.size:
+                return None
+            magic, count, tombstones, size, mtime = _indexHeader.unpack(header)
+            if magic != _indexMagic or (size, mtime) != self._stamp():
+                return None
+            offsets = array('q')
+            deleted = array('q')
+            try:
+                offsets.fromfile(fp, count)
+                deleted.fromfile(fp, tombstones)
+            except EOFError:
+                return None
+        finally:
+            fp.close()
+        if not offsets or offsets[-1] != size:
+            return None
+        return offsets, set(deleted)
+
+    def _scan(self):
+        """Build the offsets and find the tombstones with a single pass over
+        the file. A linebreak ends a row unless it is inside a quoted term,
+        ie unless an uneven number of quote characters has been seen so far
+        in the row."""
+        quote = self.quote.encode()
+        offsets = array('q', [0])
+        deleted = set()
+        pos = 0
+        quoted = False
+        fp = _open(self.filename, 'rb')
+        try:
+            for line in fp:
+                if not quoted and line[:1] == _tombstone:
+                    deleted.add(len(offsets))
+                pos += len(line)
+                if line.count(quote) % 2:
+                    quoted = not quoted
+                if not quoted:
+                    offsets.append(pos)
+        finally:
+            fp.close()
+        if offsets[-1] != pos:
+            offsets.append(pos)
+        return offsets, deleted
+
+    def _saveIndex(self):
+        "Write the parts of the sidecar index that have changed."
+        if self._offsets is None:
+            return
+        offsets = self._offsets
+        clean = self._indexClean
+        if clean and os.path.exists(self.indexFilename):
+            fp = _open(self.indexFilename, 'r+b')
         else:
-            keys = []
-            for i in range(len(results)):
-                keys.append(str(i+1))
-            return keys
+            clean = 0
+            fp = _open(self.indexFilename, 'wb')
+        try:
+            fp.seek(_indexHeader.size + clean*offsets.itemsize)
+            offsets[clean:].tofile(fp)
+            array('q', sorted(self._deleted)).tofile(fp)
+            fp.truncate()
+            size, mtime = self._stamp()
+            fp.seek(0)
+            fp.write(_indexHeader.pack(_indexMagic, len(offsets), len(self._deleted), size, mtime))
+        finally:
+            fp.close()
+        self._indexClean = len(offsets)
+
+    def _rows(self):
+        "Lazily yield each row of the file, reading it in buffered chunks."
+        self._index()
+        deleted = self._deleted
+        with _open(self.filename, 'r', encoding='utf-8', newline='') as fp:
+            i = 0
+            for row in iterCSV(fp, self.separater, self.quote, self.linebreak, self.whitespace):
+                i += 1
+                if i not in deleted:
+                    yield row
+
+    def keys(self):
+        offsets = self._index()
+        deleted = self._deleted
+        return [str(i) for i in range(1, len(offsets)) if i not in deleted]
+
+    def values(self):
+        "Lazily yield every live row in key order."
+        return self._rows()
 
     def has_key(self, key):
-        if key in self.keys():
-            return True
-        return False
+        try:
+            i = int(key)
+        except (TypeError, ValueError):
+            return False
+        return 1 <= i < len(self._index()) and i not in self._deleted
+
+    def compact(self):
+        """Rewrite the file once without its tombstones. The remaining rows
+        are renumbered so no keys obtained before should be used after.
+
+        The file is replaced rather than changed so this can only be done
+        when there are no uncommitted changes."""
+        self.lock(True)
+        if self.journal.active():
+            raise lock.TransactionError('Commit the changes to %s before compacting it.'%repr(self.filename))
+        offsets = self._index()
+        if not self._deleted:
+            return
+        tmp = self.filename + '_tmp'
+        compacted = array('q', [0])
+        src = _open(self.filename, 'rb')
+        try:
+            dest = _open(tmp, 'wb')
+            try:
+                for i in range(1, len(offsets)):
+                    if i in self._deleted:
+                        continue
+                    src.seek(offsets[i-1])
+                    dest.write(src.read(offsets[i]-offsets[i-1]))
+                    compacted.append(compacted[-1] + offsets[i]-offsets[i-1])
+            finally:
+                dest.close()
+        finally:
+            src.close()
+        os.replace(tmp, self.filename)
+        self._offsets = compacted
+        self._deleted = set()
+        self._indexClean = 0
+        self.locks.bump()
 
     def commit(self):
-        for file in self.locks.files.keys():
-            self.locks.commit(file)
-            
+        if self.locks.mode == lock.EXCLUSIVE:
+            if self.journal.active():
+                self.journal.commit()
+                self.locks.bump()
+            # The index is only saved under an exclusive lock so that two
+            # readers never write it at once
+            if self._offsets is not None:
+                if (len(self._deleted) >= self.compactMinimum and
+                        len(self._deleted) > self.compactRatio*(len(self._offsets)-1)):
+                    self.compact()
+                self._saveIndex()
+        self.locks.release()
+
     def rollback(self):
-        for file in self.locks.files.keys():
-            self.locks.rollback(file)
-            
+        if self.locks.mode == lock.EXCLUSIVE and self.journal.active():
+            self.journal.rollback()
+            self._offsets = None
+            self._deleted = None
+        self.locks.release()
+
     def close(self,commit=False):
         if commit:
             self.commit()
         else:
             self.rollback()
-        self.locks.__del__()
+        self.locks.close()
 
     def __del__(self):
         self.rollback()
-        
-def open(file,warn=False, separater=',', quote='"', linebreak='\n', whitespace=' '):
+
+def open(file,warn=False, separater=',', quote='"', linebreak='\n', whitespace=' ', timeout=10):
     if not os.path.exists(file+'.csv'):
         fp = _open(file+'.csv','wb')
         fp.close()
-    return CSV(file, warn, separater, quote, linebreak, whitespace)
+    return CSV(file, warn, separater, quote, linebreak, whitespace, timeout)
 
 if __name__ == '__main__':
     file = open('test')
@@ -155,5 +465,5 @@ if __name__ == '__main__':
     print(file['3'])
     del file['2']
     print(file['1'])
-    print(file['2'])
-    file.commit()
\ No newline at end of file
+    print(file['3'])
+    file.commit()
@@ -1,6 +1,19 @@
 """DBM database based on dumbdbm with built-in file locks
-so that only one person can read or modify the data at once.
+so that any number of connections can read the data at once but only one
+can modify it.
 
+The database is locked with a lock.RWLock on the database name followed by
+'.lck'. A shared lock is taken when the database is first read, which is
+also when the directory file is read, and an exclusive one when it is first
+changed. release() gives up a shared lock,
+eg at the end of a statement, and commit() and rollback() give up either.
+
+
+Changes are recorded in an undo journal (the database name followed by
+'.jnl') rather than by copying the files, see lock.Journal. To keep each
+change small the directory file is only appended to: a key whose value moves
+gets a new line and a deleted key gets a line with None as its position.
+The file is rewritten without the old lines when the database is closed.
 
 Note:
 
@@ -29,55 +42,170 @@ except AttributeError:
 
 # Lock DBM
 class Database(dumbdbm._Database):
-    def __init__(self, file, mode, warn):
+    def __init__(self, file, mode, warn, timeout=10):
         if '.' in file:
             raise NameError("Database names should not contain '.' characters.")
-        self.locks = lock.Lock(expire=2, timeout=10, warn=warn)
-        self.locks.lock(file + extsep + 'dir')
-        self.locks.lock(file + extsep + 'dat')
-        self.locks.lock(file + extsep + 'bak')
+        self.locks = lock.RWLock(file + extsep + 'lck', timeout, journal=file + extsep + 'jnl')
+        self.journal = self.locks.journal
         if sys.version_info < (2,2):
             dumbdbm._Database.__init__(self, file)
         else:
             dumbdbm._Database.__init__(self, file, mode)
-        
+        self._changed = {} # Position of each key changed since the last commit
+
+    def lock(self, exclusive=False):
+        """Take a shared lock for reading or an exclusive one for writing.
+
+        RWLock.acquire() checks the lock is on the right file when it is
+        taken and the open lock file keeps it ours until it is released, so
+        each row is read or written with no more than this test of the
+        mode."""
+        locks = self.locks
+        if locks.mode == lock.EXCLUSIVE or (locks.mode is not None and not exclusive):
+            return
+        locks.acquire(exclusive)
+        if locks.stale and self._index is not None:
+            # Read the directory file for the first time or again because
+            # another connection has changed the database
+            self._update('c')
+
+    def inTransaction(self):
+        "Return True if the file is locked for writing until commit() or rollback()."
+        return self.locks.mode == lock.EXCLUSIVE
+
+    def version(self):
+        "Return the change counter of the file without locking it, see lock.RWLock."
+        return self.locks.peek()
+
+    def release(self):
+        "Give up a shared lock. An exclusive lock is kept until commit() or rollback()."
+        if self.locks.mode == lock.SHARED:
+            self.locks.release()
+
     def __getitem__(self, name):
-        for file in self.locks.files.keys():
-            if not self.locks.isLocked(file):
-                raise lock.LockError('Lock no longer valid.')
-        else:
-           return dumbdbm._Database.__getitem__(self, name)
+        self.lock()
+        return dumbdbm._Database.__getitem__(self, name)
 
     def __setitem__(self, name, value):
-        for file in self.locks.files.keys():
-            if not self.locks.isLocked(file):
-                raise lock.LockError('Lock no longer valid.')
-        else:
-           return dumbdbm._Database.__setitem__(self, name, value)
+        self.lock(True)
+        key = name
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+        old = self._index.get(key)
+        if key not in self._changed:
+            self._changed[key] = old
+        dumbdbm._Database.__setitem__(self, name, value)
+        if old is not None and self._index[key] != old:
+            # The value moved so record where rather than rewriting the
+            # directory file
+            self._addkey(key, self._index[key])
+
+    def __delitem__(self, name):
+        self.lock(True)
+        key = name
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+        if key not in self._changed:
+            self._changed[key] = self._index[key]
+        del self._index[key]
+        self._modified = True
+        self.journal.save(self._dirfile)
+        with builtins.open(self._dirfile, 'a', encoding="Latin-1") as f:
+            f.write("%r, None\n" % (key.decode("Latin-1"),))
+
+    def _update(self, flag):
+        if self.locks.mode is None:
+            # The directory file is read when the database is first locked
+            self._index = {}
+            self._modified = False
+            return
+        dumbdbm._Database._update(self, flag)
+        for key in [key for key, value in self._index.items() if value is None]:
+            del self._index[key]
+
+    def _addval(self, val):
+        self.journal.save(self._datfile)
+        return dumbdbm._Database._addval(self, val)
+
+    def _setval(self, pos, val):
+        self.journal.save(self._datfile, pos, pos+len(val))
+        return dumbdbm._Database._setval(self, pos, val)
+
+    def _addkey(self, key, pos_and_siz_pair):
+        self.journal.save(self._dirfile)
+        return dumbdbm._Database._addkey(self, key, pos_and_siz_pair)
+
+    def _commit(self):
+        if self._index is None or not self._modified:
+            return
+        # The directory and its backup are replaced as a whole
+        for name in (self._dirfile, self._bakfile):
+            if os.path.exists(name):
+                self.journal.save(name, 0, os.path.getsize(name))
+        dumbdbm._Database._commit(self)
+
+    def keys(self):
+        self.lock()
+        return dumbdbm._Database.keys(self)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __contains__(self, name):
+        self.lock()
+        return dumbdbm._Database.__contains__(self, name)
+
+    def __len__(self):
+        self.lock()
+        return dumbdbm._Database.__len__(self)
+
+    def has_key(self, name):
+        return name in self
            
     def commit(self):
-        for file in self.locks.files.keys():
-            self.locks.commit(file)
+        if self.locks.mode == lock.EXCLUSIVE and self.journal.active():
+            self.journal.commit()
+            self.locks.bump()
+        self._changed = {}
+        self.locks.release()
             
     def rollback(self):
-        for file in self.locks.files.keys():
-            self.locks.rollback(file)
+        if self.locks.mode == lock.EXCLUSIVE:
+            self.journal.rollback()
+        if self._index is not None:
+            # Put back the positions the changed keys had at the last commit
+            for key, old in self._changed.items():
+                if old is None:
+                    self._index.pop(key, None)
+                else:
+                    self._index[key] = old
+        self._changed = {}
+        self.locks.release()
             
     def close(self,commit=False):
-        _ = dumbdbm._Database.close(self)
         if commit:
             self.commit()
         else:
             self.rollback()
-        self.locks.__del__()
+        if self._index is not None and self._modified and not self.locks.replaced():
+            # Rewrite the directory file without the lines later ones replace.
+            # Files which were deleted, or replaced by a new table's, when
+            # another connection dropped the table are left alone.
+            self.lock(True)
+            self._commit()
+            self.commit()
+        self._modified = False
+        dumbdbm._Database.close(self)
+        self.locks.close()
 
     def __del__(self):
         self.rollback()
         
     def sync(self):
-        dumbdbm._Database.sync(self)
+        self.lock(True)
+        self._commit()
         
-def open(file, flag=None, mode=None, warn=False):
+def open(file, flag=None, mode=None, warn=False, timeout=10):
     if not os.path.exists(file+'.dir') or not os.path.exists(file+'.dat') or not os.path.exists(file+'.bak'):
         if sys.version_info < (2,2):
             if mode != None:
@@ -96,4 +224,4 @@ def open(file, flag=None, mode=None, warn=False):
             fp.close()
     if mode == None:
         mode = 0o666
-    return Database(file, mode, warn)
\ No newline at end of file
+    return Database(file, mode, warn, timeout)
\ No newline at end of file
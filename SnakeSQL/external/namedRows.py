@@ -0,0 +1,83 @@
+"""Named rows for the 'object' result format.
+
+rowType(columns) makes a tuple subclass for one result set. Its rows are
+ordinary tuples which can also be indexed by column name or read as
+attributes. The names are held once by the class rather than by each row
+so a row takes no more memory than a plain tuple:
+
+    Row = rowType(['id', 'name'])
+    row = Row((1, 'James'))
+    row[1] == row['name'] == row.name == 'James'
+
+A joined column such as 'person.name' can also be read as row.name as long
+as no other table in the result has a 'name' column. Columns with the same
+name as a tuple method, such as 'count' or 'index', can only be read with
+row['count'].
+"""
+
+
+class Row(tuple):
+    __slots__ = ()
+    fields = ()     # Column names in order
+    positions = {}  # Position of each column name and unambiguous alias
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                key = self.positions[key]
+            except KeyError:
+                raise KeyError("No column named %s" % repr(key))
+        return tuple.__getitem__(self, key)
+
+    def __getattr__(self, name):
+        try:
+            return tuple.__getitem__(self, self.positions[name])
+        except KeyError:
+            raise AttributeError("No column named %s" % repr(name))
+
+    def __repr__(self):
+        return '(%s)' % ', '.join(['%s=%r' % (self.fields[i], self[i])
+                                   for i in range(len(self))])
+
+    def __reduce__(self):
+        # The generated classes can't be pickled so pickle a plain tuple
+        return (tuple, (tuple(self),))
+
+    def keys(self):
+        return list(self.fields)
+
+    def values(self):
+        return list(self)
+
+    def items(self):
+        return list(zip(self.fields, self))
+
+    def has_key(self, key):
+        return key in self.positions
+
+    def get(self, key, default=None):
+        if key in self.positions:
+            return self[key]
+        return default
+
+    def asDict(self):
+        return dict(zip(self.fields, self))
+
+
+def rowType(columns):
+    "Return a Row subclass for rows with the column names ``columns``."
+    positions = {}
+    aliases = {}
+    for i in range(len(columns)):
+        positions[columns[i]] = i
+        if '.' in columns[i]:
+            alias = columns[i].split('.')[-1]
+            aliases.setdefault(alias, []).append(i)
+    for alias, found in aliases.items():
+        if alias not in positions and len(found) == 1:
+            positions[alias] = found[0]
+    return type('Row', (Row,), {
+        '__slots__': (),
+        'fields': tuple(columns),
+        'positions': positions,
+    })
@@ -0,0 +1,167 @@
+"""In-memory write-set for the lockdbm and lockcsv table files.
+
+A WriteSet wraps a table file and offers the same mapping interface. Rows
+which are set or deleted are kept in memory and laid over the file when it
+is read, so a transaction sees its own changes without them being written.
+commit() applies all the changes in one batch and then commits the file,
+rollback() simply forgets them.
+
+Once the buffered rows take more than ``limit`` bytes they are applied to
+the file early. The file journals them (see lock.Journal) so the
+transaction can still be rolled back.
+
+The file is locked exclusively as soon as a row is set or deleted and stays
+locked until the changes are committed or rolled back.
+
+Files with a nextKey() method (lockcsv) address rows by position. New rows
+must be added with the next key in turn and are appended together when the
+changes are applied.
+"""
+
+class WriteSet:
+    limit = 8 * 1024 * 1024
+
+    def __init__(self, file, limit=None):
+        self.file = file
+        if limit is not None:
+            self.limit = limit
+        self.ordinal = hasattr(file, 'nextKey')
+        self._discard()
+
+    def _discard(self):
+        self.changed = {}   # New value of each key set
+        self.deleted = set() # Keys deleted
+        self.new = {}        # Keys which are not in the file yet, in order
+        self.next = None     # The key after the last new row
+        self.size = 0
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    def _key(self, key):
+        if isinstance(key, bytes):
+            return key.decode('utf-8')
+        return str(key)
+
+    def __getitem__(self, name):
+        key = self._key(name)
+        if key in self.deleted:
+            raise KeyError(name)
+        elif key in self.changed:
+            return self.changed[key]
+        return self.file[key]
+
+    def __setitem__(self, name, value):
+        self.file.lock(True)
+        key = self._key(name)
+        if key not in self.changed and key not in self.deleted:
+            if self.ordinal:
+                if int(key) >= int(self.nextKey()):
+                    self.new[key] = None
+                    self.next = int(key) + 1
+            elif not self.file.has_key(key):
+                self.new[key] = None
+        self.deleted.discard(key)
+        self.changed[key] = value
+        if isinstance(value, (str, bytes)):
+            self.size += len(value)
+        else:
+            self.size += sum([len(item) for item in value])
+        if self.size > self.limit:
+            self.flush()
+
+    def __delitem__(self, name):
+        self.file.lock(True)
+        key = self._key(name)
+        if not self.has_key(key):
+            raise KeyError(name)
+        if key in self.new and not self.ordinal:
+            del self.new[key]
+            del self.changed[key]
+        else:
+            # New rows addressed by position are still appended first so
+            # the keys after them do not change
+            if key not in self.new:
+                self.changed.pop(key, None)
+            self.deleted.add(key)
+
+    def has_key(self, name):
+        key = self._key(name)
+        if key in self.deleted:
+            return False
+        return key in self.changed or self.file.has_key(key)
+
+    __contains__ = has_key
+
+    def keys(self):
+        keys = self.file.keys()
+        if keys and isinstance(keys[0], bytes):
+            keys = [key.decode('utf-8') for key in keys]
+        if self.deleted:
+            deleted = self.deleted
+            keys = [key for key in keys if key not in deleted]
+            keys.extend([key for key in self.new if key not in deleted])
+        else:
+            keys.extend(self.new)
+        return keys
+
+    def __len__(self):
+        return len(self.keys())
+
+    def nextKey(self):
+        if not self.new:
+            return self.file.nextKey()
+        return str(self.next)
+
+    def extend(self, values):
+        for value in values:
+            self[self.nextKey()] = value
+
+    def values(self):
+        "Lazily yield every row in key order with the changes laid over them."
+        if not self.changed and not self.deleted:
+            for row in self.file.values():
+                yield row
+            return
+        changed = self.changed
+        deleted = self.deleted
+        for key, row in zip(self.file.keys(), self.file.values()):
+            key = self._key(key)
+            if key in deleted:
+                continue
+            yield changed.get(key, row)
+        for key in self.new:
+            if key not in deleted:
+                yield changed[key]
+
+    def flush(self):
+        "Apply the buffered changes to the file without committing them."
+        file = self.file
+        new = self.new
+        for key, value in self.changed.items():
+            if key not in new:
+                file[key] = value
+        if self.ordinal:
+            if new:
+                file.extend([self.changed[key] for key in new])
+        else:
+            for key in new:
+                file[key] = self.changed[key]
+        for key in self.deleted:
+            del file[key]
+        self._discard()
+
+    def commit(self):
+        self.flush()
+        self.file.commit()
+
+    def rollback(self):
+        self._discard()
+        self.file.rollback()
+
+    def close(self, commit=False):
+        if commit:
+            self.flush()
+        else:
+            self._discard()
+        self.file.close(commit)
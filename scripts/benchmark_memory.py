@@ -0,0 +1,106 @@
+"""Report the memory used by SnakeSQL result sets
+
+For a few typical tables the script inserts ``rows`` rows and selects them
+all, both as returned by the connection and after conversion by fetchall().
+Two figures are given for each, in bytes per row:
+
+size   The result set, its rows and their values with each distinct object
+       counted once, ie what the result would take if it shared nothing.
+owned  The part of size taken by objects which only the result refers to,
+       ie the memory freed when the result is. The rest is shared with
+       the database's caches or with other objects such as True and None.
+
+Every value in the tables is a different object outside the range of
+Python's cached small integers so one object is never counted as owned by
+many rows. Ownership is found from reference counts rather than by tracing
+allocations, which would also count memory the select keeps elsewhere and
+miss objects reused from Python's free lists.
+
+Usage: python benchmark_memory.py [rows] [driver]
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import datetime
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import SnakeSQL
+
+# Added to every integer so none is one of Python's cached small integers
+BASE = 1000000
+
+TABLES = {
+    'narrow': (
+        "CREATE TABLE narrow (id Integer PRIMARY KEY, name String)",
+        ['id', 'name'],
+        lambda i: [BASE + i, 'name %s' % i],
+    ),
+    'typical': (
+        "CREATE TABLE typical (id Integer PRIMARY KEY, name String, "
+        "score Float, active Bool, created Date, notes Text)",
+        ['id', 'name', 'score', 'active', 'created', 'notes'],
+        lambda i: [BASE + i, 'name %s' % i, i / 3.0, i % 2,
+                   datetime.date(2004, 1, 1 + i % 28), 'note number %s' % i],
+    ),
+    'wide': (
+        "CREATE TABLE wide (id Integer PRIMARY KEY, %s)" %
+        ', '.join(['value%s Integer' % i for i in range(30)]),
+        ['id'] + ['value%s' % i for i in range(30)],
+        lambda i: [BASE + i] + [BASE * 2 + i * 30 + j for j in range(30)],
+    ),
+}
+
+
+def resultSize(result):
+    """Return the bytes taken by result, its rows and values with each
+    object counted once, and the bytes taken by those only it refers to."""
+    found = {}
+    for row in result:
+        for obj in (row,) + tuple(row):
+            if id(obj) in found:
+                found[id(obj)][1] += 1
+            else:
+                found[id(obj)] = [obj, 1]
+    del row, obj
+    size = owned = sys.getsizeof(result)
+    for obj, references in found.values():
+        size += sys.getsizeof(obj)
+        # The other references are from found, obj and getrefcount() itself
+        if sys.getrefcount(obj) - 3 == references:
+            owned += sys.getsizeof(obj)
+    return size, owned
+
+
+def benchmark(database, driver, name, rows):
+    create, columns, makeRow = TABLES[name]
+    connection = SnakeSQL.connect(database, driver=driver, autoCreate=True)
+    cursor = connection.cursor()
+    cursor.execute(create)
+    cursor.executemany(
+        'INSERT INTO %s (%s) VALUES (%s)' %
+        (name, ', '.join(columns), ', '.join(['?'] * len(columns))),
+        [makeRow(i) for i in range(rows)])
+    connection.commit()
+    figures = resultSize(connection._select(['*'], name, [], [])['results'])
+    cursor.execute('SELECT * FROM %s' % name)
+    figures += resultSize(cursor.fetchall())
+    connection.close()
+    print('%-8s %8s %12.1f %12.1f %12.1f %12.1f' % (
+        (name, rows) + tuple([float(figure) / rows for figure in figures])))
+
+
+def main(rows=10000, driver='dbm'):
+    print('%-8s %8s %12s %12s %12s %12s' % (
+        'table', 'rows', 'select size', 'select owned', 'fetch size',
+        'fetch owned'))
+    for name in TABLES:
+        database = tempfile.mkdtemp()
+        try:
+            benchmark(os.path.join(database, 'db'), driver, name, rows)
+        finally:
+            shutil.rmtree(database)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) if arg.isdigit() else arg for arg in sys.argv[1:]])
@@ -0,0 +1,98 @@
+#! python
+# -*- coding: utf-8 -*-
+"""
+summary:
+    SnakeSQL Py3 asyncio interface tests
+Usage:
+
+
+description:
+
+:REQUIRES:
+
+:TODO:
+
+:AUTHOR:        $Author: Naftaly$
+:ORGANIZATION:  N/A
+:CONTACT:       [TBD]
+:LAST_MODIFIED: $Date$
+:Id:            $Id$
+:REVISION:      $Tag$
+
+"""
+
+import os
+import shutil
+import threading
+import unittest
+from SnakeSQL import aio
+from SnakeSQL.error import Error
+
+
+TEST_PATH = os.path.dirname(__file__)
+
+
+class TestAio(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(TEST_PATH, '_testAio')
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.mkdir(self.path)
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.path)
+
+    async def check_aio(self, driver):
+        connection = await aio.connect(os.path.join(self.path, driver),
+                                       driver=driver, autoCreate=True)
+        async with connection:
+            await connection.execute(
+                "CREATE TABLE t (a Integer PRIMARY KEY, b String)")
+            await connection.executemany(
+                "INSERT INTO t (a, b) VALUES (?, ?)",
+                [[i, 'row %s' % i] for i in range(25)])
+            await connection.commit()
+            cursor = await connection.execute("SELECT a, b FROM t")
+            cursor.arraysize = 10
+            self.assertEqual([10, 10, 5],
+                             [len(rows) async for rows in cursor.stream()])
+            cursor = await connection.execute("SELECT a FROM t")
+            self.assertEqual(list(range(25)),
+                             [row[0] async for row in cursor])
+            cursor = await connection.cursor(format='object')
+            await cursor.execute("SELECT a, b FROM t WHERE a = 3")
+            self.assertEqual('row 3', (await cursor.fetchone()).b)
+            self.assertEqual('a', cursor.description[0][0])
+            self.assertEqual(1, cursor.rowcount)
+            cursor = await connection.cursor(format='columns')
+            await cursor.execute("SELECT a FROM t")
+            cursor.arraysize = 10
+            self.assertEqual([10, 10, 5], [len(columns['a']) async for
+                                           columns in cursor.stream()])
+            await cursor.execute("SELECT a FROM t")
+            self.assertEqual(list(range(25)),
+                             [row[0] async for row in cursor])
+            # Every call runs on the connection's own thread
+            thread = await connection._run(threading.get_ident)
+            self.assertNotEqual(threading.get_ident(), thread)
+            self.assertEqual(thread,
+                             await connection._run(threading.get_ident))
+            await connection.execute("DELETE FROM t")
+            await connection.rollback()
+            cursor = await connection.execute("SELECT a FROM t")
+            self.assertEqual(25, len(await cursor.fetchall()))
+        with self.assertRaises(Error):
+            await connection.execute("SELECT a FROM t")
+
+    async def test_dbm(self):
+        await self.check_aio('dbm')
+
+    async def test_csv(self):
+        await self.check_aio('csv')
+
+
+if __name__ == '__main__':
+    unittest.main()
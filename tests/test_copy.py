@@ -0,0 +1,154 @@
+#! python
+# -*- coding: utf-8 -*-
+"""
+summary:
+    SnakeSQL Py3 COPY bulk loading tests
+Usage:
+
+
+description:
+
+:REQUIRES:
+
+:TODO:
+
+:AUTHOR:        $Author: Naftaly$
+:ORGANIZATION:  N/A
+:CONTACT:       [TBD]
+:LAST_MODIFIED: $Date$
+:Id:            $Id$
+:REVISION:      $Tag$
+
+"""
+
+import io
+import os
+import shutil
+import datetime
+import unittest
+import SnakeSQL
+from SnakeSQL.error import SQLError, SQLForeignKeyError, ConversionError
+
+
+TEST_PATH = os.path.dirname(__file__)
+
+DATA = ('a,b,d,pid\n'
+        '1,one,2004-12-12,1\n'
+        '2,"two, too",,2\n'
+        '3,three,2005-01-31,1\n')
+
+
+class TestCopy(unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(TEST_PATH, '_testCopy')
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.mkdir(self.path)
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.path)
+
+    def connect(self, driver):
+        connection = SnakeSQL.connect(os.path.join(self.path, driver),
+                                      driver=driver, autoCreate=True)
+        cursor = connection.cursor()
+        cursor.execute("CREATE TABLE p (id Integer PRIMARY KEY, name String)")
+        cursor.execute("INSERT INTO p (id, name) VALUES (1, 'x')")
+        cursor.execute("INSERT INTO p (id, name) VALUES (2, 'y')")
+        cursor.execute("CREATE TABLE t (a Integer UNIQUE, b String REQUIRED, "
+                       "d Date, pid Integer FOREIGN KEY=p)")
+        return connection, cursor
+
+    def check_copy_from(self, driver):
+        connection, cursor = self.connect(driver)
+        cursor.copy_from('t', io.StringIO(DATA))
+        self.assertEqual(cursor.rowcount, 3)
+        cursor.execute("SELECT a, b, d FROM t")
+        self.assertEqual(sorted(cursor.fetchall()), [
+            (1, 'one', datetime.date(2004, 12, 12)),
+            (2, 'two, too', None),
+            (3, 'three', datetime.date(2005, 1, 31))])
+        # Each batch is checked as a whole before anything is written
+        for data, error in [
+                ('a,b,pid\n4,four,1\n1,dup,1\n', SQLError),
+                ('a,b,pid\n4,four,1\n4,dup,1\n', SQLError),
+                ('a,b,pid\n4,,1\n', SQLError),
+                ('a,b,pid\n4,four,3\n', SQLForeignKeyError),
+                ('a,b,pid\nfour,four,1\n', ConversionError)]:
+            self.assertRaises(error, cursor.copy_from, 't', io.StringIO(data))
+        cursor.execute("SELECT a FROM t")
+        self.assertEqual(len(cursor.fetchall()), 3)
+        filename = os.path.join(self.path, 'rows.jsonl')
+        with open(filename, 'w') as fp:
+            fp.write('{"a": 5, "b": "five", "pid": 2}\n\n'
+                     '{"a": 6, "b": "six", "d": "2006-06-06", "pid": 1}\n')
+        cursor.execute("COPY t FROM '%s'" % filename)
+        self.assertEqual(cursor.rowcount, 2)
+        cursor.execute("SELECT b, d FROM t WHERE a = 6")
+        self.assertEqual(cursor.fetchall(),
+                         (('six', datetime.date(2006, 6, 6)),))
+        # A name an object leaves out gets the DEFAULT, unlike a null
+        cursor.execute("CREATE TABLE f (a Integer, b String, "
+                       "d String DEFAULT='dflt')")
+        cursor.copy_from('f', io.StringIO('{"a": 5, "b": "x"}\n'
+                                          '{"a": 6, "d": null}\n'), 'jsonl')
+        cursor.execute("SELECT a, b, d FROM f")
+        self.assertEqual(sorted(cursor.fetchall()),
+                         [(5, 'x', 'dflt'), (6, None, None)])
+        connection.commit()
+        connection.close()
+
+    def check_copy_to(self, driver):
+        connection, cursor = self.connect(driver)
+        cursor.copy_from('t', io.StringIO(DATA))
+        cursor.execute("DELETE FROM t WHERE a = 3")
+        fp = io.StringIO()
+        cursor.copy_to('t', fp, columns=['a', 'b', 'd'])
+        self.assertEqual(cursor.rowcount, 2)
+        self.assertEqual(sorted(fp.getvalue().splitlines()), [
+            '1,one,2004-12-12', '2,"two, too",', 'a,b,d'])
+        filename = os.path.join(self.path, 'rows.jsonl')
+        cursor.execute("COPY t TO '%s'" % filename)
+        cursor.execute("DELETE FROM t")
+        cursor.execute("COPY t FROM '%s'" % filename)
+        self.assertEqual(cursor.rowcount, 2)
+        cursor.execute("SELECT a, b, d, pid FROM t")
+        self.assertEqual(sorted(cursor.fetchall()), [
+            (1, 'one', datetime.date(2004, 12, 12), 1),
+            (2, 'two, too', None, 2)])
+        # Empty strings and NULLs survive a round trip through CSV
+        cursor.execute("CREATE TABLE e (a Integer, b String, c String)")
+        rows = [(1, '', None), (2, None, ''), (3, ' ', 'x')]
+        for row in rows:
+            cursor.insert('e', ['a', 'b', 'c'], list(row))
+        cursor.execute("CREATE TABLE n (b String)")
+        cursor.insert('n', ['b'], [None])
+        cursor.insert('n', ['b'], [''])
+        for table, expected in [('e', rows), ('n', [(None,), ('',)])]:
+            fp = io.StringIO()
+            cursor.copy_to(table, fp)
+            cursor.execute("DELETE FROM %s" % table)
+            cursor.copy_from(table, io.StringIO(fp.getvalue()))
+            cursor.execute("SELECT * FROM %s" % table)
+            self.assertEqual(sorted(expected, key=repr),
+                             sorted(cursor.fetchall(), key=repr))
+        connection.close()
+
+    def test_copy_from_csv(self):
+        self.check_copy_from('csv')
+
+    def test_copy_from_dbm(self):
+        self.check_copy_from('dbm')
+
+    def test_copy_to_csv(self):
+        self.check_copy_to('csv')
+
+    def test_copy_to_dbm(self):
+        self.check_copy_to('dbm')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+#! python
+# -*- coding: utf-8 -*-
+"""
+summary:
+    SnakeSQL Py3 CSV storage tests
+Usage:
+
+
+description:
+
+:REQUIRES:
+
+:TODO:
+
+:AUTHOR:        $Author: Naftaly$
+:ORGANIZATION:  N/A
+:CONTACT:       [TBD]
+:LAST_MODIFIED: $Date$
+:Id:            $Id$
+:REVISION:      $Tag$
+
+"""
+
+import io
+import os
+import csv
+import shutil
+import unittest
+from SnakeSQL.external import lockcsv
+from SnakeSQL.external.StringParsers import (iterCSV, writeCSV, parseCSV,
+                                             buildCSV)
+
+
+TEST_PATH = os.path.dirname(__file__)
+
+ROWS = [
+    ["'one'", 'None', "'two, three'"],
+    ["'it''s'", "'1'", '\'say "hi"\''],
+    ["'multi\nline'", "'x y'", "''"],
+]
+
+
+class TestCsvStorage(unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(TEST_PATH, '_testCsvStorage')
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.mkdir(self.path)
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.path)
+
+    def test_round_trip(self):
+        fp = io.StringIO(newline='')
+        writeCSV(fp, ROWS)
+        self.assertEqual(fp.getvalue(), buildCSV(ROWS))
+        fp.seek(0)
+        rows = iterCSV(fp)
+        self.assertEqual(next(rows), ROWS[0])
+        self.assertEqual(list(rows), ROWS[1:])
+        self.assertEqual(parseCSV(buildCSV(ROWS).encode()), ROWS)
+        self.assertEqual(parseCSV(b''), [[]])
+
+    def test_large_term(self):
+        limit = csv.field_size_limit(1000)
+        try:
+            row = [repr('x' * 2000)]
+            self.assertEqual(parseCSV(buildCSV([row])), [row])
+            # The csv module's limit is only raised while SnakeSQL reads
+            self.assertEqual(csv.field_size_limit(), 1000)
+        finally:
+            csv.field_size_limit(limit)
+
+    def test_lockcsv(self):
+        table = lockcsv.open(os.path.join(self.path, 'table'))
+        for row in ROWS:
+            table[str(len(table.keys()) + 1)] = row
+        self.assertEqual(table.keys(), ['1', '2', '3'])
+        self.assertEqual(table['2'], ROWS[1])
+        table['2'] = ROWS[0]
+        self.assertEqual(table['2'], ROWS[0])
+        self.assertRaises(lockcsv.InvalidKey, table.__getitem__, '4')
+        self.assertRaises(lockcsv.InvalidRow, table.__setitem__, '4', ['1'])
+        table.close(commit=True)
+
+    def test_index(self):
+        name = os.path.join(self.path, 'table')
+        table = lockcsv.open(name)
+        for i in range(20):
+            table[str(i + 1)] = [repr(str(i)), repr('x' * i)]
+        table['5'] = ["'short'", "''"]
+        table['6'] = ["'much longer than before'", repr('y' * 40)]
+        del table['2']
+        table.commit()
+        expected = [table[key] for key in table.keys()]
+        self.assertEqual(expected, list(table._rows()))
+        self.assertEqual(len(table), 19)
+        table.close(commit=True)
+        self.assertTrue(os.path.exists(table.indexFilename))
+        table = lockcsv.open(name)
+        self.assertIsNotNone(table._loadIndex())
+        self.assertEqual([table[key] for key in table.keys()], expected)
+        table['20'] = ["'new'", "'row'"]
+        table.rollback()
+        self.assertEqual(len(table), 19)
+        table.close()
+
+    def test_tombstones(self):
+        name = os.path.join(self.path, 'table')
+        table = lockcsv.open(name)
+        table.compactMinimum = 2
+        for i in range(6):
+            table[table.nextKey()] = ["'#%s'" % i, "'%s'" % i]
+        del table['2']
+        del table['3']
+        self.assertEqual(table.keys(), ['1', '4', '5', '6'])
+        self.assertEqual(table['4'], ["'#3'", "'3'"])
+        self.assertFalse(table.has_key('2'))
+        self.assertRaises(lockcsv.InvalidKey, table.__getitem__, '3')
+        self.assertEqual(table.nextKey(), '7')
+        table.commit()
+        self.assertEqual(table._scan()[1], {2, 3})
+        del table['1']
+        del table['4']
+        table.commit()  # More than half are tombstones, so compacted
+        self.assertEqual(table.keys(), ['1', '2'])
+        self.assertEqual(list(table._rows()),
+                         [["'#4'", "'4'"], ["'#5'", "'5'"]])
+        table.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -29,7 +29,7 @@ import datetime
 import unittest
 import SnakeSQL
 from SnakeSQL.external.SQLParserTools import Transform, Parser
-from SnakeSQL.error import SQLError
+from SnakeSQL.error import SQLError, SQLSyntaxError
 
 
 log = logging.getLogger()
@@ -238,6 +238,8 @@ class TestDbApi2(unittest.TestCase):
             'select3': "SELECT * FROM test WHERE keyString='3'",
             'insert': "INSERT INTO table_name1 (column_name1, column_name2)"
             " VALUES ('te,''\nst', ?)",
+            'insert2': "INSERT INTO table_name1 (column_name1, column_name2)"
+            " VALUES (1, 'a (b)'), (?, 'it''s')",
             'create': "CREATE TABLE table_name1 ""(columnName1 String "
             "REQUIRED UNIQUE PRIMARY KEY, column_name2 Integer DEFAULT=?, "
             "column_name3 Integer FOREIGN KEY=table)",
@@ -248,6 +250,60 @@ class TestDbApi2(unittest.TestCase):
             re_build = parser.build(**parsed_sql)
             self.assertEqual(re_build, s)
 
+    def test_sql_tokens(self):
+        parser = Parser(cacheSize=0)
+        text = "'%s'" % ("it''s from where order by " * 10000)
+        parsed = parser.parse("insert into t (a, b)\nVALUES (null, %s)" % text)
+        self.assertEqual(parsed['sqlValues'], ('NULL', text))
+        parsed = parser.parse("Select fromDate From t Where fromDate=''")
+        self.assertEqual(parsed['columns'], ('fromDate',))
+        self.assertEqual(parsed['where'], (('fromDate', '=', "''"),))
+        parsed = parser.parse('SELECT a FROM t WHERE ' +
+                              ' OR '.join(['a=%s' % i for i in range(1000)]))
+        self.assertEqual(len(parsed['where']), 1999)
+        for sql in ["SELECT a FROM t WHERE a='x", "SELECT a FROM t WHERE (a=1",
+                    "SELECT a FROM t WHERE a=1)", "SELECT a, * FROM t",
+                    "SELECT a FROM t ORDER BY a sideways",
+                    "DELETE FROM t a=1", "INSERT INTO t (a) VALUES (1 2)",
+                    "CREATE TABLE t (a Integer DEFAULT 1)"]:
+            self.assertRaises(SQLSyntaxError, parser.parse, sql)
+
+    def test_parse_cache(self):
+        parser = Transform(cacheSize=2)
+        sql = "SELECT a FROM t WHERE a=? and b='x'"
+        parsed = parser.parse(sql)
+        self.assertIs(parser.parse(sql), parsed)
+        self.assertEqual((parser.hits, parser.misses), (1, 1))
+        with self.assertRaises(TypeError):
+            parsed['tables'] = ['u']
+        with self.assertRaises(TypeError):
+            parsed['where'][0][2] = '1'
+        self.assertEqual(parsed['where'][0], ('a', '=', '?'))
+        parser.parse('SHOW TABLES')
+        parser.parse('DROP TABLE t')
+        # The least recently used statement is dropped first
+        self.assertIsNot(parser.parse(sql), parsed)
+        self.assertEqual((parser.hits, parser.misses), (1, 4))
+        parser.clearCache()
+        self.assertEqual((parser.hits, parser.misses), (0, 0))
+
+        path = os.path.join(TEST_PATH, '_testParseCache')
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        connection = SnakeSQL.connect(path, driver='dbm', autoCreate=True)
+        cursor = connection.cursor()
+        cursor.execute('CREATE TABLE t (a Integer, b String)')
+        cursor.executemany('INSERT INTO t (a, b) VALUES (?, ?)',
+                           [(1, 'one'), (2, 'two')])
+        # Running a cached statement again must not see the old values
+        for a, b in [(1, 'uno'), (2, 'dos')]:
+            cursor.execute('UPDATE t SET b=? WHERE a=?', [b, a])
+        for a, b in [(1, 'uno'), (2, 'dos'), (1, 'uno')]:
+            cursor.execute("SELECT a FROM t WHERE b='%s'" % b)
+            self.assertEqual(cursor.fetchall(), ((a,),))
+        connection.close()
+        shutil.rmtree(path)
+
     def test_curser_interface(self):
 
         if os.path.exists(os.path.join(TEST_PATH, '_test_cruser')):
@@ -534,7 +590,7 @@ class TestDbApi2(unittest.TestCase):
 
         sql = ("SELECT one, two FROM table WHERE ( one='NU ORDER BY LL' ) and "
                "two>=' 2 asd 1 ' ORDER BY column DESC, two")
-        blocks = Parser().parse(sql)
+        blocks = dict(Parser().parse(sql))
         del blocks['function']
         blocks['execute'] = False
         if cursor.select(**blocks) != sql:
@@ -542,14 +598,14 @@ class TestDbApi2(unittest.TestCase):
 
         sql = ("INSERT INTO table_name1 (column_name1, column_name2) VALUES "
                "('te,''\nst', '546')")
-        blocks = Parser().parse(sql)
+        blocks = dict(Parser().parse(sql))
         del blocks['function']
         blocks['execute'] = False
         if cursor.insert(**blocks) != sql:
             self.fail("FAILED")
 
         sql = "UPDATE table SET one='''', two='dfg'"
-        blocks = Parser().parse(sql)
+        blocks = dict(Parser().parse(sql))
         del blocks['function']
         blocks['execute'] = False
         if cursor.update(**blocks) != sql:
@@ -557,20 +613,20 @@ class TestDbApi2(unittest.TestCase):
 
         sql = ("CREATE TABLE table_name1 (columnName1 String REQUIRED UNIQUE "
                "PRIMARY KEY, column_name2 Integer DEFAULT='4''')")
-        blocks = Parser().parse(sql)
+        blocks = dict(Parser().parse(sql))
         del blocks['function']
         blocks['execute'] = False
         self.assertEqual(cursor.create(**blocks), sql)
 
         sql = ("DELETE FROM table WHERE one=11 or two=22 or three='2 3' or "
                "four=55 or five=90")
-        blocks = Parser().parse(sql)
+        blocks = dict(Parser().parse(sql))
         del blocks['function']
         blocks['execute'] = False
         self.assertEqual(cursor.delete(**blocks), sql)
 
         sql = "DROP TABLE tableName"
-        blocks = Parser().parse(sql)
+        blocks = dict(Parser().parse(sql))
         del blocks['function']
         blocks['execute'] = False
         self.assertEqual(cursor.drop(**blocks), sql)
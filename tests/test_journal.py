@@ -0,0 +1,139 @@
+#! python
+# -*- coding: utf-8 -*-
+"""
+summary:
+    SnakeSQL Py3 undo journal tests
+Usage:
+
+
+description:
+
+:REQUIRES:
+
+:TODO:
+
+:AUTHOR:        $Author: Naftaly$
+:ORGANIZATION:  N/A
+:CONTACT:       [TBD]
+:LAST_MODIFIED: $Date$
+:Id:            $Id$
+:REVISION:      $Tag$
+
+"""
+
+import os
+import shutil
+import unittest
+from SnakeSQL.external import lock, lockcsv, lockdbm, writeSet
+
+
+TEST_PATH = os.path.dirname(__file__)
+
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(TEST_PATH, '_testJournal')
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.mkdir(self.path)
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.path)
+
+    def test_recover(self):
+        name = os.path.join(self.path, 'data')
+        with open(name, 'wb') as fp:
+            fp.write(b'0123456789')
+        mtime = os.stat(name).st_mtime_ns
+        journal = lock.Journal(name + '_jnl')
+        journal.save(name, 2, 5)
+        journal.save(name, 8, 20)
+        with open(name, 'r+b') as fp:
+            fp.seek(2)
+            fp.write(b'abc')
+            fp.seek(8)
+            fp.write(b'appended')
+        journal.fp.close()  # As if the process had died
+        journal = lock.Journal(name + '_jnl')
+        journal.recover()
+        with open(name, 'rb') as fp:
+            self.assertEqual(fp.read(), b'0123456789')
+        self.assertEqual(os.stat(name).st_mtime_ns, mtime)
+        self.assertFalse(os.path.exists(name + '_jnl'))
+
+    def test_lockcsv(self):
+        name = os.path.join(self.path, 'table')
+        table = lockcsv.open(name)
+        for i in range(10):
+            table[table.nextKey()] = ["'%s'" % i, "'row'"]
+        table.commit()
+        self.assertFalse(os.path.exists(table.journal.filename))
+        table['2'] = ["'changed'", "'row'"]
+        table['3'] = ["'2'", "'a much longer row than before'"]
+        del table['4']
+        table[table.nextKey()] = ["'new'", "'row'"]
+        table.rollback()
+        self.assertEqual(len(table), 10)
+        self.assertEqual(table['2'], ["'1'", "'row'"])
+        self.assertEqual(table['3'], ["'2'", "'row'"])
+        # The file is put back exactly so the saved index is still valid
+        self.assertIsNotNone(table._loadIndex())
+        table.close()
+
+    def test_lockdbm(self):
+        name = os.path.join(self.path, 'table')
+        table = lockdbm.open(name)
+        table['1'] = 'one'
+        table['2'] = 'two'
+        table.commit()
+        table['1'] = 'one' * 1000
+        table['3'] = 'three'
+        del table['2']
+        table.rollback()
+        self.assertEqual(sorted(table.keys()), [b'1', b'2'])
+        self.assertEqual(table['1'], b'one')
+        del table['1']
+        table.commit()
+        table.close(commit=True)
+        table = lockdbm.open(name)
+        self.assertEqual(table.keys(), [b'2'])
+        table.close()
+
+    def check_write_set(self, table):
+        key = table.nextKey() if table.ordinal else 'a'
+        value = ["'one'"] if table.ordinal else 'one'
+        table[key] = value
+        self.assertEqual(table[key], value)
+        table.rollback()
+        self.assertEqual(table.keys(), [])
+        table[key] = value
+        # Nothing is written until the changes are committed
+        self.assertFalse(table.file.has_key(key))
+        self.assertEqual(table.keys(), [key])
+        table.commit()
+        self.assertTrue(table.file.has_key(key))
+        table.limit = 5
+        for i in range(10):
+            if table.ordinal:
+                table[table.nextKey()] = ["'%s'" % i]
+            else:
+                table[str(i)] = str(i)
+        del table[key]
+        self.assertTrue(table.file.journal.active())  # Spilled to the file
+        self.assertEqual(len(table), 10)
+        table.rollback()
+        self.assertEqual(table.keys(), [key])
+        table.close()
+
+    def test_write_set(self):
+        self.check_write_set(writeSet.WriteSet(
+            lockcsv.open(os.path.join(self.path, 'csv'))))
+        self.check_write_set(writeSet.WriteSet(
+            lockdbm.open(os.path.join(self.path, 'dbm'))))
+
+
+if __name__ == '__main__':
+    unittest.main()
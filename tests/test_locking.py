@@ -0,0 +1,378 @@
+#! python
+# -*- coding: utf-8 -*-
+"""
+summary:
+    SnakeSQL Py3 reader/writer locking tests
+Usage:
+
+
+description:
+
+:REQUIRES:
+
+:TODO:
+
+:AUTHOR:        $Author: Naftaly$
+:ORGANIZATION:  N/A
+:CONTACT:       [TBD]
+:LAST_MODIFIED: $Date$
+:Id:            $Id$
+:REVISION:      $Tag$
+
+"""
+
+import os
+import sys
+import time
+import shutil
+import unittest
+import subprocess
+from unittest import mock
+import SnakeSQL
+from SnakeSQL.error import SQLError
+from SnakeSQL.external import lock, lockcsv, lockdbm
+
+
+TEST_PATH = os.path.dirname(__file__)
+
+
+class TestLocking(unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(TEST_PATH, '_testLocking')
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.mkdir(self.path)
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.path)
+
+    def check_locks(self, module, key, value):
+        name = os.path.join(self.path, 'table')
+        first = module.open(name, timeout=0.05)
+        second = module.open(name, timeout=0.05)
+        first[key] = value
+        # Nobody can read while the change is uncommitted
+        self.assertRaises(lock.TimeOut, second.keys)
+        first.commit()
+        # Any number of connections can read at once
+        self.assertEqual(len(first.keys()), 1)
+        self.assertEqual(len(second.keys()), 1)
+        self.assertRaises(lock.TimeOut, first.__delitem__, key)
+        second.release()
+        del first[key]
+        first.commit()
+        self.assertEqual(len(second.keys()), 0)
+        second.close()
+        first.close()
+
+    def test_lockcsv(self):
+        self.check_locks(lockcsv, '1', ["'one'"])
+
+    def test_lockdbm(self):
+        self.check_locks(lockdbm, '1', 'one')
+
+    def crash(self, code):
+        "Run ``code`` in a process which dies without unlocking anything."
+        subprocess.check_call([sys.executable, '-c', code + '\nos._exit(0)'],
+                              cwd=os.path.dirname(TEST_PATH))
+
+    def test_recover(self):
+        name = os.path.join(self.path, 'table')
+        table = lockcsv.open(name)
+        table['1'] = ["'one'"]
+        table.commit()
+        table.close()
+        self.crash("import os\n"
+                   "from SnakeSQL.external import lockcsv\n"
+                   "table = lockcsv.open(%r)\n"
+                   "table['1'] = [\"'changed'\"]\n"
+                   "table['2'] = [\"'two'\"]" % name)
+        # The lock went with the process and its journal is rolled back
+        table = lockcsv.open(name, timeout=0.05)
+        self.assertEqual(table.keys(), ['1'])
+        self.assertEqual(table['1'], ["'one'"])
+        table.close()
+
+    def test_recover_timeout(self):
+        name = os.path.join(self.path, 'table')
+        table = lockcsv.open(name)
+        table['1'] = ["'one'"]
+        table.commit()
+        table.close()
+        self.crash("import os\n"
+                   "from SnakeSQL.external import lockcsv\n"
+                   "table = lockcsv.open(%r)\n"
+                   "table['1'] = [\"'changed'\"]" % name)
+        table = lockcsv.open(name, timeout=0.05)
+        reader = lock.RWLock(table.locks.filename)
+        reader.acquire()
+        # A reader can't roll the journal back while others are reading
+        self.assertRaises(lock.TimeOut, table.keys)
+        self.assertIsNone(table.locks.mode)
+        writer = lock.RWLock(table.locks.filename, timeout=0.05)
+        reader.release()
+        writer.acquire(True)
+        writer.close()
+        reader.close()
+        self.assertEqual(table['1'], ["'one'"])
+        table.close()
+
+    def check_dead_owner(self, driver):
+        database = os.path.join(self.path, driver)
+        connection = SnakeSQL.connect(database, driver=driver, autoCreate=True)
+        connection.cursor().execute("CREATE TABLE t (a Integer PRIMARY KEY)")
+        connection.commit()
+        connection.close()
+        self.crash("import os, SnakeSQL\n"
+                   "connection = SnakeSQL.connect(%r, driver=%r)\n"
+                   "connection.cursor().execute('INSERT INTO t (a) VALUES (1)')"
+                   % (database, driver))
+        # The dead writer's lock is taken at once and its insert undone
+        start = time.time()
+        connection = SnakeSQL.connect(database, driver=driver)
+        cursor = connection.cursor()
+        cursor.execute("SELECT a FROM t")
+        self.assertEqual(cursor.fetchall(), ())
+        self.assertLess(time.time() - start, 1)
+        # The record the dead writer left behind does not name it
+        other = lock.RWLock(connection.tables['t'].file.locks.filename,
+                            timeout=0.05)
+        other.peek()
+        self.assertGreater(os.path.getsize(other.filename), 8)
+        self.assertEqual(other.holder(), 'another connection')
+        # A TimeOut names a live holder
+        cursor.execute("INSERT INTO t (a) VALUES (2)")
+        try:
+            other.acquire()
+        except lock.TimeOut as e:
+            self.assertIn('process %s on ' % os.getpid(), str(e))
+        else:
+            self.fail('The lock was not held')
+        connection.rollback()
+        other.close()
+        connection.close()
+
+    def test_dead_owner_csv(self):
+        self.check_dead_owner('csv')
+
+    def test_dead_owner_dbm(self):
+        self.check_dead_owner('dbm')
+
+    def check_connections(self, driver):
+        database = os.path.join(self.path, driver)
+        first = SnakeSQL.connect(database, driver=driver, autoCreate=True)
+        cursor = first.cursor()
+        cursor.execute("CREATE TABLE t (a Integer PRIMARY KEY, b String)")
+        cursor.execute("INSERT INTO t (a, b) VALUES (1, 'one')")
+        first.commit()
+        second = SnakeSQL.connect(database, driver=driver)
+        other = second.cursor()
+        # Shared locks are only held while a statement runs
+        cursor.execute("SELECT b FROM t")
+        other.execute("SELECT b FROM t")
+        other.execute("UPDATE t SET b = 'changed' WHERE a = 1")
+        other.execute("INSERT INTO t (a, b) VALUES (2, 'two')")
+        second.commit()
+        cursor.execute("SELECT a, b FROM t")
+        self.assertEqual(sorted(cursor.fetchall()),
+                         [(1, 'changed'), (2, 'two')])
+        second.close()
+        first.close()
+
+    def check_schema(self, driver):
+        database = os.path.join(self.path, driver)
+        first = SnakeSQL.connect(database, driver=driver, autoCreate=True)
+        cursor = first.cursor()
+        cursor.execute("CREATE TABLE t (a Integer PRIMARY KEY)")
+        first.commit()
+        cursor.execute("INSERT INTO t (a) VALUES (1)")
+        second = SnakeSQL.connect(database, driver=driver)
+        other = second.cursor()
+        # DDL only needs the ColTypes table, not the tables in use
+        other.execute("CREATE TABLE u (b String)")
+        second.commit()
+        cursor.execute("INSERT INTO u (b) VALUES ('one')")
+        first.commit()
+        other.execute("SELECT a FROM t")
+        self.assertEqual(other.fetchall(), ((1,),))
+        other.execute("DROP TABLE u")
+        second.commit()
+        self.assertRaises(SQLError, cursor.execute, "SELECT b FROM u")
+        self.assertNotIn('u', cursor.tables())
+        second.close()
+        first.close()
+
+    def check_recreate(self, driver):
+        database = os.path.join(self.path, driver)
+        first = SnakeSQL.connect(database, driver=driver, autoCreate=True)
+        cursor = first.cursor()
+        cursor.execute("CREATE TABLE u (a Integer PRIMARY KEY, b String)")
+        first.commit()
+        second = SnakeSQL.connect(database, driver=driver)
+        other = second.cursor()
+        for a in range(1, 6):
+            other.execute("INSERT INTO u (a, b) VALUES (%s, 'old')" % a)
+        second.commit()
+        table = second.tables['u']
+        # The new table's files are not the ones the other connection read
+        cursor.execute("DROP TABLE u")
+        cursor.execute("CREATE TABLE u (a Integer PRIMARY KEY, b String)")
+        cursor.execute("INSERT INTO u (a, b) VALUES (9, 'new')")
+        first.commit()
+        other.execute("SELECT a, b FROM u")
+        self.assertEqual(other.fetchall(), ((9, 'new'),))
+        self.assertIsNot(second.tables['u'], table)
+        # Closing a dropped table leaves none of its files behind
+        other.execute("INSERT INTO u (a, b) VALUES (10, 'newer')")
+        second.commit()
+        cursor.execute("DROP TABLE u")
+        first.commit()
+        other.execute("SELECT TableName FROM ColTypes")
+        self.assertEqual([name for name in os.listdir(database)
+                          if name.startswith('u')], [])
+        second.close()
+        first.close()
+
+    def check_rollback_create(self, driver):
+        database = os.path.join(self.path, driver)
+        connection = SnakeSQL.connect(database, driver=driver, autoCreate=True)
+        names = sorted(os.listdir(database))
+        cursor = connection.cursor()
+        cursor.execute("CREATE TABLE u (a Integer PRIMARY KEY, b String)")
+        cursor.execute("INSERT INTO u (a, b) VALUES (1, 'one')")
+        cursor.execute("SELECT a FROM u")
+        connection.rollback()
+        # Nothing is left of the table, not even its lock file
+        self.assertEqual(sorted(os.listdir(database)), names)
+        connection.close()
+
+    def test_rollback_create_csv(self):
+        self.check_rollback_create('csv')
+
+    def test_rollback_create_dbm(self):
+        self.check_rollback_create('dbm')
+
+    def test_recreate_csv(self):
+        self.check_recreate('csv')
+
+    def test_recreate_dbm(self):
+        self.check_recreate('dbm')
+
+    def test_schema_csv(self):
+        self.check_schema('csv')
+
+    def test_schema_dbm(self):
+        self.check_schema('dbm')
+
+    def check_snapshot(self, driver):
+        database = os.path.join(self.path, driver)
+        connection = SnakeSQL.connect(database, driver=driver, autoCreate=True)
+        connection.cursor().execute(
+            "CREATE TABLE t (a Integer PRIMARY KEY, b String)")
+        connection.commit()
+        connection.close()
+        Connection = type(connection)
+
+        def connect():
+            "Return a connection and the number of ColTypes rows it read."
+            with mock.patch.object(Connection, '_getRow', autospec=True,
+                                   side_effect=Connection._getRow) as getRow:
+                connection = SnakeSQL.connect(database, driver=driver)
+            return connection, len([
+                args for args, kwargs in getRow.call_args_list
+                if args[1] == connection.colTypesName])
+
+        # The first connection after the CREATE reads the rows and saves
+        # them in the snapshot
+        connection, reads = connect()
+        self.assertGreater(reads, 0)
+        connection.close()
+        self.assertTrue(os.path.exists(
+            os.path.join(database, 'ColTypes.schema')))
+        # Connecting again uses the snapshot rather than the ColTypes rows
+        connection, reads = connect()
+        self.assertEqual(reads, 0)
+        self.assertEqual(connection.cursor().columns('t'), ('a', 'b'))
+        connection.cursor().execute("CREATE TABLE u (c Integer)")
+        connection.commit()
+        connection.close()
+        # An out of date snapshot is replaced
+        connection, reads = connect()
+        self.assertGreater(reads, 0)
+        self.assertIn('u', connection.cursor().tables())
+        connection.close()
+
+    def test_snapshot_csv(self):
+        self.check_snapshot('csv')
+
+    def test_snapshot_dbm(self):
+        self.check_snapshot('dbm')
+
+    def check_read_only(self, driver):
+        database = os.path.join(self.path, driver)
+        connection = SnakeSQL.connect(database, driver=driver, autoCreate=True)
+        cursor = connection.cursor()
+        cursor.execute("CREATE TABLE t (a Integer PRIMARY KEY)")
+        cursor.execute("INSERT INTO t (a) VALUES (1)")
+        connection.commit()
+        connection.close()
+        # The first connection after the CREATE saves the schema snapshot
+        SnakeSQL.connect(database, driver=driver).close()
+        stamps = dict((name, os.stat(os.path.join(database, name)).st_mtime_ns)
+                      for name in os.listdir(database))
+        connection = SnakeSQL.connect(database, driver=driver)
+        # Tables are only opened when a statement uses them
+        self.assertFalse(connection.tables['t'].open)
+        cursor = connection.cursor()
+        cursor.execute("SELECT a FROM t")
+        self.assertEqual(cursor.fetchall(), ((1,),))
+        connection.commit()
+        connection.close()
+        # Reading copies, journals and rewrites nothing
+        self.assertEqual(stamps, dict(
+            (name, os.stat(os.path.join(database, name)).st_mtime_ns)
+            for name in os.listdir(database)))
+
+    def test_read_only_csv(self):
+        self.check_read_only('csv')
+
+    def test_read_only_dbm(self):
+        self.check_read_only('dbm')
+
+    def check_dirty(self, driver):
+        database = os.path.join(self.path, driver)
+        connection = SnakeSQL.connect(database, driver=driver, autoCreate=True)
+        cursor = connection.cursor()
+        cursor.execute("CREATE TABLE t (a Integer PRIMARY KEY)")
+        cursor.execute("CREATE TABLE u (a Integer PRIMARY KEY)")
+        connection.commit()
+        cursor.execute("SELECT a FROM u")
+        cursor.execute("INSERT INTO t (a) VALUES (1)")
+        self.assertTrue(connection.tables['t'].isDirty())
+        self.assertFalse(connection.tables['u'].isDirty())
+        # A write which changes nothing still has to be committed
+        cursor.execute("DELETE FROM u WHERE a = 2")
+        self.assertTrue(connection.tables['u'].isDirty())
+        connection.commit()
+        for table in connection.tables.values():
+            self.assertFalse(table.isDirty())
+        connection.close()
+
+    def test_dirty_csv(self):
+        self.check_dirty('csv')
+
+    def test_dirty_dbm(self):
+        self.check_dirty('dbm')
+
+    def test_connections_csv(self):
+        self.check_connections('csv')
+
+    def test_connections_dbm(self):
+        self.check_connections('dbm')
+
+
+if __name__ == '__main__':
+    unittest.main()
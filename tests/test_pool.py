@@ -0,0 +1,87 @@
+#! python
+# -*- coding: utf-8 -*-
+"""
+summary:
+    SnakeSQL Py3 connection pool tests
+Usage:
+
+
+description:
+
+:REQUIRES:
+
+:TODO:
+
+:AUTHOR:        $Author: Naftaly$
+:ORGANIZATION:  N/A
+:CONTACT:       [TBD]
+:LAST_MODIFIED: $Date$
+:Id:            $Id$
+:REVISION:      $Tag$
+
+"""
+
+import os
+import shutil
+import unittest
+import SnakeSQL
+from SnakeSQL.error import Error, OperationalError
+
+
+TEST_PATH = os.path.dirname(__file__)
+
+
+class TestPool(unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(TEST_PATH, '_testPool')
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.mkdir(self.path)
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.path)
+
+    def check_pool(self, driver):
+        pool = SnakeSQL.pool(os.path.join(self.path, driver), driver=driver,
+                             size=2, autoCreate=True)
+        first = pool.connect()
+        cursor = first.cursor()
+        cursor.execute("CREATE TABLE t (a Integer PRIMARY KEY)")
+        cursor.execute("INSERT INTO t (a) VALUES (1)")
+        first.commit()
+        second = pool.connect()
+        self.assertRaises(OperationalError, pool.connect, 0.01)
+        # The connections share the parser and the table structure
+        self.assertIs(second.parser, first.parser)
+        other = second.cursor()
+        other.execute("SELECT a FROM t")
+        self.assertEqual(other.fetchall(), ((1,),))
+        connection = first._connection
+        first.close()
+        self.assertRaises(Error, first.cursor)
+        self.assertRaises(Error, cursor.execute, "SELECT a FROM t")
+        # Closed connections are reused with their tables still open
+        third = pool.connect()
+        self.assertIs(third._connection, connection)
+        self.assertTrue(connection.tables['t'].open)
+        third.cursor().execute("INSERT INTO t (a) VALUES (2)")
+        third.close()
+        other.execute("SELECT a FROM t")
+        self.assertEqual(other.fetchall(), ((1,),))
+        second.close()
+        pool.close()
+        self.assertRaises(Error, pool.connect)
+        self.assertTrue(connection._closed)
+
+    def test_pool_csv(self):
+        self.check_pool('csv')
+
+    def test_pool_dbm(self):
+        self.check_pool('dbm')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -24,6 +24,7 @@ description:
 import os
 import sys
 import time
+import array
 import shutil
 import logging
 import datetime
@@ -31,6 +32,10 @@ import unittest
 import SnakeSQL
 from SnakeSQL.external.SQLParserTools import Transform, Parser
 from SnakeSQL.error import SQLError
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 log = logging.getLogger()
@@ -103,3 +108,156 @@ class TestSql(unittest.TestCase):
         self.assertEqual(1, cursor.rowcount)
         log.info(cursor.description)
         log.info(cursor.fetchall(format='dict'))
+
+    def test_executemany(self):
+        cursor = self.connection.cursor()
+        sql = ("INSERT INTO tableSql (keyInteger, uniqueInteger, "
+               "requiredText) VALUES (?, ?, 'many')")
+        cursor.executemany(sql, [(i, i) for i in range(1, 101)])
+        self.assertEqual(100, cursor.rowcount)
+        cursor.execute("SELECT keyInteger FROM tableSql "
+                       "WHERE requiredText = 'many'")
+        self.assertEqual(100, cursor.rowcount)
+        # Duplicates within the batch are caught before anything is written
+        self.assertRaises(SQLError, cursor.executemany, sql,
+                          [(101, 101), (102, 101)])
+        self.assertRaises(SQLError, cursor.executemany, sql, [(50, 200)])
+        self.assertRaises(SQLError, cursor.executemany, sql, [(103,)])
+        cursor.execute("SELECT keyInteger FROM tableSql "
+                       "WHERE requiredText = 'many'")
+        self.assertEqual(100, cursor.rowcount)
+        self.connection.rollback()
+
+    def test_insert_many_values(self):
+        cursor = self.connection.cursor()
+        cursor.execute("INSERT INTO tableSql (keyInteger, requiredText) "
+                       "VALUES (201, 'rows'), (?, 'rows'), (203, ?)",
+                       [202, 'rows'])
+        self.assertEqual(3, cursor.rowcount)
+        cursor.execute("SELECT keyInteger FROM tableSql "
+                       "WHERE requiredText = 'rows'")
+        self.assertEqual([(201,), (202,), (203,)],
+                         sorted(cursor.fetchall()))
+        self.assertRaises(SQLError, cursor.execute,
+                          "INSERT INTO tableSql (keyInteger, requiredText) "
+                          "VALUES (204, 'rows'), (204, 'rows')")
+        self.connection.rollback()
+
+    def test_binders(self):
+        cursor = self.connection.cursor()
+        sql = ("UPDATE tableSql SET columnText = ? "
+               "WHERE keyInteger = ? and requiredText = 'Must'")
+        cursor.execute(sql, ['first', 0])
+        binders = dict(self.connection.binders)
+        cursor.execute(sql, ['second', 0])
+        # The second run reuses the binders made by the first
+        self.assertEqual(binders, self.connection.binders)
+        cursor.execute("SELECT columnText FROM tableSql "
+                       "WHERE keyInteger = 0")
+        self.assertEqual((('second',),), cursor.fetchall())
+        self.assertRaises(SQLError, cursor.execute, sql, ['third'])
+        self.assertRaises(SQLError, cursor.execute, sql, ['third', 0, 1])
+        self.connection.rollback()
+
+    def test_column_lookups(self):
+        table = self.connection.tables['tableSql']
+        self.assertEqual(table.columnNames,
+                         ('keyInteger', 'uniqueInteger', 'requiredText',
+                          'columnText'))
+        self.assertEqual(table.primaryKey, 'keyInteger')
+        self.assertEqual(table.primaryKeyPosition, 0)
+        self.assertIs(table.byPosition[3], table.get('columnText'))
+        self.assertTrue(table.columnExists('requiredText'))
+        self.assertFalse(table.columnExists('missing'))
+        self.assertEqual(table.columnNames,
+                         self.connection.cursor().columns('tableSql'))
+        # Schema objects have no per-instance __dict__
+        self.assertFalse(hasattr(table, '__dict__'))
+        self.assertFalse(hasattr(table.get('keyInteger'), '__dict__'))
+        self.assertFalse(hasattr(table.get('keyInteger').converter,
+                                 '__dict__'))
+
+    def test_order_by(self):
+        cursor = self.connection.cursor()
+        cursor.executemany("INSERT INTO tableSql (keyInteger, uniqueInteger, "
+                           "requiredText) VALUES (?, ?, ?)",
+                           [[10, 10, 'b'], [11, 9, 'b'], [12, None, 'a']])
+        cursor.execute("SELECT keyInteger FROM tableSql WHERE requiredText "
+                       "<> 'Must' ORDER BY requiredText DESC, uniqueInteger")
+        self.assertEqual(((11,), (10,), (12,)), cursor.fetchall())
+        cursor.execute("SELECT keyInteger FROM tableSql WHERE requiredText "
+                       "<> 'Must' ORDER BY tableSql.uniqueInteger")
+        self.assertEqual(((12,), (11,), (10,)), cursor.fetchall())
+        self.connection.rollback()
+
+    def test_object_format(self):
+        cursor = self.connection.cursor(format='object')
+        cursor.execute("SELECT keyInteger, requiredText FROM tableSql "
+                       "WHERE keyInteger = 0")
+        rows = cursor.fetchall()
+        self.assertEqual(((0, 'Must'),), rows)
+        row = rows[0]
+        self.assertEqual(0, row.keyInteger)
+        self.assertEqual('Must', row['requiredText'])
+        self.assertEqual('Must', row[1])
+        self.assertEqual(['keyInteger', 'requiredText'], row.keys())
+        self.assertEqual({'keyInteger': 0, 'requiredText': 'Must'},
+                         row.asDict())
+        self.assertRaises(AttributeError, getattr, row, 'missing')
+        self.assertRaises(KeyError, row.__getitem__, 'missing')
+        self.assertFalse(hasattr(row, '__dict__'))
+        # The rows of one result set share their class
+        self.assertIs(type(row), type(cursor.fetchall()[0]))
+        self.assertEqual('Must', cursor.fetchone(format='object').requiredText)
+
+    def test_columns_format(self):
+        cursor = self.connection.cursor()
+        cursor.executemany("INSERT INTO tableSql (keyInteger, uniqueInteger, "
+                           "requiredText) VALUES (?, ?, ?)",
+                           [[20, 5, 'a'], [21, None, 'b']])
+        cursor.execute("SELECT keyInteger, uniqueInteger, requiredText "
+                       "FROM tableSql WHERE requiredText <> 'Must'")
+        columns = cursor.fetchall(format='columns')
+        self.assertEqual(['keyInteger', 'uniqueInteger', 'requiredText'],
+                         list(columns))
+        self.assertEqual(array.array('l', [20, 21]), columns['keyInteger'])
+        # A column with NULLs can't be an array
+        self.assertEqual([5, None], columns['uniqueInteger'])
+        self.assertEqual(['a', 'b'], columns['requiredText'])
+        self.connection.rollback()
+
+    def test_columns_cursor(self):
+        cursor = self.connection.cursor(format='columns')
+        cursor.executemany("INSERT INTO tableSql (keyInteger, requiredText) "
+                           "VALUES (?, ?)", [[30, 'a'], [31, 'b'], [32, 'c']])
+        cursor.execute("SELECT keyInteger FROM tableSql "
+                       "WHERE requiredText <> 'Must'")
+        batches = []
+        while 1:
+            columns = cursor.fetchmany(2)
+            if not columns:
+                break
+            batches.append(list(columns['keyInteger']))
+        self.assertEqual([[30, 31], [32]], batches)
+        # No rows are left
+        self.assertEqual({}, cursor.fetchmany(2))
+        cursor.execute("SELECT keyInteger FROM tableSql "
+                       "WHERE requiredText = 'b'")
+        self.assertEqual((31,), cursor.fetchone())
+        self.assertIsNone(cursor.fetchone())
+        self.connection.rollback()
+
+    @unittest.skipUnless(numpy, 'NumPy is not installed')
+    def test_fetch_numpy(self):
+        cursor = self.connection.cursor()
+        cursor.executemany("INSERT INTO tableSql (keyInteger, uniqueInteger, "
+                           "requiredText) VALUES (?, ?, ?)",
+                           [[20, 5, 'a'], [21, None, 'b']])
+        cursor.execute("SELECT keyInteger, uniqueInteger, requiredText "
+                       "FROM tableSql WHERE requiredText <> 'Must'")
+        rows = cursor.fetch_numpy()
+        self.assertEqual(numpy.dtype('i4'), rows.dtype['keyInteger'])
+        self.assertEqual(numpy.dtype('O'), rows.dtype['uniqueInteger'])
+        self.assertEqual([20, 21], rows['keyInteger'].tolist())
+        self.assertEqual(['a', 'b'], rows['requiredText'].tolist())
+        self.connection.rollback()